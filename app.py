@@ -27,13 +27,11 @@ from typing import Optional, Dict, Any
 # antes de tentar importar os módulos necessários para a GUI.
 try:
     import customtkinter as ctk
-    import pandas as pd
     from core import InventoryEngine
 except ImportError:
     # As importações serão tratadas pelo verificador de dependências.
     # Se falhar, a aplicação não continuará.
     ctk = None
-    pd = None
     InventoryEngine = None
 
 # --- Constantes da Aplicação ---
@@ -46,6 +44,9 @@ ICON_FILE = "app.ico"
 DEFAULT_ORACLE_QUERY = "SELECT IP, NROEMPRESA, NROCHECKOUT FROM CONSINCOMONITOR.TB_CHECKOUT WHERE ATIVO = 'S' AND SO = 'L'"
 DEFAULT_ORACLE_TABLE = "CONSINCO.BAR_HARDWARE_PDV"
 
+# --- Opções Avançadas (editadas apenas no config.json e repassadas ao motor) ---
+ADVANCED_CONFIG_KEYS = ("jump_host", "jump_hosts", "jump_max_channels", "cancel_grace", "retry_max", "retry_base_delay", "retry_max_delay", "breaker_threshold", "breaker_cooldown", "channels_per_host", "capability_cache", "capability_max_age_days", "probe_order", "max_output_bytes", "history_dir", "oracle_save_strategy", "oracle_staging_table", "oracle_standin", "oracle_change_only", "results_backend", "sqlite_path", "save_batch_size", "spread_window", "spread_jitter", "host_order", "run_time_box", "archive_outputs", "archive_dir", "parse_cache_size", "ssh_credentials", "dns_timeout", "dns_workers", "dns_cache_ttl", "dns_negative_ttl", "profile_top")
+
 # --- Tema e Estilo da Aplicação ---
 THEME = {
     "font_family": "Segoe UI",
@@ -87,7 +88,6 @@ def check_and_install_dependencies():
     """
     required_packages = {
         'customtkinter': 'customtkinter',
-        'pandas': 'pandas',
         'openpyxl': 'openpyxl',
         'paramiko': 'paramiko',
         'oracledb': 'oracledb'
@@ -244,8 +244,14 @@ class LogModal(BaseModal):
         self.log_textbox = ctk.CTkTextbox(self, font=THEME["font_mono"], state="disabled")
         self.log_textbox.grid(row=1, column=0, padx=THEME["padding_sm"], pady=(0, THEME["padding_sm"]), sticky="nsew")
 
-        self.close_button = ctk.CTkButton(self, text="Fechar", command=self.destroy, state="disabled")
-        self.close_button.grid(row=2, column=0, padx=THEME["padding_sm"], pady=(5, THEME["padding_sm"]), sticky="ew")
+        button_frame = ctk.CTkFrame(self, fg_color="transparent")
+        button_frame.grid(row=2, column=0, padx=THEME["padding_sm"], pady=(5, THEME["padding_sm"]), sticky="ew")
+        button_frame.grid_columnconfigure((0, 1), weight=1)
+        self.cancel_button = ctk.CTkButton(button_frame, text="Cancelar", command=self.cancel_process, fg_color="#b91c1c", hover_color="#991b1b")
+        self.cancel_button.grid(row=0, column=0, padx=(0, 5), sticky="ew")
+        Tooltip(self.cancel_button, "Interrompe o inventário: hosts não iniciados são descartados e os em andamento\nsão finalizados com dados parciais antes de salvar os resultados.")
+        self.close_button = ctk.CTkButton(button_frame, text="Fechar", command=self.destroy, state="disabled")
+        self.close_button.grid(row=0, column=1, padx=(5, 0), sticky="ew")
 
         self.protocol("WM_DELETE_WINDOW", self.on_closing_attempt)
         self.process_log_queue()
@@ -275,11 +281,19 @@ class LogModal(BaseModal):
         self.log_textbox.see("end")
         self.log_textbox.configure(state="disabled")
 
+    def cancel_process(self):
+        """Solicita o cancelamento do inventário em execução."""
+        if messagebox.askyesno("Cancelar", "Deseja interromper o inventário em execução?", parent=self):
+            self.cancel_button.configure(state="disabled", text="Cancelando...")
+            self.master.cancel_inventory()
+        self.grab_set()
+
     def finish_process(self, final_message):
         """Finaliza o modal, habilitando o botão de fechar e exibindo um pop-up."""
         self.title("Processo Concluído")
         self.progress_bar.set(1.0)
         self.master.reset_ui()
+        self.cancel_button.configure(state="disabled")
         self.close_button.configure(state="normal")
         self.protocol("WM_DELETE_WINDOW", self.destroy)
         messagebox.showinfo("Concluído", final_message, parent=self)
@@ -303,7 +317,7 @@ class SSHCredentialsFrame(ctk.CTkFrame):
         self.ssh_user_entry = ctk.CTkEntry(self, font=THEME["font_body"])
         self.ssh_user_entry.insert(0, self.config.get("last_ssh_user", ""))
         self.ssh_user_entry.grid(row=2, column=0, columnspan=3, sticky="ew", pady=(0, THEME["padding_sm"]))
-        Tooltip(self.ssh_user_entry, "Usuário para a conexão SSH (ex: root, admin). Campo obrigatório.")
+        Tooltip(self.ssh_user_entry, "Usuário para a conexão SSH (ex: root, admin). Campo obrigatório.\nOutros conjuntos, tentados em caso de falha de autenticação: 'ssh_credentials' no config.json.")
 
         self.ssh_pass_entry = ctk.CTkEntry(self, show="*", placeholder_text="Senha SSH (se não usar chave)", font=THEME["font_body"])
         self.ssh_pass_entry.grid(row=3, column=0, columnspan=3, sticky="ew", pady=(0, THEME["padding_sm"]))
@@ -359,6 +373,7 @@ class App(ctk.CTk):
             self.iconbitmap(icon_path)
 
         self.is_running = False
+        self.engine: Optional[InventoryEngine] = None
         self.log_queue = queue.Queue()
         self.config = self.load_config()
 
@@ -486,7 +501,7 @@ class App(ctk.CTk):
         ctk.CTkLabel(main_frame, text="Destino dos Dados", font=THEME["font_h2"]).grid(row=3, column=0, columnspan=3, sticky="w", pady=(THEME["padding"], 5))
         ctk.CTkLabel(main_frame, text="Formato de Saída:", font=THEME["font_body"]).grid(row=4, column=0, sticky="w")
         self.spreadsheet_output_format_var = ctk.StringVar(value=self.config.get("spreadsheet_format", "XLSX"))
-        spreadsheet_output_menu = ctk.CTkOptionMenu(main_frame, variable=self.spreadsheet_output_format_var, values=["XLSX", "CSV"])
+        spreadsheet_output_menu = ctk.CTkOptionMenu(main_frame, variable=self.spreadsheet_output_format_var, values=["XLSX", "CSV", "PARQUET"])
         spreadsheet_output_menu.grid(row=4, column=1, sticky="w", columnspan=2)
         Tooltip(spreadsheet_output_menu, "Escolha o formato do arquivo de relatório final.")
 
@@ -526,7 +541,7 @@ class App(ctk.CTk):
 
         self.oracle_output_format_label = ctk.CTkLabel(ssh_dest_frame, text="Formato de Saída:", font=THEME["font_body"])
         self.oracle_output_format_var = ctk.StringVar(value=self.config.get("oracle_output_format", "XLSX"))
-        self.oracle_output_menu = ctk.CTkOptionMenu(ssh_dest_frame, variable=self.oracle_output_format_var, values=["XLSX", "CSV"])
+        self.oracle_output_menu = ctk.CTkOptionMenu(ssh_dest_frame, variable=self.oracle_output_format_var, values=["XLSX", "CSV", "PARQUET"])
         self.toggle_oracle_output_format()
 
     def create_config_tab(self):
@@ -560,6 +575,33 @@ class App(ctk.CTk):
         self.timeout_slider.configure(command=lambda v: self.timeout_label.configure(text=f"{int(v)}s"))
         Tooltip(self.timeout_slider, "Tempo máximo em segundos para aguardar uma resposta de cada computador antes de desistir.")
 
+        ctk.CTkLabel(perf_frame, text="Prazo por Host (segundos):", font=THEME["font_body"]).grid(row=3, column=0, sticky="w", padx=(15,10), pady=(0, 15))
+        self.host_deadline_slider = ctk.CTkSlider(perf_frame, from_=0, to=300, number_of_steps=20)
+        self.host_deadline_slider.set(self.config.get("host_deadline", 120))
+        self.host_deadline_slider.grid(row=3, column=1, sticky="ew", pady=(0, 15))
+        self.host_deadline_label = ctk.CTkLabel(perf_frame, text=self._format_deadline(self.host_deadline_slider.get()), width=40, font=THEME["font_body"])
+        self.host_deadline_label.grid(row=3, column=2, padx=(10, 15), pady=(0, 15))
+        self.host_deadline_slider.configure(command=lambda v: self.host_deadline_label.configure(text=self._format_deadline(v)))
+        Tooltip(self.host_deadline_slider, "Tempo total por computador (conexão + todos os comandos). Ao esgotar, os comandos\nrestantes são pulados e os dados parciais são salvos com status TIMEOUT_PARCIAL. 0 = sem limite.")
+
+        ctk.CTkLabel(perf_frame, text="Perfil de Coleta:", font=THEME["font_body"]).grid(row=4, column=0, sticky="w", padx=(15,10), pady=(0, 15))
+        self.profile_var = ctk.StringVar(value=self.config.get("collection_profile", "padrao"))
+        profile_menu = ctk.CTkOptionMenu(perf_frame, variable=self.profile_var, values=["minimo", "padrao", "completo"])
+        profile_menu.grid(row=4, column=1, sticky="w", pady=(0, 15))
+        Tooltip(profile_menu, "minimo: CPU, memória e sistema (mais rápido).\npadrao: CPU, placa-mãe, memória, disco e sistema.\ncompleto: relatório completo do inxi (-F), mais lento em máquinas antigas.")
+
+        self.profiler_var = ctk.BooleanVar(value=self.config.get("profiler", False))
+        profiler_checkbox = ctk.CTkCheckBox(perf_frame, text="Profiler de CPU", variable=self.profiler_var, font=THEME["font_body"])
+        profiler_checkbox.grid(row=5, column=0, sticky="w", padx=(15,10), pady=(0, 15))
+        Tooltip(profiler_checkbox, "Amostra a CPU de todas as threads durante o inventário. Ao final, as pilhas ficam em\nreports/perfil_cpu_*.folded (flame graph) e os pontos quentes vão para o log.")
+        profile_interval_frame = ctk.CTkFrame(perf_frame, fg_color="transparent")
+        profile_interval_frame.grid(row=5, column=1, sticky="w", pady=(0, 15))
+        ctk.CTkLabel(profile_interval_frame, text="Intervalo (ms):", font=THEME["font_body"]).pack(side="left", padx=(0, 10))
+        self.profile_interval_entry = ctk.CTkEntry(profile_interval_frame, width=60, font=THEME["font_body"])
+        self.profile_interval_entry.insert(0, f"{self.config.get('profile_interval', 0.02) * 1000:g}")
+        self.profile_interval_entry.pack(side="left")
+        Tooltip(self.profile_interval_entry, "Intervalo entre amostras do profiler. Menor = mais detalhe e mais custo.")
+
         oracle_defaults_frame = ctk.CTkFrame(main_frame)
         oracle_defaults_frame.grid(row=1, column=0, sticky="ew")
         oracle_defaults_frame.grid_columnconfigure(1, weight=1)
@@ -577,6 +619,20 @@ class App(ctk.CTk):
         self.config_oracle_query_textbox.grid(row=3, column=0, columnspan=2, sticky="ew", padx=15, pady=(0, 15))
         Tooltip(self.config_oracle_query_textbox, "Define a query padrão para buscar os terminais no Modo Oracle.")
 
+    def _profile_interval(self, fallback: Optional[float] = None) -> float:
+        """Intervalo do profiler em segundos, lido do campo em milissegundos. Sem `fallback`, levanta ValueError se for inválido."""
+        try:
+            interval = float(self.profile_interval_entry.get().strip().replace(",", "."))
+            if interval > 0: return interval / 1000
+        except ValueError: pass
+        if fallback is not None: return fallback
+        raise ValueError("O intervalo do profiler deve ser um número de milissegundos maior que zero.")
+
+    @staticmethod
+    def _format_deadline(value: float) -> str:
+        """Formata o valor do slider de prazo por host (0 significa sem limite)."""
+        return f"{int(value)}s" if int(value) else "∞"
+
     def create_sobre_tab(self):
         """Cria os widgets da aba 'Sobre'."""
         tab = self.tab_view.tab("Sobre")
@@ -636,8 +692,10 @@ class App(ctk.CTk):
             filepath = filedialog.asksaveasfilename(title="Salvar Planilha Modelo", defaultextension=".xlsx", initialfile="modelo_inventario.xlsx", filetypes=[("Planilha Excel", "*.xlsx")])
             if not filepath: return
 
-            df = pd.DataFrame({"IP": ["192.168.1.10", "192.168.1.11"], "NROEMPRESA": [1, 1], "NROCHECKOUT": [101, 102]})
-            df.to_excel(filepath, index=False)
+            from openpyxl import Workbook
+            workbook = Workbook(); sheet = workbook.active
+            for row in (("IP", "NROEMPRESA", "NROCHECKOUT"), ("192.168.1.10", 1, 101), ("192.168.1.11", 1, 102)): sheet.append(row)
+            workbook.save(filepath)
             messagebox.showinfo("Modelo Criado", f"A planilha modelo foi salva com sucesso em:\n{filepath}")
         except Exception as e:
             messagebox.showerror("Erro ao Criar Modelo", f"Ocorreu um erro:\n{e}")
@@ -697,7 +755,8 @@ class App(ctk.CTk):
             self.run_button.configure(state="disabled", text="Executando...")
             LogModal(self)
             # Inicia o motor em uma thread separada para não travar a UI
-            threading.Thread(target=lambda: InventoryEngine(engine_config, self.log_queue).run_inventory(), daemon=True).start()
+            self.engine = InventoryEngine(engine_config, self.log_queue)
+            threading.Thread(target=self.engine.run_inventory, daemon=True).start()
         except ValueError as e:
             messagebox.showerror("Erro de Configuração", str(e), parent=self)
             self.reset_ui()
@@ -769,9 +828,15 @@ class App(ctk.CTk):
         # 1. Coleta configurações gerais
         config = {
             "max_workers": int(self.workers_slider.get()),
-            "ssh_timeout": int(self.timeout_slider.get())
+            "ssh_timeout": int(self.timeout_slider.get()),
+            "host_deadline": int(self.host_deadline_slider.get()),
+            "collection_profile": self.profile_var.get(),
+            "profiler": self.profiler_var.get(),
+            "profile_interval": self._profile_interval()
         }
 
+        config.update({key: self.config[key] for key in ADVANCED_CONFIG_KEYS if key in self.config})
+
         # 2. Coleta configurações específicas do modo (Planilha ou Oracle)
         active_tab = self.tab_view.get()
         if "Planilha" in active_tab:
@@ -792,6 +857,11 @@ class App(ctk.CTk):
 
         return config
 
+    def cancel_inventory(self):
+        """Repassa ao motor o pedido de cancelamento cooperativo."""
+        if self.engine is not None:
+            self.engine.cancel()
+
     def reset_ui(self):
         """Restaura o estado da UI para 'não executando'."""
         self.is_running = False
@@ -839,11 +909,17 @@ class App(ctk.CTk):
             "last_ssh_key_path": ssh_creds["key_path"],
             "max_workers": int(self.workers_slider.get()),
             "ssh_timeout": int(self.timeout_slider.get()),
+            "host_deadline": int(self.host_deadline_slider.get()),
+            "collection_profile": self.profile_var.get(),
+            "profiler": self.profiler_var.get(),
+            "profile_interval": self._profile_interval(self.config.get("profile_interval", 0.02)),
             "save_to_db": self.oracle_save_to_db_var.get(),
             "oracle_table": self.config_oracle_table_entry.get(),
             "oracle_query": self.config_oracle_query_textbox.get("1.0", "end-1c").strip(),
             "show_welcome_modal": self.config.get("show_welcome_modal", True)
         }
+        # Preserva as opções avançadas, que não possuem campos na interface
+        config_to_save.update({key: self.config[key] for key in ADVANCED_CONFIG_KEYS if key in self.config})
         try:
             with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
                 json.dump(config_to_save, f, indent=4)
@@ -854,6 +930,7 @@ class App(ctk.CTk):
         """Lida com o evento de fechamento da janela principal."""
         if self.is_running:
             if messagebox.askyesno("Sair", "O inventário ainda está em execução. Deseja realmente sair e interromper o processo?"):
+                self.cancel_inventory()
                 self.destroy()
         else:
             self.save_config()
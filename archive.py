@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+archive.py: Arquivo das saídas brutas da coleta do invent-ssh.
+
+Com `archive_outputs`, a saída de cada comando remoto é guardada comprimida (zlib) num
+armazenamento endereçado pelo conteúdo (`archive/objetos/<sha256>`): saídas idênticas
+em hosts diferentes (o mesmo `lscpu` em mil PDVs do mesmo modelo) ocupam um único objeto.
+Cada execução grava um manifesto (`archive/execucoes/<data_hora>.json`) com, por host,
+a identificação do terminal, o status final e o hash e o sucesso de cada comando, além
+das linhas de entrada (com o status das que nem chegaram à fila, como IP inválido ou
+sem DNS), para que o replay refaça o relatório completo, com as linhas duplicadas.
+
+O modo replay reexecuta os parsers atuais do inspector.py sobre uma execução arquivada,
+sem rede, e gera o relatório completo em segundos. Assim uma correção de parser é
+aplicada à frota inteira sem uma nova coleta.
+
+Uso:
+    python archive.py --list                 # execuções arquivadas
+    python archive.py                        # replay da última execução
+    python archive.py --run 20250913_080000 --format CSV
+"""
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import zlib
+from datetime import datetime
+from queue import Queue
+from typing import Any, Dict, List, Optional, Tuple
+
+from state import JsonStateStore
+
+ARCHIVE_DIR = "archive"
+
+def host_key(scope: Optional[str], host: str) -> str:
+    """Chave de um host no manifesto: o próprio host ou, numa rede isolada por gateway, `escopo|host`."""
+    return host if scope is None else f"{scope}|{host}"
+
+class OutputArchive:
+    """Armazenamento endereçado pelo conteúdo das saídas brutas, com um manifesto por execução."""
+    def __init__(self, base_dir: str = ARCHIVE_DIR):
+        self.base_dir = base_dir
+        self.objects_dir = os.path.join(base_dir, "objetos")
+        self.runs_dir = os.path.join(base_dir, "execucoes")
+        self._lock = threading.Lock()
+        self._known: set = set()
+        self.stored, self.reused = 0, 0
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        """Guarda `data` (se ainda não existir) e retorna o seu hash SHA-256."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest in self._known: self.reused += 1; return digest
+        path = self._object_path(digest)
+        if os.path.exists(path): reused = True
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f: f.write(zlib.compress(data, 9))
+            os.replace(tmp_path, path); reused = False
+        with self._lock:
+            self._known.add(digest)
+            if reused: self.reused += 1
+            else: self.stored += 1
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with open(self._object_path(digest), 'rb') as f: return zlib.decompress(f.read())
+
+    def runs(self) -> List[str]:
+        """Execuções arquivadas, da mais antiga para a mais recente."""
+        if not os.path.isdir(self.runs_dir): return []
+        return sorted(name[:-5] for name in os.listdir(self.runs_dir) if name.endswith(".json"))
+
+    def start_run(self, profile: str) -> 'ArchivedRun':
+        started = datetime.now()
+        run = ArchivedRun(self, JsonStateStore(os.path.join(self.runs_dir, f"{started:%Y%m%d_%H%M%S}.json")))
+        run.manifest.set('inicio', started.isoformat(timespec='seconds')); run.manifest.set('perfil', profile)
+        return run
+
+    def load_run(self, run_id: Optional[str] = None) -> JsonStateStore:
+        """Manifesto da execução `run_id` (padrão: a mais recente). Levanta ValueError se não existir."""
+        runs = self.runs()
+        if run_id is None and runs: run_id = runs[-1]
+        if run_id not in runs: raise ValueError(f"Execução arquivada não encontrada em '{self.runs_dir}': {run_id or '(nenhuma)'}")
+        return JsonStateStore(os.path.join(self.runs_dir, f"{run_id}.json"))
+
+    def outputs(self, entry: Dict[str, Any]) -> Dict[str, Tuple[bytes, bool]]:
+        """Saídas gravadas de um host do manifesto (`comando -> (saída, sucesso)`)."""
+        return {command: (self.get(digest), ok) for command, (digest, ok) in entry.get('comandos', {}).items()}
+
+class ArchivedRun:
+    """Manifesto de uma execução em andamento; `add_host` é chamado pelos workers ao fim de cada coleta."""
+    def __init__(self, archive: OutputArchive, manifest: JsonStateStore):
+        self.archive, self.manifest = archive, manifest
+
+    def add_host(self, host: str, nro_empresa: Any, nro_checkout: Any, hw_info: Dict[str, Any], recorded: Dict[str, Tuple[bytes, bool]]):
+        commands = {command: [self.archive.put(data), ok] for command, (data, ok) in recorded.items()}
+        entry = {'nro_empresa': nro_empresa, 'nro_checkout': nro_checkout, 'status': hw_info.get('status'), 'erro': hw_info.get('erro'), 'dta_coleta': datetime.now().isoformat(timespec='seconds'), 'comandos': commands}
+        with self.manifest.lock: self.manifest.section('hosts')[host] = entry
+
+    def finish(self, rows: List[List[Any]], finals: Dict[str, Tuple[Any, Any, Optional[str], Optional[str], int]]):
+        """
+        Registra as linhas de entrada (`[ip, nro_empresa, nro_checkout, escopo, status]`, status só
+        nas excluídas antes da coleta) e o desfecho de cada host (`chave -> (nro_empresa, nro_checkout,
+        status, dta_coleta, retentativas)`), inclusive dos finalizados sem coleta (disjuntor aberto).
+        """
+        with self.manifest.lock:
+            hosts = self.manifest.section('hosts')
+            for host, (nro_empresa, nro_checkout, status, collected_at, retries) in finals.items():
+                entry = hosts.setdefault(host, {'nro_empresa': nro_empresa, 'nro_checkout': nro_checkout, 'erro': None, 'comandos': {}})
+                entry.update(status=status, dta_coleta=collected_at or entry.get('dta_coleta'), retentativas=retries)
+            self.manifest.set('linhas', rows)
+
+    def save(self):
+        self.manifest.save()
+
+    def summary(self) -> str:
+        return f"{len(self.manifest.section('hosts'))} hosts, {self.archive.stored} saídas novas e {self.archive.reused} repetidas (deduplicadas) em '{self.manifest.path}'"
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay offline de uma execução arquivada do invent-ssh (parsers atuais, sem rede).")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="Pasta do arquivo (padrão: archive).")
+    parser.add_argument("--run", help="Execução a reprocessar (padrão: a mais recente).")
+    parser.add_argument("--format", default="XLSX", choices=("XLSX", "CSV", "PARQUET"), help="Formato do relatório.")
+    parser.add_argument("--list", action="store_true", help="Lista as execuções arquivadas e sai.")
+    parser.add_argument("--profile", action="store_true", help="Amostra a CPU durante o replay (pilhas em reports/perfil_cpu_*.folded).")
+    args = parser.parse_args()
+    if args.list:
+        for run_id in OutputArchive(args.dir).runs(): print(run_id)
+        return 0
+    from core import InventoryEngine  # o core importa este módulo; aqui só é usado pela linha de comando
+    log_queue: Queue = Queue()
+    engine = InventoryEngine({'mode': 'Replay', 'archive_dir': args.dir, 'output_format': args.format, 'results_backend': 'planilha', 'profiler': args.profile}, log_queue)
+    engine.replay_inventory(args.run)
+    while not log_queue.empty():
+        level, message, _ = log_queue.get()
+        if level not in ("PROGRESS", "OPEN_FILE", "FINISH"): print(f"{level:<7} {message}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+backends.py: Destinos dos resultados do invent-ssh.
+
+Todo destino segue a mesma interface, e o motor entrega os terminais em lotes:
+
+    backend.open()
+    backend.write_batch(terminais)   # uma ou mais vezes
+    backend.close()                  # ou abort(), se algo falhar no caminho
+
+- SpreadsheetBackend: relatório XLSX/CSV (export.py) ou histórico Parquet (history.py).
+- OracleBackend: MERGE na tabela de inventário (upsert.py).
+- SqliteBackend: a mesma tabela (DDL, limites de tamanho e semântica do MERGE) num
+  arquivo SQLite local, para testar e medir a gravação sem um Oracle.
+"""
+import os
+import sqlite3
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional
+
+from export import ReportWriter, report_rows
+from state import JsonStateStore, cache_path
+from upsert import ORACLE, SQLITE, OracleDialect, upsert
+
+try:
+    import oracledb
+except ImportError:
+    oracledb = None
+
+# Campos do Terminal gravados no Oracle (os demais ficam só na planilha), na ordem de
+# upsert.UPSERT_COLUMNS, o que permite passar cada linha como tupla (bind por posição).
+ORACLE_BIND_FIELDS = ('nro_empresa', 'nro_checkout', 'ip', 'status', 'placa_mae', 'processador', 'cores_threads', 'ram', 'disk_type', 'disk_size', 'distro', 'kernel', 'dta_atualizacao')
+oracle_bind_values = attrgetter(*ORACLE_BIND_FIELDS)
+
+SQLITE_PATH = os.path.join("reports", "inventario.db")
+
+Log = Callable[..., None]
+
+class ResultsBackend:
+    """Destino dos resultados. `log(nível, mensagem, valor=None)` é o log do motor."""
+    name = "resultados"
+    failure_message = "Falha ao salvar os resultados"
+
+    def __init__(self, config: Dict[str, Any], log: Log):
+        self.config, self.log = config, log
+
+    def open(self):
+        pass
+
+    def write_batch(self, results: List[Any]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Libera os recursos após uma falha, sem concluir a gravação pendente."""
+        pass
+
+class SpreadsheetBackend(ResultsBackend):
+    """Relatório XLSX ou CSV em `reports/`, ou uma nova execução no histórico Parquet (`output_format` PARQUET)."""
+    name = "planilha"
+    failure_message = "Falha ao salvar planilha de resultados"
+
+    def __init__(self, config: Dict[str, Any], log: Log):
+        super().__init__(config, log)
+        self.output_format = config.get('output_format', 'XLSX').upper()
+        self.writer: Optional[ReportWriter] = None
+        self.pending: List[Any] = []
+        if self.output_format == 'PARQUET':
+            import history  # importado só quando pedido: o pyarrow é pesado e opcional
+            if history.pa is not None: self.failure_message = "Falha ao gravar o histórico Parquet"; return
+            self.log("WARNING", "'pyarrow' não está instalado. Formato Parquet indisponível; salvando em XLSX.")
+            self.output_format = 'XLSX'
+
+    def open(self):
+        if self.output_format == 'PARQUET': return
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output_dir = "reports"
+        os.makedirs(output_dir, exist_ok=True)
+        filename_suffix = 'csv' if self.output_format == 'CSV' else 'xlsx'
+        self.writer = ReportWriter(os.path.join(output_dir, f"inventario_hardware_{timestamp}.{filename_suffix}"), filename_suffix)
+
+    def write_batch(self, results: List[Any]):
+        # O histórico grava um arquivo Parquet por execução: os lotes são reunidos até o close()
+        if self.writer is None: self.pending.extend(results)
+        else: self.writer.write(report_rows(results))
+
+    def close(self):
+        if self.writer is None:
+            import history
+            base_dir = self.config.get('history_dir', history.HISTORY_DIR)
+            path = history.append_run(self.pending, datetime.now(), base_dir)
+            self.log("INFO", f"{len(self.pending)} resultados acrescentados ao histórico em '{path}'")
+            self.log("OPEN_FILE", "Abrindo pasta do histórico...", os.path.abspath(base_dir))
+            return
+        self.writer.close()
+        self.log("INFO", f"Resultados salvos com sucesso em '{self.writer.filename}'")
+        self.log("OPEN_FILE", "Abrindo arquivo de resultado...", os.path.abspath(self.writer.filename))
+
+    def abort(self):
+        if self.writer is not None: self.writer.discard()
+
+class OracleBackend(ResultsBackend):
+    """
+    Tabela de inventário no Oracle. Cada lote é gravado e confirmado por upsert() com a
+    estratégia `oracle_save_strategy` ('linha' ou 'lote'); com `oracle_change_only` (padrão),
+    terminais cujo hardware não mudou desde a última gravação (hash em cache/oracle_hashes.json)
+    recebem só STATUS e DTAATUALIZACAO.
+    """
+    name = "Oracle"
+    failure_message = "Erro crítico ao salvar no Oracle"
+    dialect: OracleDialect = ORACLE
+
+    def __init__(self, config: Dict[str, Any], log: Log):
+        super().__init__(config, log)
+        self.table = config['oracle_table']
+        self.strategy = config.get('oracle_save_strategy', 'linha')
+        self.conn: Any = None
+        self.hash_store: Optional[JsonStateStore] = None
+        self.hashes: Optional[Dict[str, str]] = None
+        self.stats: Dict[str, Any] = {'linhas': 0, 'erros': 0, 'alterados': 0, 'inalterados': 0, 'touch': 0.0, 'staging': 0.0, 'merge': 0.0}
+
+    def target(self) -> str:
+        """Identifica o banco de destino (chave do mapa de hashes)."""
+        db_config = self.config.get('oracle_config') or {}
+        return f"{db_config.get('user')}@{db_config.get('host')}:{db_config.get('port')}/{db_config.get('service')}"
+
+    def connect(self) -> Any:
+        db_config = self.config['oracle_config']
+        dsn = f"{db_config['host']}:{db_config['port']}/{db_config['service']}"
+        return oracledb.connect(user=db_config['user'], password=db_config['password'], dsn=dsn)
+
+    def _check_and_create_table(self, cursor: Any) -> bool:
+        """Verifica se a tabela de destino existe e, se não, tenta criá-la."""
+        try:
+            cursor.execute(f"SELECT 1 FROM {self.dialect.table_name(self.table)} WHERE 1=0")
+            self.log("INFO", f"Tabela '{self.table}' encontrada."); return True
+        except Exception as e:
+            if self.dialect.missing_table(e):
+                self.log("WARNING", f"Tabela '{self.table}' não encontrada. Tentando criar...")
+                try: cursor.execute(self.dialect.create_table_sql(self.table)); self.log("INFO", f"Tabela '{self.table}' criada com sucesso."); return True
+                except Exception as ce: self.log("ERROR", f"Falha ao criar a tabela '{self.table}': {ce}"); return False
+            else: self.log("ERROR", f"Erro ao verificar a tabela '{self.table}': {e}"); raise e
+
+    def open(self):
+        if self.config.get('oracle_change_only', True):
+            self.hash_store = JsonStateStore(self.config.get('oracle_hash_cache_path', cache_path('oracle_hashes.json')))
+            self.hashes = self.hash_store.section(f"{self.target()}|{self.table}")
+        self.conn = self.connect()
+        cursor = self.conn.cursor()
+        try: table_ready = self._check_and_create_table(cursor)
+        finally: cursor.close()
+        if not table_ready: raise RuntimeError("Abortado: tabela não pôde ser criada/encontrada.")
+
+    def write_batch(self, results: List[Any]):
+        stats = upsert(self.conn, self.dialect, self.table, [oracle_bind_values(r) for r in results], self.strategy, self.config.get('oracle_staging_table'), self.hashes)
+        for key, value in stats.items(): self.stats[key] += value
+
+    def close(self):
+        stats = self.stats
+        phases = f"staging {stats['staging']:.2f}s + MERGE {stats['merge']:.2f}s" if self.strategy == 'lote' else f"MERGE linha a linha {stats['merge']:.2f}s"
+        if self.hashes is not None: phases = f"UPDATE de status {stats['touch']:.2f}s + {phases}"
+        self.log("INFO", f"{stats['linhas'] - stats['erros']} registros salvos/atualizados em '{self.table}' ({self.name}, {phases}).")
+        if self.hashes is not None: self.log("INFO", f"{self.name}: {stats['alterados']} registros com hardware alterado (MERGE completo), {stats['inalterados']} inalterados (só STATUS/DTAATUALIZACAO).")
+        if stats['erros']: self.log("WARNING", f"{stats['erros']} registros rejeitados pelo banco.")
+        self._release()
+
+    def abort(self):
+        self._release()  # lotes já confirmados continuam valendo, assim como seus hashes
+
+    def _release(self):
+        if self.hash_store is not None:
+            try: self.hash_store.save()
+            except OSError as e: self.log("WARNING", f"Não foi possível gravar o cache de hashes do {self.name}: {e}")
+        if self.conn is not None:
+            try: self.conn.close()
+            except Exception: pass
+            self.conn = None
+
+class SqliteBackend(OracleBackend):
+    """A tabela de inventário num arquivo SQLite local, com o mesmo DDL e a mesma semântica de MERGE do Oracle."""
+    name = "SQLite"
+    failure_message = "Erro crítico ao salvar no SQLite"
+    dialect = SQLITE
+
+    def __init__(self, config: Dict[str, Any], log: Log, path: str = SQLITE_PATH):
+        super().__init__(dict(config, oracle_table=config.get('oracle_table') or 'BAR_HARDWARE_PDV'), log)
+        self.path = path
+
+    def target(self) -> str:
+        return self.path
+
+    def connect(self) -> Any:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return sqlite3.connect(self.path)
@@ -0,0 +1,358 @@
+"""
+benchmark.py: Medições de desempenho do invent-ssh para o DESENVOLVEDOR.
+
+Este script reúne benchmarks usados para calibrar as opções de desempenho da
+aplicação. Cada medição é um subcomando:
+
+- perfis: compara, em um host real, o tempo de execução remota e o volume de
+  dados retornado por cada perfil de coleta (inxi e sondas manuais).
+- xlsx: compara o tempo e o pico de memória (RSS) da exportação XLSX via
+  pandas/`to_excel` e via writer em modo somente escrita, cada um em um
+  processo separado para que o pico de um não contamine o outro.
+- memoria: mede a memória ocupada por N resultados de coleta e o custo de
+  serializá-los para o MERGE do Oracle, comparando o Terminal antigo (com
+  __dict__, um str por host e dicts por linha) com o compacto (slots, tabela
+  de textos compartilhados e tuplas).
+- oracle: compara as estratégias de gravação 'linha' (MERGE por linha) e
+  'lote' (staging + MERGE set-based) num banco SQLite local ou, com `--dsn`,
+  numa tabela Oracle real, e o ganho da gravação só das mudanças (hash de
+  conteúdo) quando o hardware da frota não mudou. Com `--batch`, mede também o
+  backend de resultados com cada tamanho de lote e, com `--invalid`, o custo
+  das linhas rejeitadas pelo banco.
+- ordem: executa o motor sobre uma frota simulada (sem SSH; cada host "dorme"
+  a sua duração) na ordem de entrada e na ordem LPT aprendida do histórico, e
+  compara o tempo total e a cauda (do primeiro worker ocioso até o fim).
+
+Uso:
+    python benchmark.py perfis --host 10.1.3.20 --user root --key ~/.ssh/id_rsa
+    python benchmark.py xlsx --rows 50000
+    python benchmark.py memoria --terminals 100000
+    python benchmark.py oracle --rows 20000
+    python benchmark.py oracle --rows 20000 --batch 500 5000 0 --invalid 0.01
+    python benchmark.py ordem --hosts 400 --workers 20
+    python benchmark.py oracle --rows 20000 --dsn host:1521/servico --user usuario --table ESQUEMA.TABELA_TESTE
+"""
+import argparse
+import dataclasses
+import gc
+import getpass
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import List, Optional
+
+import paramiko
+
+from inspector import COLLECTION_PROFILES, CollectionContext, _collect_manually, _load_private_key, _run_command, inxi_command
+
+def print_table(headers: List[str], rows: List[List[str]]):
+    """Imprime uma tabela simples alinhada por colunas."""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    print("   " + "  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("   " + "  ".join("-" * w for w in widths))
+    for row in rows:
+        print("   " + "  ".join(str(cell).ljust(w) for cell, w in zip(row, widths)))
+
+def peak_rss_bytes() -> Optional[int]:
+    """Pico de memória residente do processo atual, em bytes (None se a plataforma não informar)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError: pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [(name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+        counters = ProcessMemoryCounters(); counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError): return None
+
+def fake_terminals(count: int) -> list:
+    """Resultados sintéticos, com textos do tamanho dos reais, para os benchmarks de exportação."""
+    from core import Terminal
+    now = datetime.now()
+    return [Terminal(ip=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", nro_empresa=float(i // 40 + 1), nro_checkout=float(i % 40 + 1), status="SUCESSO" if i % 10 else "FALHA_CONEXAO",
+                     placa_mae="PCWARE - IPX4120G", processador="Intel(R) Celeron(R) N4120 CPU @ 1.10GHz", cores_threads="4/4", ram="8GB DDR4", disk_type="SSD", disk_size="128GB",
+                     distro="Ubuntu 18.04.3 LTS", kernel="5.4", dta_atualizacao=now) for i in range(count)]
+
+def _xlsx_child(args: argparse.Namespace) -> int:
+    """Executa um único writer e imprime o resultado em JSON (chamado pelo processo pai)."""
+    results = fake_terminals(args.rows)
+    baseline = peak_rss_bytes()
+    filename = os.path.join(tempfile.mkdtemp(), "bench.xlsx")
+    started = time.perf_counter()
+    if args.writer == "pandas":
+        import pandas as pd
+        from dataclasses import asdict
+        df = pd.DataFrame([asdict(r) for r in results])
+        for col in ('dta_atualizacao', 'dta_ultima_tentativa'): df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
+        df.to_excel(filename, index=False, engine='openpyxl')
+    else:
+        from export import report_rows, write_xlsx
+        write_xlsx(filename, report_rows(results))
+    elapsed = time.perf_counter() - started
+    peak = peak_rss_bytes()
+    print(json.dumps({'tempo': elapsed, 'pico': peak, 'base': baseline, 'tamanho': os.path.getsize(filename)}))
+    os.remove(filename)
+    return 0
+
+def bench_xlsx(args: argparse.Namespace) -> int:
+    """Compara as exportações XLSX (pandas e somente escrita) com `--rows` linhas sintéticas."""
+    if args.writer: return _xlsx_child(args)
+    rows = []
+    for writer in ("pandas", "streaming"):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "xlsx", "--rows", str(args.rows), "--writer", writer], capture_output=True, text=True, check=True).stdout
+        data = json.loads(output.strip().splitlines()[-1])
+        mib = lambda value: f"{value / 1024**2:.0f} MiB" if value is not None else "n/d"
+        extra = data['pico'] - data['base'] if data['pico'] is not None and data['base'] is not None else None
+        rows.append([writer, f"{data['tempo']:.2f}s", mib(data['pico']), mib(extra), f"{data['tamanho'] / 1024**2:.1f} MiB"])
+    print(f"\n[xlsx] {args.rows} linhas\n")
+    print_table(["Writer", "Tempo", "Pico RSS", "Acréscimo na escrita", "Arquivo"], rows)
+    return 0
+
+# Combinações de hardware da frota sintética (placa-mãe, processador, RAM, distro)
+FLEET_MODELS = [(f"PCWARE - IPX{1000 + i * 37}G", f"Intel(R) Celeron(R) J{4000 + i * 5} CPU @ 2.00GHz", f"{4 * (1 + i % 4)}GB DDR{3 + i % 2}", f"Ubuntu {16 + 2 * (i % 3)}.04.{i % 5} LTS") for i in range(12)]
+
+def fake_collections(count: int) -> list:
+    """Retornos sintéticos de get_hardware_info. Cada texto é um objeto novo, como ao decodificar a saída SSH de cada host."""
+    fresh = lambda text: text.encode().decode()
+    collections = []
+    for i in range(count):
+        board, cpu, ram, distro = FLEET_MODELS[i % len(FLEET_MODELS)]
+        collections.append({'placa_mae': fresh(board), 'processador': fresh(cpu), 'cores_threads': fresh("4/4"), 'ram': fresh(ram), 'disk_type': fresh("SSD"), 'disk_size': fresh("128GB"), 'distro': fresh(distro), 'kernel': fresh("5.4"), 'status': "SUCESSO"})
+    return collections
+
+def bench_memory(args: argparse.Namespace) -> int:
+    """Compara a memória de `--terminals` resultados (e da serialização para o Oracle) nas representações antiga e compacta."""
+    from backends import ORACLE_BIND_FIELDS, oracle_bind_values
+    from core import Terminal, apply_hardware_info
+    LegacyTerminal = dataclasses.make_dataclass("LegacyTerminal", [(f.name, f.type, dataclasses.field(default=f.default)) for f in dataclasses.fields(Terminal)])
+    def legacy(count: int):
+        results = []
+        for i, info in enumerate(fake_collections(count)):
+            terminal = LegacyTerminal(ip=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", nro_empresa=i // 40 + 1, nro_checkout=i % 40 + 1, dta_atualizacao=datetime.now())
+            for key, value in info.items(): setattr(terminal, key, value)
+            results.append(terminal)
+        return results, lambda: [{f: getattr(r, f) for f in ORACLE_BIND_FIELDS} for r in results]
+    def compact(count: int):
+        results, interned = [], {}
+        for i, info in enumerate(fake_collections(count)):
+            terminal = Terminal(ip=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", nro_empresa=i // 40 + 1, nro_checkout=i % 40 + 1, dta_atualizacao=datetime.now())
+            apply_hardware_info(terminal, info, interned)
+            results.append(terminal)
+        return results, lambda: [oracle_bind_values(r) for r in results]
+
+    rows = []
+    for label, build in (("antigo", legacy), ("compacto", compact)):
+        gc.collect(); tracemalloc.start()
+        results, serialize = build(args.terminals)
+        gc.collect(); held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        binds = serialize()
+        peak = tracemalloc.get_traced_memory()[1] - held
+        del binds, results, serialize; tracemalloc.stop()
+        rows.append([label, f"{held / 1024**2:.1f} MiB", f"{held / args.terminals:.0f} B", f"{peak / 1024**2:.1f} MiB"])
+    print(f"\n[memoria] {args.terminals} terminais\n")
+    print_table(["Representação", "Resultados", "Por terminal", "Serialização (Oracle)"], rows)
+    return 0
+
+def bench_oracle(args: argparse.Namespace) -> int:
+    """
+    Grava `--rows` resultados sintéticos três vezes por estratégia (inserção, atualização
+    completa e regravação sem mudanças com o mapa de hashes) e mede o tempo de cada fase.
+    Sem `--dsn`, usa um banco SQLite temporário.
+    """
+    import sqlite3
+    from backends import oracle_bind_values
+    from upsert import ORACLE, SQLITE, STRATEGIES, upsert
+    rows = [oracle_bind_values(r) for r in fake_terminals(args.rows)]
+    if args.dsn:
+        import oracledb
+        password = getpass.getpass(f"Senha Oracle de {args.user}@{args.dsn}: ")
+        connect, dialect = lambda: oracledb.connect(user=args.user, password=password, dsn=args.dsn), ORACLE
+    else:
+        directory = tempfile.mkdtemp()
+        connect, dialect = lambda: sqlite3.connect(os.path.join(directory, f"bench_{time.time_ns()}.db")), SQLITE
+    table = []
+    for strategy in STRATEGIES:
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            if args.dsn: cursor.execute(f"DELETE FROM {args.table}"); conn.commit()
+            else: cursor.execute(dialect.create_table_sql(args.table))
+            cursor.close()
+            hashes = {}
+            for phase, phase_hashes in (("inserção", hashes), ("atualização", None), ("sem mudanças", hashes)):
+                started = time.perf_counter()
+                stats = upsert(conn, dialect, args.table, rows, strategy, hashes=phase_hashes)
+                elapsed = time.perf_counter() - started
+                table.append([strategy, phase, f"{elapsed:.2f}s", f"{stats['touch']:.2f}s", f"{stats['staging']:.2f}s", f"{stats['merge']:.2f}s", f"{args.rows / elapsed:.0f}", stats['erros']])
+        finally:
+            conn.close()
+    print(f"\n[oracle] {args.rows} linhas, {dialect.name}\n")
+    print_table(["Estratégia", "Fase", "Total", "Hash + UPDATE", "Staging", "MERGE", "Linhas/s", "Erros"], table)
+    if args.batch: bench_backend_batches(args)
+    return 0
+
+def bench_backend_batches(args: argparse.Namespace):
+    """Grava `--rows` resultados pelo backend (SQLite ou, com `--dsn`, Oracle) com cada tamanho de lote de `--batch`."""
+    from backends import OracleBackend, SqliteBackend
+    results = fake_terminals(args.rows)
+    step = int(1 / args.invalid) if args.invalid else 0
+    for i in range(0, len(results), step or len(results) + 1): results[i].ip = "x" * 40  # excede o VARCHAR2(15) de IP
+    password = getpass.getpass(f"Senha Oracle de {args.user}@{args.dsn}: ") if args.dsn else None
+    table = []
+    for strategy in ("linha", "lote"):
+        for batch_size in args.batch:
+            config = {'oracle_table': args.table, 'oracle_save_strategy': strategy, 'oracle_change_only': False}
+            if args.dsn:
+                host, _, service = args.dsn.partition('/')
+                config['oracle_config'] = {'user': args.user, 'password': password, 'host': host.split(':')[0], 'port': host.partition(':')[2] or 1521, 'service': service}
+                backend = OracleBackend(config, lambda *_: None)
+            else: backend = SqliteBackend(config, lambda *_: None, os.path.join(tempfile.mkdtemp(), "bench.db"))
+            started = time.perf_counter()
+            backend.open()
+            for start in range(0, len(results), batch_size or len(results)): backend.write_batch(results[start:start + (batch_size or len(results))])
+            backend.close()
+            elapsed = time.perf_counter() - started
+            table.append([strategy, batch_size or "tudo", f"{elapsed:.2f}s", f"{args.rows / elapsed:.0f}", backend.stats['erros']])
+    print(f"\n[oracle] backend de resultados, {args.rows} linhas ({args.invalid:.1%} inválidas)\n")
+    print_table(["Estratégia", "Lote", "Total", "Linhas/s", "Erros"], table)
+
+# Frota simulada: (fração dos hosts, duração típica da coleta em segundos)
+MOCK_FLEET = ((0.80, 2.5), (0.12, 6.0), (0.05, 15.0), (0.03, 25.0))
+
+def mock_fleet(hosts: int, rng: random.Random) -> dict:
+    """IP -> duração real da coleta, com variação log-normal em torno da duração típica do perfil."""
+    durations = {}
+    for i in range(hosts):
+        draw, typical = rng.random(), MOCK_FLEET[-1][1]
+        for fraction, seconds in MOCK_FLEET:
+            if draw < fraction: typical = seconds; break
+            draw -= fraction
+        durations[f"10.{i // 256 % 256}.{i % 256}.10"] = typical * rng.lognormvariate(0, 0.2)
+    return durations
+
+def bench_order(args: argparse.Namespace) -> int:
+    """
+    Roda `_execute_collection` sobre `--hosts` hosts simulados com `--workers` workers, na
+    ordem de entrada e na ordem LPT. O histórico conhece `--known` dos hosts, com ruído
+    log-normal `--noise`; os tempos são escalados por `--scale` (e exibidos já desescalados).
+    """
+    import core
+    from core import InventoryEngine, Terminal
+    from queue import Queue
+    from schedule import HostDurations
+    from state import JsonStateStore
+    durations = mock_fleet(args.hosts, random.Random(args.seed))
+    finished: List[float] = []
+    def fake_collect(ip: str, **_) -> dict:
+        time.sleep(durations[ip] * args.scale); finished.append(time.monotonic())
+        return {'status': "SUCESSO"}
+    core.get_hardware_info = fake_collect
+    bound = max(sum(durations.values()) / args.workers, max(durations.values()))
+    rows = []
+    for label, order in (("entrada", "entrada"), ("LPT (histórico)", "duracao")):
+        rng, directory = random.Random(args.seed + 1), tempfile.mkdtemp()
+        history = HostDurations(JsonStateStore(os.path.join(directory, "duracoes.json")))
+        for i, (ip, seconds) in enumerate(durations.items()):
+            if rng.random() < args.known: history.record(ip, i // 20 + 1, seconds * rng.lognormvariate(0, args.noise))
+        history.save()
+        config = {'mode': "Planilha", 'max_workers': args.workers, 'ssh_timeout': 5, 'ssh_user': "bench", 'capability_cache': False, 'breaker_threshold': 0,
+                  'probe_stats_path': os.path.join(directory, "sondas.json"), 'host_durations_path': os.path.join(directory, "duracoes.json"), 'credential_map_path': os.path.join(directory, "credenciais.json"),
+                  'dns_cache_path': os.path.join(directory, "dns.json"), 'host_order': order}
+        engine = InventoryEngine(config, Queue())
+        engine.terminals = [Terminal(ip=ip, nro_empresa=i // 20 + 1, nro_checkout=i % 20 + 1) for i, ip in enumerate(durations)]
+        random.Random(args.seed + 2).shuffle(engine.terminals)
+        finished.clear()
+        started = time.monotonic()
+        engine._execute_collection()
+        ends = sorted(t - started for t in finished)
+        makespan = ends[-1] / args.scale
+        first_idle = ends[max(0, len(ends) - args.workers)] / args.scale  # fila vazia: a partir daqui algum worker fica ocioso
+        rows.append([label, f"{makespan:.0f}s", f"{makespan - first_idle:.0f}s", f"{makespan / bound:.2f}x"])
+    print(f"\n[ordem] {args.hosts} hosts simulados, {args.workers} workers, {args.known:.0%} com histórico (ruído {args.noise})\n")
+    print_table(["Ordem", "Tempo total", "Cauda", "vs. limite inferior"], rows)
+    print(f"\n   Limite inferior (max(soma/workers, maior host)): {bound:.0f}s")
+    return 0
+
+def bench_profiles(args: argparse.Namespace) -> int:
+    """
+    Executa, para cada perfil de coleta, o comando inxi e as sondas manuais do perfil
+    `--repeat` vezes no mesmo host, medindo o tempo de parede e os bytes retornados.
+    """
+    password = None if args.key else getpass.getpass(f"Senha SSH de {args.user}@{args.host}: ")
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(hostname=args.host, port=args.port, username=args.user, password=password, pkey=_load_private_key(args.key), timeout=30, allow_agent=False, look_for_keys=False)
+    rows = []
+    try:
+        for profile in COLLECTION_PROFILES:
+            for label, run in (("inxi", lambda ctx: _run_command(ctx, inxi_command(ctx.profile))), ("manual", _collect_manually)):
+                timings, sizes, commands = [], [], 0
+                for _ in range(args.repeat):
+                    ctx = CollectionContext(client, profile=profile, fixed_order=True, max_channels=1)
+                    started = time.perf_counter()
+                    run(ctx)
+                    timings.append(time.perf_counter() - started); sizes.append(ctx.bytes_read); commands = ctx.commands_run
+                rows.append([profile, label, f"{statistics.median(timings):.2f}s", f"{min(timings):.2f}s", f"{statistics.median(sizes) / 1024:.1f} KiB", commands])
+    finally:
+        client.close()
+    print(f"\n[perfis] {args.host}, {args.repeat} repetições (mediana e melhor tempo)\n")
+    print_table(["Perfil", "Estratégia", "Mediana", "Melhor", "Payload", "Comandos"], rows)
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do invent-ssh.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    profiles = subparsers.add_parser("perfis", help="Compara os perfis de coleta em um host real.")
+    profiles.add_argument("--host", required=True)
+    profiles.add_argument("--port", type=int, default=22)
+    profiles.add_argument("--user", required=True)
+    profiles.add_argument("--key", help="Chave privada SSH. Sem ela, a senha é pedida no terminal.")
+    profiles.add_argument("--repeat", type=int, default=3)
+    profiles.set_defaults(func=bench_profiles)
+
+    xlsx = subparsers.add_parser("xlsx", help="Compara tempo e pico de memória da exportação XLSX.")
+    xlsx.add_argument("--rows", type=int, default=50000)
+    xlsx.add_argument("--writer", choices=("pandas", "streaming"), help=argparse.SUPPRESS)
+    xlsx.set_defaults(func=bench_xlsx)
+
+    memory = subparsers.add_parser("memoria", help="Mede a memória dos resultados de coleta.")
+    memory.add_argument("--terminals", type=int, default=100000)
+    memory.set_defaults(func=bench_memory)
+
+    oracle = subparsers.add_parser("oracle", help="Compara as estratégias de gravação no Oracle (ou SQLite local).")
+    oracle.add_argument("--rows", type=int, default=20000)
+    oracle.add_argument("--dsn", help="DSN Oracle (host:porta/serviço). Sem ele, usa um SQLite temporário.")
+    oracle.add_argument("--user")
+    oracle.add_argument("--table", default="BAR_HARDWARE_PDV_BENCH", help="Tabela de teste (com --dsn, precisa existir; é esvaziada a cada estratégia).")
+    oracle.add_argument("--batch", type=int, nargs="*", help="Tamanhos de lote a comparar no backend de resultados (0 = tudo de uma vez).")
+    oracle.add_argument("--invalid", type=float, default=0.0, help="Fração de linhas inválidas (IP longo demais) no teste de lotes.")
+    oracle.set_defaults(func=bench_oracle)
+
+    order = subparsers.add_parser("ordem", help="Compara a ordem de entrada e a ordem LPT numa frota simulada.")
+    order.add_argument("--hosts", type=int, default=400)
+    order.add_argument("--workers", type=int, default=20)
+    order.add_argument("--known", type=float, default=0.9, help="Fração dos hosts com duração no histórico.")
+    order.add_argument("--noise", type=float, default=0.3, help="Desvio (log-normal) entre o histórico e a duração real.")
+    order.add_argument("--scale", type=float, default=0.01, help="Fator de tempo real da simulação.")
+    order.add_argument("--seed", type=int, default=7)
+    order.set_defaults(func=bench_order)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -150,6 +150,8 @@ def main() -> int:
         "--distpath", TEMP_DIST_DIR,
         "--workpath", TEMP_BUILD_DIR,
         "--add-data", add_data_arg,
+        # O pandas só é usado para ler planilhas .xls; fora do executável ele infla o bundle e a inicialização
+        "--exclude-module", "pandas",
     ]
 
     # Adiciona o ícone se ele existir na pasta
@@ -6,24 +6,42 @@ Este módulo contém a lógica principal para carregar os dados dos terminais,
 orquestrar a coleta de informações de hardware em paralelo e salvar os
 resultados na fonte de destino (planilha ou banco de dados Oracle).
 """
-import pandas as pd
 import concurrent.futures
 from datetime import datetime
 import os
+import math
+import ipaddress
+import heapq
+import random
+import threading
+import time
 from queue import Queue
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Callable
+from collections import deque
 import csv
+import sys
 import logging
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 
-from inspector import get_hardware_info
+from inspector import get_hardware_info, replay_hardware_info, GatewayPool, CapabilityCache, ProbeStats, OutputSizeHistogram, ParseCache, COMMAND_TIMEOUT
+from state import JsonStateStore, cache_path
+import backends
+from backends import SQLITE_PATH, OracleBackend, ResultsBackend, SpreadsheetBackend, SqliteBackend
+from targets import DNS_FAILURE_STATUS, HostResolver, LazyTargets, TargetIndex
+from schedule import HostDurations
+from archive import ARCHIVE_DIR, ArchivedRun, OutputArchive, host_key
+from credentials import Credential, CredentialMap, credential_sets
+from profiler import SamplingProfiler
 
 try:
     import oracledb
 except ImportError:
     oracledb = None
 
-@dataclass
+# Com slots (Python 3.10+), cada Terminal dispensa o __dict__ por instância
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_SLOTS)
 class Terminal:
     """Representa um único terminal (PDV) a ser inventariado."""
     ip: str
@@ -39,6 +57,108 @@ class Terminal:
     distro: Optional[str] = None
     kernel: Optional[str] = None
     dta_atualizacao: Optional[datetime] = None
+    retentativas: int = 0
+    dta_ultima_tentativa: Optional[datetime] = None
+
+# Falhas transitórias que voltam para a fila de retentativas. FALHA_AUTH nunca entra
+# aqui, para não bloquear contas por excesso de tentativas.
+TRANSIENT_STATUSES = ("ERRO_SSH", "FALHA_CONEXAO")
+
+# Resultados que nada dizem sobre a rede do host (não alimentam disjuntores nem o histórico de
+# durações): cancelamento e gateway sem canal livre, em que o PDV nem chegou a ser tentado.
+NEUTRAL_STATUSES = (None, "CANCELADO", "GATEWAY_SATURADO")
+
+TERMINAL_FIELDS = frozenset(f.name for f in fields(Terminal))
+
+# Campos de hardware que se repetem por toda a frota: cada texto distinto é guardado uma única vez
+INTERNED_FIELDS = frozenset(('status', 'placa_mae', 'processador', 'cores_threads', 'ram', 'disk_type', 'disk_size', 'distro', 'kernel'))
+
+def apply_hardware_info(terminal: Terminal, hw_info: Dict[str, Any], interned: Dict[str, str]):
+    """
+    Copia para o terminal os campos conhecidos de `hw_info` (chaves extras, como 'erro', são
+    ignoradas). Os textos de hardware passam pela tabela `interned`, de modo que milhares de
+    terminais com a mesma placa-mãe ou distro compartilham o mesmo objeto str.
+    """
+    for key, value in hw_info.items():
+        if key not in TERMINAL_FIELDS: continue
+        if key in INTERNED_FIELDS and isinstance(value, str): value = interned.setdefault(value, value)
+        setattr(terminal, key, value)
+
+def _read_table(filepath: str) -> Iterator[List[Any]]:
+    """
+    Lê as linhas de uma planilha (a primeira é o cabeçalho) sem pandas: CSV pelo módulo `csv`
+    com o separador detectado na primeira linha e XLSX pelo openpyxl em modo somente leitura.
+    Apenas .xls, que o openpyxl não lê, importa o pandas (opcional).
+    """
+    if filepath.endswith('.xls'):
+        try: import pandas as pd
+        except ImportError: raise ValueError("arquivos .xls exigem o pacote opcional 'pandas'; salve a planilha como .xlsx ou .csv")
+        df = pd.read_excel(filepath)
+        yield list(df.columns)
+        for row in df.itertuples(index=False): yield [None if isinstance(v, float) and math.isnan(v) else v for v in row]
+    elif filepath.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            for row in workbook.worksheets[0].iter_rows(values_only=True):
+                if any(value is not None for value in row): yield list(row)
+        finally: workbook.close()
+    else:
+        with open(filepath, 'r', newline='', encoding='utf-8-sig') as f:
+            first_line = f.readline(); f.seek(0)
+            try: dialect = csv.Sniffer().sniff(first_line, delimiters=";,\t|")
+            except csv.Error: dialect = csv.excel  # arquivo de uma coluna só: não há separador a detectar
+            for row in csv.reader(f, dialect):
+                if row: yield row
+
+def _to_number(value: Any) -> Optional[float]:
+    """Converte NROEMPRESA/NROCHECKOUT para número (int quando inteiro); valores vazios ou inválidos viram None."""
+    if value is None or isinstance(value, bool): return None
+    try: number = float(value.strip()) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError): return None
+    if math.isnan(number): return None
+    return int(number) if number.is_integer() else number
+
+class CircuitBreaker:
+    """
+    Disjuntor de um escopo (loja ou sub-rede /24). Abre após `threshold` falhas de
+    conexão consecutivas; passado o `cooldown`, libera um único host de teste
+    (semiaberto) e fecha novamente se ele conectar. Até o teste falhar, os hosts do
+    escopo aguardam; depois disso, são rejeitados até o próximo teste.
+    """
+    CLOSED, OPEN, HALF_OPEN = "FECHADO", "ABERTO", "SEMIABERTO"
+
+    def __init__(self, scope: str, threshold: int, cooldown: float):
+        self.scope, self.threshold, self.cooldown = scope, threshold, cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe: Optional[Terminal] = None
+        self.probe_failed = False
+
+    def admit(self, terminal: Terminal) -> str:
+        """Retorna 'ok' (pode conectar), 'open' (rejeitar: o teste de recuperação falhou) ou 'wait' (aguardar o cooldown ou o host de teste)."""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED: return "ok"
+        if self.state == self.OPEN: return "open" if self.probe_failed else "wait"
+        if self.probe is None: self.probe = terminal; return "ok"
+        return "ok" if self.probe is terminal else "wait"
+
+    def record(self, terminal: Terminal, success: Optional[bool]) -> Optional[str]:
+        """Registra o resultado de conexão de um host do escopo e retorna o novo estado, se houve transição."""
+        was_probe = self.probe is terminal
+        if was_probe: self.probe = None
+        if success is None: return None
+        if success:
+            self.failures = 0; self.probe_failed = False
+            if self.state != self.CLOSED: self.state = self.CLOSED; return self.state
+            return None
+        self.failures += 1
+        if (self.state == self.HALF_OPEN and was_probe) or (self.state == self.CLOSED and self.failures >= self.threshold):
+            self.probe_failed = self.state == self.HALF_OPEN
+            self.state, self.opened_at = self.OPEN, time.monotonic(); return self.state
+        return None
 
 class InventoryEngine:
     """
@@ -50,6 +170,27 @@ class InventoryEngine:
         self.log_queue = log_queue
         self.terminals: List[Terminal] = []
         self.logger = logging.getLogger(__name__)
+        self.gateway_pool: Optional[GatewayPool] = None
+        self.cancel_event = threading.Event()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.capability_cache: Optional[CapabilityCache] = None
+        if config.get('capability_cache', True):
+            self.capability_cache = CapabilityCache(JsonStateStore(config.get('capability_cache_path', cache_path('capacidades.json'))), max_age_days=config.get('capability_max_age_days', 30))
+        self.probe_stats = ProbeStats(JsonStateStore(config.get('probe_stats_path', cache_path('sondas.json'))))
+        self.resolver = HostResolver(JsonStateStore(config.get('dns_cache_path', cache_path('dns.json'))), ttl=config.get('dns_cache_ttl', 3600), negative_ttl=config.get('dns_negative_ttl', 300), timeout=config.get('dns_timeout', 2.0), workers=config.get('dns_workers', 32))
+        self.addresses: Dict[str, str] = {}
+        self.credential_map = CredentialMap(JsonStateStore(config.get('credential_map_path', cache_path('credenciais.json'))))
+        self.credentials: List[Credential] = []
+        self.host_durations = HostDurations(JsonStateStore(config.get('host_durations_path', cache_path('duracoes.json'))))
+        self.estimate: Callable[[str, Optional[int]], float] = self.host_durations.estimator()
+        self.run_deadline: Optional[float] = None
+        self.deferred: List[Terminal] = []
+        self.archive_run: Optional[ArchivedRun] = None
+        self.profiler: Optional[SamplingProfiler] = None
+        self.output_histogram = OutputSizeHistogram()
+        parse_cache_size = config.get('parse_cache_size', 1024)
+        self.parse_cache = ParseCache(parse_cache_size) if parse_cache_size else None
+        self.interned: Dict[str, str] = {}
 
     def log(self, level: str, message: str, value: Any = None):
         """Envia uma mensagem de log para a fila da UI e para o arquivo de log."""
@@ -60,12 +201,18 @@ class InventoryEngine:
     def run_inventory(self):
         """Ponto de entrada principal para iniciar o processo de inventário."""
         try:
-            self.log("INFO", f"Iniciando inventário em 'Modo {self.config['mode']}'")
+            self._start_profiler()
+            self.log("INFO", f"Iniciando inventário em 'Modo {self.config['mode']}' (perfil de coleta '{self.config.get('collection_profile', 'padrao')}')")
             self._load_terminals()
+            if self.cancel_event.is_set():
+                self.log("WARNING", "Inventário cancelado antes da coleta."); return
             if not self.terminals:
                 self.log("ERROR", "Nenhum terminal encontrado. Processo abortado."); return
             self.log("INFO", f"{len(self.terminals)} terminais carregados. Iniciando coleta...")
             results = self._execute_collection()
+            self._log_probe_report()
+            self._log_output_sizes()
+            self._log_parse_cache()
             if not results:
                 self.log("WARNING", "Nenhum dado de hardware foi coletado.")
             else:
@@ -75,6 +222,58 @@ class InventoryEngine:
             self.log("ERROR", f"Erro crítico no motor da aplicação: {e}")
             self.logger.critical("Erro crítico no InventoryEngine", exc_info=True)
         finally:
+            self._finish_profiler()
+            self.log("FINISH", "Processo concluído!")
+
+    def replay_inventory(self, run_id: Optional[str] = None):
+        """
+        Refaz o relatório de uma execução arquivada (archive.py) com os parsers atuais, sem rede.
+        Cada host mantém o status e a data da coleta original; hosts sem saídas gravadas
+        (falhas de conexão ou autenticação, disjuntor aberto) entram no relatório como foram
+        coletados. As linhas de entrada passam de novo pelo TargetIndex, de modo que as linhas
+        duplicadas, as inválidas e as sem DNS voltam ao relatório como na execução original.
+        """
+        try:
+            self._start_profiler()
+            archive = OutputArchive(self.config.get('archive_dir', ARCHIVE_DIR))
+            manifest = archive.load_run(run_id)
+            profile = manifest.get('perfil', 'padrao')
+            hosts = manifest.section('hosts')
+            self.log("INFO", f"Replay de '{manifest.path}': {len(hosts)} hosts coletados em {manifest.get('inicio')} (perfil '{profile}').")
+            started = time.monotonic()
+            # Manifestos anteriores ao registro das linhas de entrada: uma linha por host coletado
+            lines = manifest.get('linhas') or [[ip, entry.get('nro_empresa'), entry.get('nro_checkout'), None, None] for ip, entry in hosts.items()]
+            rows, scopes, excluded = [], {}, {}
+            for ip, nro_empresa, nro_checkout, scope, status in lines:
+                row = Terminal(ip=ip, nro_empresa=nro_empresa, nro_checkout=nro_checkout); rows.append(row); scopes[id(row)] = scope
+                if status: excluded[id(row)] = status
+            def expand(row: Terminal, ip: str) -> Terminal:
+                terminal = Terminal(ip=ip, nro_empresa=row.nro_empresa); scopes[id(terminal)] = scopes[id(row)]
+                return terminal
+            index = TargetIndex(rows, expand, lambda terminal: scopes.get(id(terminal)))
+            for row in rows:
+                if id(row) in excluded and index.key(row) in index.groups: index.exclude(index.key(row), excluded[id(row)])
+            results: List[Terminal] = []
+            queue = index.queue()
+            while queue:
+                terminal = queue.popleft()
+                entry = hosts.get(host_key(index.scope(terminal), terminal.ip))
+                if entry is None: continue  # adiado pela janela de tempo ou descartado no cancelamento
+                hw_info = replay_hardware_info(archive.outputs(entry), profile, self.parse_cache) if entry.get('comandos') else {}
+                hw_info['status'] = entry.get('status')
+                apply_hardware_info(terminal, hw_info, self.interned)
+                terminal.retentativas = entry.get('retentativas', 0)
+                terminal.dta_atualizacao = terminal.dta_ultima_tentativa = datetime.fromisoformat(entry['dta_coleta']) if entry.get('dta_coleta') else None
+                results.append(terminal)
+            self.log("INFO", f"{len(results)} hosts reprocessados em {time.monotonic() - started:.2f}s. Salvando...")
+            self._log_parse_cache()
+            results = index.fan_out(results)
+            if results: self._save_results(results)
+        except Exception as e:
+            self.log("ERROR", f"Falha no replay da execução arquivada: {e}")
+            self.logger.critical("Erro no replay", exc_info=True)
+        finally:
+            self._finish_profiler()
             self.log("FINISH", "Processo concluído!")
 
     def _load_terminals(self):
@@ -88,12 +287,11 @@ class InventoryEngine:
         """Carrega a lista de terminais de um arquivo .xlsx ou .csv."""
         filepath = self.config['filepath']
         try:
-            df = pd.read_excel(filepath) if filepath.endswith(('.xlsx', '.xls')) else pd.read_csv(filepath, sep=None, engine='python')
-            df.columns = [str(col).upper() for col in df.columns]
-            if 'IP' not in df.columns: raise ValueError("O arquivo deve conter a coluna 'IP'")
-            df.dropna(subset=['IP'], inplace=True)
-            df = df[df['IP'].astype(str).str.strip() != '']
-            return [Terminal(ip=r['IP'], nro_empresa=pd.to_numeric(r.get('NROEMPRESA'), errors='coerce'), nro_checkout=pd.to_numeric(r.get('NROCHECKOUT'), errors='coerce')) for _, r in df.iterrows()]
+            rows = _read_table(filepath)
+            columns = [str(col).upper() for col in next(rows, [])]
+            if 'IP' not in columns: raise ValueError("O arquivo deve conter a coluna 'IP'")
+            records = (dict(zip(columns, values)) for values in rows)
+            return [Terminal(ip=str(r['IP']), nro_empresa=_to_number(r.get('NROEMPRESA')), nro_checkout=_to_number(r.get('NROCHECKOUT'))) for r in records if r.get('IP') is not None and str(r['IP']).strip() != '']
         except FileNotFoundError: self.log("ERROR", f"Arquivo não encontrado: {filepath}"); return []
         except ValueError as ve: self.log("ERROR", f"Erro de formatação na planilha: {ve}"); return []
         except Exception as e: self.log("ERROR", f"Falha ao ler planilha '{os.path.basename(filepath)}': {e}"); return []
@@ -111,102 +309,389 @@ class InventoryEngine:
                     cursor.execute(self.config['oracle_query'])
                     cols = [d[0].upper() for d in cursor.description]
                     rows = [dict(zip(cols, r)) for r in cursor.fetchall()]
-                    return [Terminal(ip=r['IP'], nro_empresa=r['NROEMPRESA'], nro_checkout=r['NROCHECKOUT']) for r in rows]
+                    terminals = [Terminal(ip=str(r['IP']).strip(), nro_empresa=r['NROEMPRESA'], nro_checkout=r['NROCHECKOUT']) for r in rows if r['IP'] is not None and str(r['IP']).strip() != '']
+                    if len(terminals) < len(rows): self.log("WARNING", f"{len(rows) - len(terminals)} linhas da query sem IP (nulo ou vazio) foram ignoradas.")
+                    return terminals
         except Exception as e: self.log("ERROR", f"Falha na conexão ou consulta ao Oracle: {e}"); return []
 
+    def cancel(self):
+        """Solicita o cancelamento cooperativo da execução (chamado pela UI)."""
+        if not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.log("WARNING", "Cancelamento solicitado. Aguardando a finalização dos hosts em andamento...")
+
     def _execute_collection(self) -> List[Terminal]:
-        """Executa a coleta de dados de hardware em paralelo para todos os terminais."""
+        """
+        Executa a coleta de dados de hardware em paralelo para todos os terminais.
+        Falhas transitórias voltam para uma fila de retentativas com backoff exponencial
+        e jitter, intercaladas com os hosts novos sem atrasá-los. Disjuntores por loja
+        e por sub-rede /24 descartam rapidamente os hosts de escopos fora do ar.
+        Cada host distinto é coletado uma única vez (ver TargetIndex) e o resultado é
+        replicado para as linhas duplicadas; redes e faixas são expandidas sob demanda.
+        """
         results: List[Terminal] = []
-        total = len(self.terminals)
-        conn_failures, processed, circuit_tripped = 0, 0, False
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.config['max_workers']) as executor:
-            future_map = {executor.submit(self._process_single_terminal, t): t for t in self.terminals}
-            for i, future in enumerate(concurrent.futures.as_completed(future_map)):
-                processed += 1
-                try:
-                    result = future.result()
-                    if result:
-                        results.append(result)
+        index = TargetIndex(self.terminals, lambda row, ip: Terminal(ip=ip, nro_empresa=row.nro_empresa), self._network_scope)
+        self.log("INFO", f"Alvos: {index.summary()}.")
+        for terminal in index.invalid: self.log("WARNING", f"IP inválido ignorado: '{terminal.ip}' (loja {terminal.nro_empresa}, checkout {terminal.nro_checkout})")
+        self._resolve_hostnames(index)
+        total = max(1, index.expected)
+        first_attempts, conn_failures, processed = 0, 0, 0
+        time_box = self.config.get('run_time_box', 0)
+        self.deferred = []
+        self.run_deadline = time.monotonic() + time_box if time_box else None
+        self.estimate = self.host_durations.estimator()
+        self.credentials = credential_sets(self.config)
+        if len(self.credentials) > 1: self.log("INFO", f"{len(self.credentials)} conjuntos de credenciais SSH: {', '.join(c.label for c in self.credentials)}.")
+        if self.config.get('archive_outputs'): self.archive_run = OutputArchive(self.config.get('archive_dir', ARCHIVE_DIR)).start_run(self.config.get('collection_profile', 'padrao'))
+        window = self.config.get('spread_window', 0)
+        if window: self.log("INFO", f"Hosts espalhados ao longo de {window / 60:.1f} min (um a cada {window / total:.1f}s, em média).")
+        fresh, held = index.queue(window, self.config.get('spread_jitter', 1.0), self._collection_order()), deque()
+        retries: List[Tuple[float, int, Terminal]] = []
+        in_flight: Dict[concurrent.futures.Future, Terminal] = {}
+        self.gateway_pool = GatewayPool(max_channels=self.config.get('jump_max_channels', 10), timeout=self.config['ssh_timeout'])
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.config['max_workers'])
+        try:
+            while fresh or retries or held or in_flight:
+                if self.cancel_event.is_set():
+                    results.extend(self._drain_after_cancel(in_flight))
+                    results.extend(t for _, _, t in retries); break
+                deferred_before = len(self.deferred)
+                for terminal in self._dispatch(executor, fresh, retries, held, in_flight):
+                    processed += 1; results.append(terminal)
+                    self.log("PROGRESS", f"Processado: {terminal.ip}", processed / total * 100)
+                if len(self.deferred) > deferred_before:
+                    processed += len(self.deferred) - deferred_before
+                    self.log("PROGRESS", f"Adiado: {self.deferred[-1].ip}", processed / total * 100)
+                if not in_flight:
+                    next_retry = retries[0][0] - time.monotonic() if retries else 0.5
+                    if fresh and not held: next_retry = min(next_retry, fresh.wait_time())
+                    self.cancel_event.wait(min(0.5, max(0.0, next_retry))); continue
+                done, _ = concurrent.futures.wait(in_flight, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    terminal = in_flight.pop(future)
+                    try: result = future.result()
+                    except Exception as exc: self.log("ERROR", f"Exceção ao processar {terminal.ip}: {exc}"); result = None
+                    self._record_breakers(terminal, result)
+                    if result and result.retentativas == 0:
+                        first_attempts += 1
                         if result.status == "FALHA_CONEXAO": conn_failures += 1
-                except Exception as exc: self.log("ERROR", f"Exceção ao processar {future_map[future].ip}: {exc}")
-                if not circuit_tripped and processed >= 10 and conn_failures == processed:
+                    if result and self._schedule_retry(result, retries): continue
+                    processed += 1
+                    if result: results.append(result)
+                    self.log("PROGRESS", f"Processado: {terminal.ip}", processed / total * 100)
+                if first_attempts >= 10 and conn_failures == first_attempts:
                     self.log("ERROR", "Circuit Breaker: 10/10 conexões iniciais falharam. Abortando.")
                     self.log("ERROR", "Verifique credenciais SSH, rede ou firewall.")
-                    circuit_tripped = True
-                    [f.cancel() for f in future_map]; break
-                self.log("PROGRESS", f"Processado: {future_map[future].ip}", (i + 1) / total * 100)
-        return results
+                    for future in in_flight: future.cancel()
+                    results.extend(t for _, _, t in retries); break
+        finally:
+            executor.shutdown(wait=not self.cancel_event.is_set())
+            self.gateway_pool.close()
+            self._save_caches()
+            if self.archive_run is not None: self._save_archive(index, results)
+        if self.deferred: self._report_deferred(index, time_box)
+        return index.fan_out(results)
+
+    def _resolve_hostnames(self, index: TargetIndex):
+        """
+        Resolve de uma vez, em paralelo e com prazo curto, os hostnames da coleta (exceto os
+        alcançados por gateway, que resolve os nomes do lado da loja). Os não resolvidos saem
+        da fila com status FALHA_DNS, sem ocupar workers; os demais conectam no endereço já resolvido.
+        """
+        keys = [key for key in index.hostnames() if self._jump_host_for(index.groups[key][0]) is None]
+        names = [name for _, name in keys]
+        if not names: return
+        started = time.monotonic()
+        self.addresses, failed = self.resolver.resolve_all(names)
+        for key in keys:
+            if key[1] in failed: index.exclude(key, DNS_FAILURE_STATUS); self.log("WARNING", f"Hostname não resolvido: '{key[1]}' ({failed[key[1]]})")
+        self.log("INFO", f"DNS: {len(names)} hostnames em {time.monotonic() - started:.1f}s ({self.resolver.cached} do cache), {len(failed)} sem resolução.")
+        try: self.resolver.save()
+        except OSError as e: self.log("WARNING", f"Não foi possível gravar o cache de DNS: {e}")
+
+    def _collection_order(self) -> Optional[Callable[[Terminal], Any]]:
+        """
+        Ordem LPT: os hosts com maior duração esperada (histórico em cache/duracoes.json) são
+        coletados primeiro, para a execução não terminar com uma cauda de hosts lentos.
+        `"host_order": "entrada"` mantém a ordem da planilha/query. Com `run_time_box`, a
+        prioridade é a idade dos dados (nunca coletados, depois a coleta mais antiga).
+        """
+        if self.run_deadline is not None:
+            self.log("INFO", f"Janela de {self.config['run_time_box'] / 60:.1f} min: dados mais antigos primeiro (nunca coletados, depois a última coleta com sucesso mais antiga).")
+            priority = self.host_durations.staleness(self.estimate)
+            return lambda terminal: priority(self._host_key(terminal), self._store_key(terminal))
+        if self.config.get('host_order', 'duracao') != 'duracao': return None
+        self.log("INFO", f"Ordem de coleta: mais demorados primeiro ({self.host_durations.known()} hosts com duração conhecida).")
+        return lambda terminal: self.estimate(self._host_key(terminal), self._store_key(terminal))
+
+    def _fits_time_box(self, terminal: Terminal, delay: float = 0.0) -> bool:
+        """Indica se a duração esperada do host (iniciado após `delay` segundos) cabe no tempo restante da janela."""
+        if self.run_deadline is None: return True
+        return time.monotonic() + delay + self.estimate(self._host_key(terminal), self._store_key(terminal)) <= self.run_deadline
+
+    def _report_deferred(self, index: TargetIndex, time_box: float):
+        """
+        Registra no log os hosts que não couberam na janela e grava todas as suas linhas em
+        `reports/adiados_<data>.csv`, no formato da planilha de entrada (IP;NROEMPRESA;NROCHECKOUT).
+        """
+        expected = sum(self.estimate(self._host_key(t), self._store_key(t)) for t in self.deferred)
+        self.log("WARNING", f"Janela de {time_box / 60:.1f} min esgotada: {len(self.deferred)} hosts adiados para a próxima execução (≈{expected / 60:.1f} min de coleta esperada).")
+        for terminal in self.deferred[:10]: self.log("INFO", f"  Adiado: {terminal.ip} (última coleta com sucesso: {self.host_durations.last_success(self._host_key(terminal)) or 'nunca'})")
+        if len(self.deferred) > 10: self.log("INFO", f"  ... e mais {len(self.deferred) - 10} hosts.")
+        try:
+            os.makedirs("reports", exist_ok=True)
+            filename = os.path.join("reports", f"adiados_{datetime.now():%Y%m%d_%H%M%S}.csv")
+            with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(["IP", "NROEMPRESA", "NROCHECKOUT", "ULTIMA_COLETA", "DURACAO_ESPERADA_S"])
+                for terminal in self.deferred:
+                    for row in index.rows(terminal):
+                        writer.writerow([row.ip, row.nro_empresa, row.nro_checkout, self.host_durations.last_success(self._host_key(terminal)) or "", f"{self.estimate(self._host_key(terminal), self._store_key(terminal)):.1f}"])
+            self.log("INFO", f"Lista dos hosts adiados salva em '{filename}'.")
+        except OSError as e: self.log("WARNING", f"Não foi possível gravar a lista de hosts adiados: {e}")
+
+    def _save_caches(self):
+        """Persiste o que foi aprendido sobre a frota nesta execução (a falha de um cache não impede a gravação dos demais)."""
+        caches = [("capacidades", self.capability_cache), ("sondas", self.probe_stats), ("durações", self.host_durations), ("credenciais", self.credential_map)]
+        for name, cache in caches:
+            if cache is None: continue
+            try: cache.save()
+            except OSError as e: self.log("WARNING", f"Não foi possível gravar o cache de {name}: {e}")
+
+    def _save_archive(self, index: TargetIndex, results: List[Terminal]):
+        """Grava o manifesto das saídas brutas arquivadas nesta execução (archive.py), com as linhas de entrada e o desfecho de cada host."""
+        excluded = {id(row) for row in index.invalid + index.unresolved}
+        try:
+            self.archive_run.finish([[row.ip, row.nro_empresa, row.nro_checkout, index.scope(row), row.status if id(row) in excluded else None] for row in self.terminals],
+                                    {host_key(index.scope(t), t.ip): (t.nro_empresa, t.nro_checkout, t.status, t.dta_atualizacao.isoformat(timespec='seconds') if t.dta_atualizacao else None, t.retentativas) for t in results})
+            self.archive_run.save()
+            self.log("INFO", f"Saídas arquivadas: {self.archive_run.summary()}.")
+        except OSError as e: self.log("WARNING", f"Não foi possível gravar o manifesto do arquivo de saídas: {e}")
+
+    def _start_profiler(self):
+        if self.config.get('profiler'):
+            self.profiler = SamplingProfiler(self.config.get('profile_interval', 0.02)); self.profiler.start()
+
+    def _finish_profiler(self):
+        """Para o profiler, grava as pilhas amostradas (collapsed stacks, para flame graphs) e registra os pontos quentes."""
+        if self.profiler is None: return
+        profiler, self.profiler = self.profiler, None
+        profiler.stop()
+        path = os.path.join("reports", f"perfil_cpu_{datetime.now():%Y%m%d_%H%M%S}.folded")
+        try: profiler.write(path)
+        except OSError as e: self.log("WARNING", f"Não foi possível gravar as pilhas do profiler: {e}"); path = None
+        self.log("INFO", f"Profiler: {profiler.samples} amostras, {profiler.total / 1e6:.2f}s {'de CPU' if profiler.mode == 'cpu' else 'de threads ativas'} (modo {profiler.mode}, a cada {profiler.interval * 1000:.0f}ms, custo de {profiler.overhead():.1%} de um núcleo)" + (f"; pilhas em '{path}'." if path else "."))
+        own, inclusive = profiler.hotspots(self.config.get('profile_top', 15))
+        if not own: return
+        self.log("INFO", "Pontos quentes (tempo próprio):")
+        for label, share in own: self.log("INFO", f"  {share:6.1%}  {label}")
+        self.log("INFO", "Pontos quentes (inclusivo):")
+        for label, share in inclusive: self.log("INFO", f"  {share:6.1%}  {label}")
+
+    def _log_probe_report(self):
+        """Registra no log as estatísticas acumuladas de cada sonda (sucesso, latência e custo esperado)."""
+        lines = self.probe_stats.report()
+        if not lines: return
+        self.log("INFO", f"Estatísticas das sondas (ordem {'fixa' if self._fixed_probe_order() else 'aprendida'}):")
+        for line in lines: self.log("INFO", f"  {line}")
+
+    def _log_output_sizes(self):
+        """Registra no log o histograma do tamanho das saídas remotas, para calibrar `max_output_bytes`."""
+        lines = self.output_histogram.report()
+        if not lines: return
+        self.log("INFO", "Tamanho das saídas dos comandos remotos:")
+        for line in lines: self.log("INFO", f"  {line}")
+
+    def _log_parse_cache(self):
+        """Registra no log os acertos do cache de parsing (saídas idênticas interpretadas uma única vez)."""
+        summary = self.parse_cache.report() if self.parse_cache is not None else None
+        if summary: self.log("INFO", f"Cache de parsing: {summary}.")
+
+    def _fixed_probe_order(self) -> bool:
+        return self.config.get('probe_order', 'aprendida') == 'fixa'
+
+    def _dispatch(self, executor: concurrent.futures.Executor, fresh: LazyTargets, retries: List[Tuple[float, int, Terminal]], held: deque, in_flight: Dict[concurrent.futures.Future, Terminal]) -> List[Terminal]:
+        """
+        Ocupa os workers livres, dando preferência às retentativas já vencidas, depois aos
+        hosts retidos por um disjuntor e, por fim, aos hosts novos (no ritmo da fila, quando
+        espalhados por `spread_window`). Hosts de um escopo com disjuntor aberto ficam retidos
+        até o teste de recuperação; só são descartados se ele falhar ou se não houver mais
+        nada a coletar. Com `run_time_box`, hosts novos cuja duração esperada não cabe no
+        tempo restante vão para `self.deferred`. Retorna os terminais descartados, já
+        finalizados com status CIRCUITO_ABERTO.
+        """
+        rejected, waiting = [], []
+        while len(in_flight) < self.config['max_workers']:
+            if retries and retries[0][0] <= time.monotonic(): terminal = heapq.heappop(retries)[2]
+            elif held: terminal = held.popleft()
+            elif fresh and fresh.wait_time() <= 0:
+                terminal = fresh.popleft()
+                if not self._fits_time_box(terminal): self.deferred.append(terminal); continue
+            else: break
+            verdict = self._admit(terminal)
+            if verdict == "wait": waiting.append(terminal)
+            elif verdict == "open": rejected.append(terminal)
+            else: in_flight[executor.submit(self._process_single_terminal, terminal)] = terminal
+        # Só restam hosts retidos: não vale esperar o fim do cooldown por eles
+        if not (fresh or retries or in_flight): rejected.extend(waiting); waiting = []
+        held.extend(waiting)
+        now = datetime.now()
+        for terminal in rejected: terminal.status = "CIRCUITO_ABERTO"; terminal.dta_atualizacao = terminal.dta_ultima_tentativa = now
+        return rejected
+
+    def _breaker_scopes(self, terminal: Terminal) -> List[str]:
+        """Escopos de disjuntor do terminal: a loja (NROEMPRESA) e a sub-rede /24 do IP."""
+        scopes = []
+        store = self._store_key(terminal)
+        if store is not None: scopes.append(f"loja {store}")
+        try: scopes.append(f"rede {ipaddress.ip_network(f'{str(terminal.ip).strip()}/24', strict=False)}")
+        except ValueError: pass
+        return scopes
+
+    def _breaker(self, scope: str) -> CircuitBreaker:
+        if scope not in self.breakers:
+            self.breakers[scope] = CircuitBreaker(scope, self.config.get('breaker_threshold', 3), self.config.get('breaker_cooldown', 60))
+        return self.breakers[scope]
+
+    def _admit(self, terminal: Terminal) -> str:
+        """Consulta os disjuntores do terminal: qualquer escopo aberto rejeita; semiaberto ocupado faz aguardar."""
+        if not terminal.ip or not self.config.get('breaker_threshold', 3): return "ok"
+        verdicts = []
+        for scope in self._breaker_scopes(terminal):
+            breaker = self._breaker(scope); previous = breaker.state
+            verdicts.append(breaker.admit(terminal))
+            if breaker.state != previous: self.log("INFO", f"Disjuntor {scope}: {breaker.state}. Testando recuperação com {terminal.ip}.")
+        if "open" in verdicts or "wait" in verdicts:
+            for scope in self._breaker_scopes(terminal): self._breaker(scope).record(terminal, None)
+        return "open" if "open" in verdicts else "wait" if "wait" in verdicts else "ok"
+
+    def _record_breakers(self, terminal: Terminal, result: Optional[Terminal]):
+        """Alimenta os disjuntores com o resultado de conexão do host e registra as transições no log."""
+        if not terminal.ip or not self.config.get('breaker_threshold', 3): return
+        status = result.status if result else None
+        success = None if status in NEUTRAL_STATUSES else status not in TRANSIENT_STATUSES
+        for scope in self._breaker_scopes(terminal):
+            breaker = self._breaker(scope)
+            transition = breaker.record(terminal, success)
+            if transition == CircuitBreaker.OPEN and breaker.probe_failed:
+                self.log("WARNING", f"Disjuntor {scope}: {transition} (teste de recuperação com {terminal.ip} falhou). Hosts restantes serão marcados como CIRCUITO_ABERTO.")
+            elif transition == CircuitBreaker.OPEN:
+                self.log("WARNING", f"Disjuntor {scope}: {transition} após {breaker.failures} falhas de conexão consecutivas. Hosts do escopo aguardam {breaker.cooldown}s pelo teste de recuperação.")
+            elif transition == CircuitBreaker.CLOSED:
+                self.log("INFO", f"Disjuntor {scope}: {transition}. Conexão restabelecida via {terminal.ip}.")
+
+    def _schedule_retry(self, terminal: Terminal, retries: List[Tuple[float, int, Terminal]]) -> bool:
+        """Agenda uma nova tentativa para falhas transitórias, respeitando `retry_max`."""
+        if terminal.status not in TRANSIENT_STATUSES or terminal.retentativas >= self.config.get('retry_max', 2): return False
+        # Backoff exponencial com "equal jitter": metade fixa, metade aleatória
+        delay = min(self.config.get('retry_max_delay', 120), self.config.get('retry_base_delay', 15) * 2 ** terminal.retentativas)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if not self._fits_time_box(terminal, delay): return False  # sem tempo na janela: fica com o status da última tentativa
+        terminal.retentativas += 1
+        heapq.heappush(retries, (time.monotonic() + delay, id(terminal), terminal))
+        self.log("INFO", f"Falha transitória em {terminal.ip} ({terminal.status}). Nova tentativa {terminal.retentativas} em {delay:.0f}s.")
+        return True
+
+    def _drain_after_cancel(self, in_flight: Dict[concurrent.futures.Future, Terminal]) -> List[Terminal]:
+        """Descarta os hosts não iniciados e aguarda os em andamento por no máximo `cancel_grace` segundos."""
+        running = {f for f in in_flight if not f.cancel()}
+        if len(running) < len(in_flight): self.log("WARNING", f"Cancelado: {len(in_flight) - len(running)} hosts não iniciados foram descartados.")
+        done, not_done = concurrent.futures.wait(running, timeout=self.config.get('cancel_grace', COMMAND_TIMEOUT + 5))
+        if not_done: self.log("WARNING", f"{len(not_done)} hosts não finalizaram a tempo e foram abandonados.")
+        drained = []
+        for future in done:
+            try:
+                result = future.result()
+                if result: drained.append(result)
+            except Exception as exc: self.log("ERROR", f"Exceção ao processar {in_flight[future].ip}: {exc}")
+        return drained
 
     def _process_single_terminal(self, terminal: Terminal) -> Optional[Terminal]:
         """Processa um único terminal, conectando via SSH e coletando os dados de hardware."""
         if not terminal.ip:
             terminal.status = "ERRO_SEM_IP"; terminal.dta_atualizacao = datetime.now()
             self.log("WARNING", f"Terminal ignorado por não possuir IP: {terminal}"); return terminal
-        hw_info = get_hardware_info(ip=terminal.ip, username=self.config['ssh_user'], password=self.config.get('ssh_pass'), key_path=self.config.get('ssh_key_path'), timeout=self.config['ssh_timeout'])
+        jump_host = self._jump_host_for(terminal)
+        host_budget = self.config.get('host_deadline')
+        started = time.monotonic()
+        deadline = started + host_budget if host_budget else None
+        recorded = {} if self.archive_run is not None else None
+        hw_info = get_hardware_info(ip=terminal.ip, username=self.config['ssh_user'], password=self.config.get('ssh_pass'), key_path=self.config.get('ssh_key_path'), timeout=self.config['ssh_timeout'], jump_host=jump_host, gateway_pool=self.gateway_pool, store=self._store_key(terminal), deadline=deadline, cancel_event=self.cancel_event, max_channels=self.config.get('channels_per_host', 3), capability_cache=self.capability_cache, probe_stats=self.probe_stats, fixed_order=self._fixed_probe_order(), profile=self.config.get('collection_profile', 'padrao'), max_output_bytes=self.config.get('max_output_bytes', 4 * 1024 * 1024), output_histogram=self.output_histogram, recorded=recorded, parse_cache=self.parse_cache, credentials=self.credential_map.order(self._host_key(terminal), self._store_key(terminal), self.credentials), address=self.addresses.get(terminal.ip), cache_key=self._host_key(terminal))
         status = hw_info.get("status")
+        if hw_info.get('credencial'): self.credential_map.record(self._host_key(terminal), self._store_key(terminal), hw_info['credencial'])
+        if status not in NEUTRAL_STATUSES: self.host_durations.record(self._host_key(terminal), self._store_key(terminal), time.monotonic() - started, success=status == "SUCESSO")
+        if recorded is not None and status != "CANCELADO":
+            try: self.archive_run.add_host(self._host_key(terminal), terminal.nro_empresa, terminal.nro_checkout, hw_info, recorded)
+            except OSError as e: self.log("WARNING", f"Não foi possível arquivar as saídas de {terminal.ip}: {e}")
         if status == "SUCESSO":
             terminal.status = "ONLINE"; self.log("INFO", f"Sucesso na coleta de {terminal.ip}")
         else:
             terminal.status = "OFFLINE" if status == "FALHA_CONEXAO" else status
             self.log("WARNING", f"Falha em {terminal.ip}: {hw_info.get('erro', 'Falha geral')}")
-        for key, value in hw_info.items(): setattr(terminal, key, value)
-        terminal.dta_atualizacao = datetime.now()
+        apply_hardware_info(terminal, hw_info, self.interned)
+        terminal.dta_atualizacao = terminal.dta_ultima_tentativa = datetime.now()
         return terminal
 
+    @staticmethod
+    def _store_key(terminal: Terminal) -> Optional[int]:
+        """Normaliza o NROEMPRESA do terminal (que pode vir como float ou NaN da planilha)."""
+        if terminal.nro_empresa is None or (isinstance(terminal.nro_empresa, float) and math.isnan(terminal.nro_empresa)): return None
+        return int(terminal.nro_empresa)
+
+    def _jump_host_for(self, terminal: Terminal) -> Optional[Dict[str, Any]]:
+        """Retorna o gateway (jump host) da loja do terminal ou o gateway global, se configurado."""
+        store = self._store_key(terminal)
+        store_gateway = (self.config.get('jump_hosts') or {}).get(str(store)) if store is not None else None
+        return store_gateway or self.config.get('jump_host') or None
+
+    def _network_scope(self, terminal: Terminal) -> Optional[str]:
+        """
+        Escopo de rede do terminal para o TargetIndex: lojas com gateway próprio (`jump_hosts`)
+        são redes isoladas, onde o mesmo IP privado pode ser outro PDV; as demais (conexão
+        direta ou pelo gateway global) compartilham a mesma rede.
+        """
+        store = self._store_key(terminal)
+        return f"loja {store}" if store is not None and (self.config.get('jump_hosts') or {}).get(str(store)) else None
+
+    def _host_key(self, terminal: Terminal) -> str:
+        """Chave do host nos caches da frota e no arquivo: o IP, prefixado pelo escopo quando a loja tem gateway próprio."""
+        return host_key(self._network_scope(terminal), terminal.ip)
+
+    def _results_backend(self) -> ResultsBackend:
+        """
+        Escolhe o destino dos resultados: `results_backend` ('planilha', 'oracle' ou 'sqlite')
+        ou, se ausente, Oracle no Modo Oracle com "Salvar no banco" e planilha nos demais casos.
+        """
+        kind = self.config.get('results_backend') or ('oracle' if self.config.get('mode') == 'Oracle' and self.config.get('save_to_db', False) else 'planilha')
+        if kind == 'sqlite': return SqliteBackend(self.config, self.log, self.config.get('sqlite_path', SQLITE_PATH))
+        if kind == 'oracle':
+            if self.config.get('oracle_standin'): return SqliteBackend(self.config, self.log, self.config['oracle_standin'])
+            if backends.oracledb is not None: return OracleBackend(self.config, self.log)
+            self.log("ERROR", "'oracledb' não está instalado. Salvando em planilha.")
+        return SpreadsheetBackend(self.config, self.log)
+
     def _save_results(self, results: List[Terminal]):
-        """Direciona o salvamento dos resultados com base na configuração."""
-        if self.config.get('mode') == 'Oracle' and self.config.get('save_to_db', False):
-            self._save_to_oracle(results)
-        else:
-            self._save_to_spreadsheet(results)
+        """
+        Grava os resultados no backend configurado. No banco, a chave é NROEMPRESA/NROCHECKOUT:
+        registros sem ela (hosts expandidos de redes/faixas, linhas sem checkout) não podem ser
+        gravados e vão, com aviso, para uma planilha de resultados à parte.
+        """
+        backend = self._results_backend()
+        if not isinstance(backend, SpreadsheetBackend):
+            unkeyed = [r for r in results if r.nro_empresa is None or r.nro_checkout is None]
+            if unkeyed:
+                self.log("WARNING", f"{backend.name}: {len(unkeyed)} registros sem NROEMPRESA/NROCHECKOUT (ex.: {unkeyed[0].ip}) não podem ser gravados no banco. Salvando-os em planilha.")
+                self._write_results(SpreadsheetBackend(self.config, self.log), unkeyed)
+                results = [r for r in results if r.nro_empresa is not None and r.nro_checkout is not None]
+        if results: self._write_results(backend, results)
 
-    def _save_to_spreadsheet(self, results: List[Terminal]):
-        """Salva os resultados em um arquivo, garantindo a formatação correta."""
+    def _write_results(self, backend: ResultsBackend, results: List[Terminal]):
+        """Grava `results` em `backend`, em lotes de `save_batch_size` terminais."""
+        batch_size = self.config.get('save_batch_size', 5000) or len(results) or 1
         try:
-            df = pd.DataFrame([asdict(r) for r in results])
-            df['dta_atualizacao'] = pd.to_datetime(df['dta_atualizacao']).dt.strftime('%Y-%m-%d %H:%M:%S')
-            df.rename(columns=lambda c: c.upper(), inplace=True)
-            df.rename(columns={'NRO_EMPRESA': 'NROEMPRESA', 'NRO_CHECKOUT': 'NROCHECKOUT', 'DTA_ATUALIZACAO': 'DTAATUALIZACAO', 'PLACA_MAE': 'PLACA_MAE', 'CORES_THREADS': 'CORES_THREADS', 'DISK_TYPE': 'TIPO_DISCO', 'DISK_SIZE': 'TAMANHO_DISCO'}, inplace=True)
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_dir = "reports"
-            os.makedirs(output_dir, exist_ok=True)
-            filename_suffix = self.config.get('output_format', 'XLSX').lower()
-            filename = os.path.join(output_dir, f"inventario_hardware_{timestamp}.{filename_suffix}")
-            if filename_suffix == 'csv':
-                df.to_csv(filename, index=False, sep=';', encoding='utf-8-sig', quoting=csv.QUOTE_ALL)
-            else:
-                df.to_excel(filename, index=False, engine='openpyxl')
-            self.log("INFO", f"Resultados salvos com sucesso em '{filename}'")
-            self.log("OPEN_FILE", "Abrindo arquivo de resultado...", os.path.abspath(filename))
+            backend.open()
+            for start in range(0, len(results), batch_size): backend.write_batch(results[start:start + batch_size])
+            backend.close()
         except Exception as e:
-            self.log("ERROR", f"Falha ao salvar planilha de resultados: {e}")
-
-    def _check_and_create_table(self, cursor: Any, table_name: str) -> bool:
-        """Verifica se a tabela de destino existe no Oracle e, se não, tenta criá-la."""
-        try:
-            cursor.execute(f"SELECT 1 FROM {table_name} WHERE 1=0")
-            self.log("INFO", f"Tabela '{table_name}' encontrada."); return True
-        except oracledb.DatabaseError as e:
-            if "ORA-00942" in str(e):
-                self.log("WARNING", f"Tabela '{table_name}' não encontrada. Tentando criar...")
-                pk_name = f"PK_{table_name.replace('.', '_')}"[:30]
-                create_sql = (f"CREATE TABLE {table_name} (NROEMPRESA NUMBER(4), NROCHECKOUT NUMBER(4), IP VARCHAR2(15), STATUS VARCHAR2(20), PLACA_MAE VARCHAR2(100), PROCESSADOR VARCHAR2(100), CORES_THREADS VARCHAR2(10), RAM VARCHAR2(20), TIPO_DISCO VARCHAR2(10), TAMANHO_DISCO VARCHAR2(20), DISTRO VARCHAR2(100), KERNEL VARCHAR2(20), DTAINCLUSAO DATE, DTAATUALIZACAO DATE, CONSTRAINT {pk_name} PRIMARY KEY (NROEMPRESA, NROCHECKOUT))")
-                try: cursor.execute(create_sql); self.log("INFO", f"Tabela '{table_name}' criada com sucesso."); return True
-                except Exception as ce: self.log("ERROR", f"Falha ao criar a tabela '{table_name}': {ce}"); return False
-            else: self.log("ERROR", f"Erro ao verificar a tabela '{table_name}': {e}"); raise e
-
-    def _save_to_oracle(self, results: List[Terminal]):
-        """Salva os resultados em uma tabela Oracle usando um comando MERGE."""
-        if any(r.nro_empresa is None or r.nro_checkout is None for r in results):
-            self.log("WARNING", "Oracle: Registros sem NROEMPRESA/NROCHECKOUT. Salvando em planilha."); self._save_to_spreadsheet(results); return
-        db_config, table_name = self.config['oracle_config'], self.config['oracle_table']
-        dsn = f"{db_config['host']}:{db_config['port']}/{db_config['service']}"
-        merge_sql = (f"MERGE INTO {table_name} t USING (SELECT :nro_empresa AS NROEMPRESA, :nro_checkout AS NROCHECKOUT FROM DUAL) s ON (t.NROEMPRESA = s.NROEMPRESA AND t.NROCHECKOUT = s.NROCHECKOUT) WHEN MATCHED THEN UPDATE SET IP=:ip, STATUS=:status, PLACA_MAE=:placa_mae, PROCESSADOR=:processador, CORES_THREADS=:cores_threads, RAM=:ram, TIPO_DISCO=:disk_type, TAMANHO_DISCO=:disk_size, DISTRO=:distro, KERNEL=:kernel, DTAATUALIZACAO=:dta_atualizacao WHEN NOT MATCHED THEN INSERT (NROEMPRESA, NROCHECKOUT, IP, STATUS, PLACA_MAE, PROCESSADOR, CORES_THREADS, RAM, TIPO_DISCO, TAMANHO_DISCO, DISTRO, KERNEL, DTAINCLUSAO, DTAATUALIZACAO) VALUES (:nro_empresa, :nro_checkout, :ip, :status, :placa_mae, :processador, :cores_threads, :ram, :disk_type, :disk_size, :distro, :kernel, :dta_atualizacao, :dta_atualizacao)")
-        try:
-            with oracledb.connect(user=db_config['user'], password=db_config['password'], dsn=dsn) as conn:
-                with conn.cursor() as cursor:
-                    if not self._check_and_create_table(cursor, table_name): self.log("ERROR", "Abortado: tabela não pôde ser criada/encontrada."); return
-                    cursor.executemany(merge_sql, [asdict(r) for r in results], batcherrors=True)
-                    conn.commit(); self.log("INFO", f"{cursor.rowcount} registros salvos/atualizados em '{table_name}'.")
-        except Exception as e: self.log("ERROR", f"Erro crítico ao salvar no Oracle: {e}")
\ No newline at end of file
+            backend.abort()
+            self.log("ERROR", f"{backend.failure_message}: {e}")
\ No newline at end of file
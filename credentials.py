@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+credentials.py: Conjuntos de credenciais SSH do invent-ssh.
+
+Além do usuário e da senha/chave informados na interface (o conjunto "principal"),
+`ssh_credentials` no config.json lista, em ordem, outros conjuntos (por região, por
+exemplo). Senhas nunca ficam no arquivo: cada conjunto aponta a variável de ambiente
+que a contém (`password_env`) ou usa uma chave privada (`key_path`).
+
+    "ssh_credentials": [
+        {"label": "sul", "user": "suporte", "key_path": "C:/chaves/sul"},
+        {"label": "norte", "user": "pdv", "password_env": "INVENT_SSH_PASSWORD_NORTE"}
+    ]
+
+O conjunto que autenticou em cada host e a contagem por loja ficam em
+`cache/credenciais.json`, que guarda só os rótulos, para que as próximas execuções
+tentem primeiro o conjunto certo.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from state import JsonStateStore
+
+PRIMARY_LABEL = "principal"
+
+@dataclass(frozen=True)
+class Credential:
+    """Um conjunto de credenciais SSH. A senha fica fora do repr, para não vazar em logs."""
+    label: str
+    username: str
+    password: Optional[str] = field(default=None, repr=False)
+    key_path: Optional[str] = None
+
+def credential_sets(config: Dict[str, Any]) -> List[Credential]:
+    """
+    Lista ordenada dos conjuntos: o principal (`ssh_user`, `ssh_pass`, `ssh_key_path`) e os de
+    `ssh_credentials`. Levanta ValueError se um conjunto não tiver usuário.
+    """
+    sets = [Credential(PRIMARY_LABEL, config['ssh_user'], config.get('ssh_pass'), config.get('ssh_key_path'))] if config.get('ssh_user') else []
+    for number, entry in enumerate(config.get('ssh_credentials') or [], start=1):
+        if not entry.get('user'): raise ValueError(f"Conjunto de credenciais {number} de 'ssh_credentials' sem 'user'")
+        password = os.environ.get(entry['password_env']) if entry.get('password_env') else None
+        sets.append(Credential(str(entry.get('label') or f"conjunto{number}"), entry['user'], password, entry.get('key_path')))
+    return sets
+
+class CredentialMap:
+    """
+    Mapa aprendido, por host e por loja, do conjunto de credenciais que funcionou. Ordena os
+    conjuntos para cada host: o que funcionou nele da última vez, depois os que mais funcionaram
+    na loja e, por fim, a ordem configurada. Só os rótulos são persistidos.
+    """
+    def __init__(self, store: JsonStateStore):
+        self.store = store
+
+    def order(self, host: str, store_key: Optional[int], credentials: List[Credential]) -> List[Credential]:
+        with self.store.lock:
+            learned = self.store.section('hosts').get(host)
+            counts = dict(self.store.section('lojas').get(str(store_key), {})) if store_key is not None else {}
+        return sorted(credentials, key=lambda credential: (credential.label != learned, -counts.get(credential.label, 0)))
+
+    def record(self, host: str, store_key: Optional[int], label: str):
+        with self.store.lock:
+            hosts = self.store.section('hosts')
+            previous = hosts.get(host)
+            if previous == label: return
+            hosts[host] = label
+            if store_key is not None:
+                # Contagem de hosts da loja por conjunto: o host passa do conjunto anterior para o novo
+                counts = self.store.section('lojas').setdefault(str(store_key), {})
+                if counts.get(previous): counts[previous] -= 1
+                counts[label] = counts.get(label, 0) + 1
+
+    def save(self):
+        self.store.save()
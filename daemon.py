@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+daemon.py: Modo agendado (sem interface gráfica) do invent-ssh.
+
+Reinventaria periodicamente a origem de terminais configurada no `config.json`
+(a planilha ou a query Oracle salvas pela interface). A cada ciclo, os hosts são
+espalhados uniformemente, com jitter, ao longo de uma janela (`spread_window`),
+para que a carga na rede e nos sshd fique plana em vez de concentrada no início.
+Os resultados são mantidos no backend configurado: a tabela Oracle (Modo Oracle com
+"Salvar no banco"), `results_backend` ou, por padrão, a tabela SQLite local
+`reports/inventario.db`, atualizada por MERGE a cada ciclo.
+
+Credenciais nunca são lidas nem gravadas em arquivo: vêm das variáveis de ambiente
+INVENT_SSH_USER, INVENT_SSH_PASSWORD, INVENT_SSH_KEY e INVENT_ORACLE_PASSWORD ou
+são pedidas uma única vez no terminal, ao iniciar.
+
+Uso:
+    python daemon.py                                   # ciclo a cada hora, hosts espalhados por 48 min
+    python daemon.py --interval 7200 --window 3600 --jitter 0.5
+    python daemon.py --once --window 0                 # um único ciclo, sem espalhar
+    python daemon.py --once --window 0 --time-box 1800 # 30 min antes da abertura das lojas
+    python daemon.py --once --window 0 --profile       # onde vai a CPU do cliente
+"""
+import argparse
+import getpass
+import json
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from core import InventoryEngine
+
+CONFIG_FILE = "config.json"
+
+# Mensagens da fila do motor que só fazem sentido na interface gráfica
+_UI_ONLY_LEVELS = ("PROGRESS", "OPEN_FILE", "FINISH")
+
+def load_saved_config(path: str) -> Dict[str, Any]:
+    """Lê o config.json salvo pela interface (sem credenciais)."""
+    if not os.path.exists(path): raise ValueError(f"Arquivo de configuração não encontrado: {path}")
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _secret(env_name: str, prompt: str) -> str:
+    value = os.environ.get(env_name)
+    if value is not None: return value
+    if not sys.stdin.isatty(): raise ValueError(f"Defina a variável de ambiente {env_name} (sem terminal para pedir a senha).")
+    return getpass.getpass(prompt)
+
+def build_engine_config(saved: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Monta a configuração do motor a partir do config.json (campos da interface e opções
+    avançadas) e das credenciais do ambiente/terminal. Valida como a interface faz.
+    """
+    config = dict(saved)  # opções avançadas passam direto; o motor ignora as chaves que não usa
+    config.update({"max_workers": int(saved.get("max_workers", 10)), "ssh_timeout": int(saved.get("ssh_timeout", 10)), "host_deadline": int(saved.get("host_deadline", 0)), "collection_profile": saved.get("collection_profile", "padrao")})
+    mode = args.mode or ("Planilha" if saved.get("last_file_path") else "Oracle")
+    if mode == "Planilha":
+        filepath = args.file or saved.get("last_file_path")
+        if not filepath or not os.path.exists(filepath): raise ValueError(f"Planilha de terminais não encontrada: {filepath}")
+        config.update({"mode": "Planilha", "filepath": filepath, "output_format": saved.get("spreadsheet_format", "XLSX")})
+    else:
+        oracle_config = {"user": saved.get("oracle_user"), "host": saved.get("oracle_host"), "port": saved.get("oracle_port"), "service": saved.get("oracle_service")}
+        if not all(oracle_config.values()): raise ValueError("Conexão Oracle incompleta no config.json (usuário, host, porta e serviço).")
+        if not saved.get("oracle_query"): raise ValueError("A query de busca dos terminais não está no config.json.")
+        oracle_config["password"] = _secret("INVENT_ORACLE_PASSWORD", f"Senha Oracle de {oracle_config['user']}@{oracle_config['host']}: ")
+        config.update({"mode": "Oracle", "oracle_config": oracle_config, "oracle_query": saved["oracle_query"], "save_to_db": saved.get("save_to_db", True), "oracle_table": saved.get("oracle_table"), "output_format": saved.get("oracle_output_format", "XLSX")})
+    # Resultados contínuos: sem Oracle nem backend explícito, mantém a tabela SQLite local em vez de um relatório por ciclo
+    if not config.get("results_backend") and not (mode == "Oracle" and config["save_to_db"]) and config["output_format"].upper() != "PARQUET":
+        config["results_backend"] = "sqlite"
+    user = os.environ.get("INVENT_SSH_USER") or saved.get("last_ssh_user")
+    key_path = os.environ.get("INVENT_SSH_KEY") or saved.get("last_ssh_key_path") or ""
+    if not user: raise ValueError("Usuário SSH não informado (INVENT_SSH_USER ou o último usuário salvo na interface).")
+    password = "" if key_path and "INVENT_SSH_PASSWORD" not in os.environ else _secret("INVENT_SSH_PASSWORD", f"Senha SSH de {user}: ")
+    config.update({"ssh_user": user, "ssh_pass": password, "ssh_key_path": key_path})
+    config["spread_window"] = args.window if args.window is not None else saved.get("spread_window", args.interval * 0.8)
+    config["spread_jitter"] = args.jitter if args.jitter is not None else saved.get("spread_jitter", 1.0)
+    if args.time_box is not None: config["run_time_box"] = args.time_box
+    if args.profile: config["profiler"] = True
+    return config
+
+class InventoryDaemon:
+    """Executa um ciclo de inventário a cada `interval` segundos até ser interrompido."""
+    def __init__(self, config: Dict[str, Any], interval: float):
+        self.config, self.interval = config, interval
+        self.log_queue: queue.Queue = queue.Queue()
+        self.stop_event = threading.Event()
+        self.engine: Optional[InventoryEngine] = None
+        self.logger = logging.getLogger(__name__)
+
+    def _print_logs(self):
+        """Consome a fila de mensagens do motor, exibindo-as no console."""
+        while True:
+            level, message, _ = self.log_queue.get()
+            if level not in _UI_ONLY_LEVELS: print(f"{datetime.now():%Y-%m-%d %H:%M:%S} {level:<7} {message}", flush=True)
+
+    def stop(self, *_):
+        if self.stop_event.is_set(): return
+        self.logger.warning("Interrupção solicitada; encerrando após o ciclo atual.")
+        print("Interrupção solicitada. Encerrando o ciclo em andamento...", flush=True)
+        self.stop_event.set()
+        if self.engine is not None: self.engine.cancel()
+
+    def run(self, once: bool = False):
+        threading.Thread(target=self._print_logs, daemon=True).start()
+        cycle = 0
+        while not self.stop_event.is_set():
+            cycle += 1
+            started = time.monotonic()
+            self.logger.info(f"Ciclo {cycle} iniciado.")
+            self.engine = InventoryEngine(self.config, self.log_queue)
+            self.engine.run_inventory()
+            elapsed = time.monotonic() - started
+            self.logger.info(f"Ciclo {cycle} concluído em {elapsed:.0f}s.")
+            if once or self.stop_event.is_set(): break
+            wait = self.interval - elapsed
+            if wait <= 0:
+                self.log_queue.put(("WARNING", f"O ciclo {cycle} durou {elapsed:.0f}s, mais que o intervalo de {self.interval:.0f}s; o próximo começa agora.", None)); continue
+            self.log_queue.put(("INFO", f"Próximo ciclo às {datetime.now() + timedelta(seconds=wait):%H:%M:%S}.", None))
+            self.stop_event.wait(wait)
+
+def setup_logging():
+    """Log detalhado em arquivo, como na interface (pasta `logs`)."""
+    os.makedirs("logs", exist_ok=True)
+    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - [%(module)s:%(lineno)d] - %(message)s',
+                        handlers=[logging.FileHandler(os.path.join("logs", f"invent-ssh_daemon_{datetime.now():%Y%m%d_%H%M%S}.log"), encoding='utf-8')])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inventário agendado do invent-ssh (sem interface gráfica).")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config.json salvo pela interface.")
+    parser.add_argument("--mode", choices=("Planilha", "Oracle"), help="Origem dos terminais (padrão: a planilha salva, se houver; senão Oracle).")
+    parser.add_argument("--file", help="Planilha de terminais (padrão: a última usada na interface).")
+    parser.add_argument("--interval", type=float, default=3600, help="Segundos entre o início de dois ciclos.")
+    parser.add_argument("--window", type=float, help="Janela, em segundos, pela qual os hosts são espalhados (padrão: 80%% do intervalo; 0 não espalha).")
+    parser.add_argument("--jitter", type=float, help="Fração aleatória (0 a 1) da fatia de cada host (padrão: 1).")
+    parser.add_argument("--time-box", type=float, help="Limite, em segundos, da coleta de cada ciclo: dados mais antigos primeiro e o restante adiado.")
+    parser.add_argument("--profile", action="store_true", help="Amostra a CPU de todas as threads em cada ciclo (pilhas em reports/perfil_cpu_*.folded).")
+    parser.add_argument("--once", action="store_true", help="Executa um único ciclo e sai.")
+    args = parser.parse_args()
+    setup_logging()
+    try: config = build_engine_config(load_saved_config(args.config), args)
+    except (ValueError, json.JSONDecodeError) as e: print(f"Erro de configuração: {e}", file=sys.stderr); return 2
+    if config["spread_window"] > args.interval: print(f"Aviso: a janela ({config['spread_window']:.0f}s) é maior que o intervalo ({args.interval:.0f}s); os ciclos vão se emendar.", file=sys.stderr)
+    daemon = InventoryDaemon(config, args.interval)
+    signal.signal(signal.SIGINT, daemon.stop)
+    if hasattr(signal, "SIGTERM"): signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.run(once=args.once)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+export.py: Escrita dos relatórios de inventário do invent-ssh.
+
+Os resultados são convertidos linha a linha, direto da lista de terminais, e
+gravados pelo módulo `csv` ou por um writer XLSX em modo somente escrita
+(openpyxl `write_only`), que serializa cada linha ao recebê-la em vez de montar
+o modelo da planilha inteira em memória. O consumo de memória fica constante
+no número de linhas, e nenhum dos dois caminhos depende do pandas.
+"""
+import csv
+import math
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Iterable, Iterator, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+# Colunas do relatório: (campo do Terminal, cabeçalho, largura no XLSX)
+REPORT_COLUMNS: Tuple[Tuple[str, str, int], ...] = (
+    ('ip', 'IP', 16), ('nro_empresa', 'NROEMPRESA', 12), ('nro_checkout', 'NROCHECKOUT', 13), ('status', 'STATUS', 20),
+    ('placa_mae', 'PLACA_MAE', 32), ('processador', 'PROCESSADOR', 42), ('cores_threads', 'CORES_THREADS', 15), ('ram', 'RAM', 12),
+    ('disk_type', 'TIPO_DISCO', 11), ('disk_size', 'TAMANHO_DISCO', 15), ('distro', 'DISTRO', 32), ('kernel', 'KERNEL', 10),
+    ('dta_atualizacao', 'DTAATUALIZACAO', 20), ('retentativas', 'RETENTATIVAS', 13), ('dta_ultima_tentativa', 'DTAULTIMATENTATIVA', 20),
+)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+def _report_value(value: Any) -> Any:
+    if isinstance(value, datetime): return value.strftime(DATE_FORMAT)
+    if isinstance(value, float):
+        if math.isnan(value): return None
+        return int(value) if value.is_integer() else value
+    return value
+
+def report_rows(results: Iterable[Any]) -> Iterator[Tuple[Any, ...]]:
+    """Gera as linhas do relatório (na ordem de REPORT_COLUMNS) sem copiar os terminais."""
+    values = attrgetter(*(name for name, _, _ in REPORT_COLUMNS))
+    for r in results:
+        yield tuple(map(_report_value, values(r)))
+
+class ReportWriter:
+    """
+    Relatório CSV ou XLSX gravado em partes: `write(linhas)` quantas vezes for preciso e
+    `close()` ao final (`discard()` libera o arquivo sem concluí-lo, em caso de erro).
+    """
+    def __init__(self, filename: str, file_format: str = 'xlsx', sheet_name: str = "Sheet1"):
+        self.filename, self.file_format = filename, file_format.lower()
+        if self.file_format == 'csv':
+            # CSV separado por ';' (UTF-8 com BOM, para o Excel), com todos os campos entre aspas
+            self._file = open(filename, 'w', newline='', encoding='utf-8-sig')
+            self._writer = csv.writer(self._file, delimiter=';', quoting=csv.QUOTE_ALL)
+            self._writer.writerow([title for _, title, _ in REPORT_COLUMNS])
+            return
+        # XLSX em modo somente escrita, com cabeçalho formatado, larguras fixas e a primeira linha congelada
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet(sheet_name)
+        for index, (_, _, width) in enumerate(REPORT_COLUMNS, start=1):
+            self._sheet.column_dimensions[get_column_letter(index)].width = width
+        self._sheet.freeze_panes = 'A2'
+        header = []
+        for _, title, _ in REPORT_COLUMNS:
+            cell = WriteOnlyCell(self._sheet, value=title)
+            cell.font, cell.border, cell.alignment = HEADER_FONT, HEADER_BORDER, HEADER_ALIGNMENT
+            header.append(cell)
+        self._sheet.append(header)
+
+    def write(self, rows: Iterable[Tuple[Any, ...]]):
+        if self.file_format == 'csv': self._writer.writerows(rows); return
+        for row in rows: self._sheet.append(row)
+
+    def close(self):
+        if self.file_format == 'csv': self._file.close()
+        else: self._workbook.save(self.filename)
+
+    def discard(self):
+        if self.file_format == 'csv': self._file.close()
+
+def write_csv(filename: str, rows: Iterable[Tuple[Any, ...]]):
+    """Grava as linhas num CSV separado por ';' (UTF-8 com BOM, para o Excel), com todos os campos entre aspas."""
+    writer = ReportWriter(filename, 'csv')
+    try: writer.write(rows)
+    except Exception: writer.discard(); raise
+    writer.close()
+
+def write_xlsx(filename: str, rows: Iterable[Tuple[Any, ...]], sheet_name: str = "Sheet1"):
+    """Grava as linhas num XLSX em modo somente escrita, com cabeçalho formatado, larguras fixas e a primeira linha congelada."""
+    writer = ReportWriter(filename, 'xlsx', sheet_name)
+    writer.write(rows)
+    writer.close()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+history.py: Histórico colunar (Parquet) das execuções do invent-ssh.
+
+Cada execução é acrescentada como um arquivo Parquet dentro de uma partição
+por data (`reports/historico/dta_execucao=AAAA-MM-DD/`), com colunas tipadas:
+RAM e disco em GB inteiros e tipo de disco/status como categorias. Consultas
+sobre anos de execuções leem apenas as colunas e partições necessárias:
+
+    import pyarrow.dataset as ds
+    from history import load_history
+    tabela = load_history(columns=["NROEMPRESA", "RAM_GB"], filter=(ds.field("RAM_GB") < 4) & (ds.field("dta_execucao") >= "2026-01-01"))
+    tabela.group_by("NROEMPRESA").aggregate([("RAM_GB", "count")])
+
+Requer o pacote opcional `pyarrow`.
+"""
+import os
+import re
+import math
+import uuid
+from datetime import datetime
+from typing import Any, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+HISTORY_DIR = os.path.join("reports", "historico")
+PARTITION_FIELD = "dta_execucao"
+
+def _category() -> Any:
+    return pa.dictionary(pa.int16(), pa.string())
+
+def history_schema() -> 'pa.Schema':
+    """Esquema do histórico. A partição (`dta_execucao`) não é gravada dentro dos arquivos."""
+    return pa.schema([
+        ("NROEMPRESA", pa.int32()), ("NROCHECKOUT", pa.int32()), ("IP", pa.string()), ("STATUS", _category()),
+        ("PLACA_MAE", pa.string()), ("PROCESSADOR", pa.string()), ("CORES_THREADS", pa.string()),
+        ("RAM", pa.string()), ("RAM_GB", pa.int16()), ("TIPO_RAM", _category()),
+        ("TIPO_DISCO", _category()), ("TAMANHO_DISCO_GB", pa.int32()),
+        ("DISTRO", pa.string()), ("KERNEL", pa.string()),
+        ("DTAATUALIZACAO", pa.timestamp('s')), ("RETENTATIVAS", pa.int16()), ("DTAULTIMATENTATIVA", pa.timestamp('s')),
+    ])
+
+def _int_or_none(value: Any) -> Optional[int]:
+    if value is None or (isinstance(value, float) and math.isnan(value)): return None
+    try: return int(value)
+    except (TypeError, ValueError): return None
+
+def ram_gb(text: Optional[str]) -> Optional[int]:
+    """'8GB DDR4' -> 8; 'N/A' ou vazio -> None."""
+    match = re.match(r"\s*(\d+)\s*GB", text or "", re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+def ram_type(text: Optional[str]) -> Optional[str]:
+    """'8GB DDR4' -> 'DDR4'; sem tipo -> None."""
+    match = re.match(r"\s*\d+\s*GB\s+(\S+)", text or "", re.IGNORECASE)
+    return match.group(1).upper() if match else None
+
+def disk_gb(text: Optional[str]) -> Optional[int]:
+    """'128GB' -> 128, '1TB' -> 1000; 'N/A' ou vazio -> None."""
+    match = re.match(r"\s*(\d+(?:[.,]\d+)?)\s*(GB|TB)", text or "", re.IGNORECASE)
+    if not match: return None
+    size = float(match.group(1).replace(',', '.'))
+    return int(round(size * 1000 if match.group(2).upper() == "TB" else size))
+
+def _text(value: Optional[str]) -> Optional[str]:
+    return None if value in (None, "", "N/A") else value
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    return value.replace(microsecond=0) if isinstance(value, datetime) else None
+
+def to_table(results: Iterable[Any]) -> 'pa.Table':
+    """Converte terminais (objetos com os campos do `Terminal`) numa tabela Arrow tipada."""
+    columns: dict = {name: [] for name in history_schema().names}
+    for r in results:
+        columns["NROEMPRESA"].append(_int_or_none(r.nro_empresa)); columns["NROCHECKOUT"].append(_int_or_none(r.nro_checkout))
+        columns["IP"].append(str(r.ip)); columns["STATUS"].append(r.status)
+        columns["PLACA_MAE"].append(_text(r.placa_mae)); columns["PROCESSADOR"].append(_text(r.processador)); columns["CORES_THREADS"].append(_text(r.cores_threads))
+        columns["RAM"].append(_text(r.ram)); columns["RAM_GB"].append(ram_gb(r.ram)); columns["TIPO_RAM"].append(ram_type(r.ram))
+        columns["TIPO_DISCO"].append(_text(r.disk_type)); columns["TAMANHO_DISCO_GB"].append(disk_gb(r.disk_size))
+        columns["DISTRO"].append(_text(r.distro)); columns["KERNEL"].append(_text(r.kernel))
+        columns["DTAATUALIZACAO"].append(_timestamp(r.dta_atualizacao)); columns["RETENTATIVAS"].append(r.retentativas); columns["DTAULTIMATENTATIVA"].append(_timestamp(r.dta_ultima_tentativa))
+    return pa.Table.from_pydict(columns, schema=history_schema())
+
+def append_run(results: List[Any], run_time: datetime, base_dir: str = HISTORY_DIR) -> str:
+    """
+    Grava os resultados de uma execução como um novo arquivo na partição da data de
+    `run_time` e retorna o caminho. Execuções do mesmo dia ficam lado a lado na partição.
+    """
+    if pa is None: raise RuntimeError("'pyarrow' não está instalado")
+    partition = os.path.join(base_dir, f"{PARTITION_FIELD}={run_time:%Y-%m-%d}")
+    os.makedirs(partition, exist_ok=True)
+    filename = f"execucao_{run_time:%H%M%S}_{uuid.uuid4().hex[:8]}.parquet"
+    path, tmp_path = os.path.join(partition, filename), os.path.join(partition, f".{filename}.tmp")  # prefixo '.' é ignorado na leitura
+    pq.write_table(to_table(results), tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+def load_history(columns: Optional[List[str]] = None, filter: Any = None, base_dir: str = HISTORY_DIR) -> 'pa.Table':
+    """
+    Lê o histórico como tabela Arrow, carregando só as `columns` pedidas. `filter` é uma
+    expressão `pyarrow.dataset` (ex.: `ds.field("dta_execucao") >= "2026-01-01"`); filtros
+    sobre `dta_execucao` descartam partições inteiras sem abri-las. Use `.to_pandas()` para um DataFrame.
+    """
+    if pa is None: raise RuntimeError("'pyarrow' não está instalado")
+    partitioning = ds.partitioning(pa.schema([(PARTITION_FIELD, pa.string())]), flavor="hive")
+    dataset = ds.dataset(base_dir, format="parquet", partitioning=partitioning)
+    return dataset.to_table(columns=columns, filter=filter)
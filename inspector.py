@@ -8,7 +8,20 @@ import re
 import socket
 import os
 import json
-from typing import Dict, Any, Optional
+import codecs
+import hashlib
+import itertools
+import threading
+import time
+import concurrent.futures
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple, Iterator, Iterable, List, Callable, Set
+
+from credentials import PRIMARY_LABEL, Credential
+from state import JsonStateStore
 
 # --- Funções de Baixo Nível ---
 
@@ -16,17 +29,520 @@ def _clean_string(text: str) -> str:
     if not isinstance(text, str): return ""
     return " ".join(text.strip().split())
 
-def _run_command(client: paramiko.SSHClient, command: str, tolerant: bool = False) -> Optional[str]:
+COMMAND_TIMEOUT = 20
+
+@dataclass
+class CollectionContext:
+    """Estado da coleta de um host: cliente SSH, prazo total (monotônico) e sinal de cancelamento da execução."""
+    client: Optional[paramiko.SSHClient]
+    deadline: Optional[float] = None
+    cancel_event: Optional[threading.Event] = None
+    max_channels: int = 1
+    expired: bool = False
+    preferred: Dict[str, str] = field(default_factory=dict)
+    learned: Dict[str, str] = field(default_factory=dict)
+    forgotten: Set[str] = field(default_factory=set)
+    probe_stats: Optional['ProbeStats'] = None
+    fixed_order: bool = False
+    profile: str = "padrao"
+    commands_run: int = 0
+    bytes_read: int = 0
+    max_output_bytes: int = 4 * 1024 * 1024
+    output_histogram: Optional['OutputSizeHistogram'] = None
+    recorded: Optional[Dict[str, Tuple[bytes, bool]]] = None
+    replay: Optional[Dict[str, Tuple[bytes, bool]]] = None
+    parse_cache: Optional['ParseCache'] = None
+    _counters_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def tally(self, commands: int = 0, bytes_read: int = 0):
+        """Soma aos contadores do host; as sondas paralelas (canais simultâneos) compartilham o mesmo contexto."""
+        with self._counters_lock: self.commands_run += commands; self.bytes_read += bytes_read
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def should_stop(self) -> bool:
+        """Indica se as sondas restantes devem ser puladas (prazo esgotado ou execução cancelada)."""
+        if self.cancel_event is not None and self.cancel_event.is_set(): self.expired = True
+        elif self.deadline is not None and self.remaining() <= 0: self.expired = True
+        return self.expired
+
+    def command_timeout(self) -> float:
+        remaining = self.remaining()
+        return COMMAND_TIMEOUT if remaining is None else max(0.1, min(COMMAND_TIMEOUT, remaining))
+
+    def order(self, chain: str, names: List[str]) -> List[str]:
+        """
+        Ordena as estratégias de uma cadeia: a que funcionou da última vez neste host vem
+        primeiro e as demais seguem o custo esperado aprendido na frota. Em modo fixo
+        (`fixed_order`), mantém a ordem original do código.
+        """
+        if self.fixed_order: return list(names)
+        if self.probe_stats is not None: names = self.probe_stats.rank(chain, names)
+        preferred = self.preferred.get(chain)
+        return sorted(names, key=lambda name: name != preferred)
+
+    def record_probe(self, chain: str, name: str, elapsed: float, success: bool):
+        if self.probe_stats is not None and not self.expired: self.probe_stats.record(chain, name, elapsed, success)
+
+    def learn(self, chain: str, name: str):
+        if not self.expired: self.learned[chain] = name
+
+    def forget(self, chain: str):
+        if not self.expired: self.forgotten.add(chain)
+
+OUTPUT_CHUNK = 32 * 1024
+READ_POLL = 0.5
+
+class OutputSizeHistogram:
+    """
+    Histograma (faixas em potências de 2, a partir de 1 KiB) do tamanho das saídas dos
+    comandos remotos, acumulado por toda a execução para calibrar `max_output_bytes`.
+    Guarda também o maior tamanho visto por comando e quantas saídas foram truncadas.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets: Dict[int, int] = {}
+        self.largest: Dict[str, int] = {}
+        self.truncated = 0
+
+    @staticmethod
+    def bucket(size: int) -> int:
+        limit = 1024
+        while size >= limit: limit *= 2
+        return limit
+
+    def record(self, command: str, size: int, truncated: bool = False):
+        name = command if len(command) <= 40 else command[:37] + "..."
+        with self._lock:
+            limit = self.bucket(size)
+            self.buckets[limit] = self.buckets.get(limit, 0) + 1
+            self.largest[name] = max(size, self.largest.get(name, 0))
+            self.truncated += int(truncated)
+
+    def report(self) -> List[str]:
+        """Linhas de resumo: contagem por faixa de tamanho e maiores saídas por comando."""
+        with self._lock:
+            buckets, largest, truncated = dict(self.buckets), dict(self.largest), self.truncated
+        if not buckets: return []
+        lines = [f"< {_format_bytes(limit)}: {buckets[limit]} saídas" for limit in sorted(buckets)]
+        top = sorted(largest.items(), key=lambda item: item[1], reverse=True)[:5]
+        lines.append("Maiores por comando: " + ", ".join(f"{name} {_format_bytes(size)}" for name, size in top))
+        if truncated: lines.append(f"{truncated} saídas truncadas no limite de bytes por comando")
+        return lines
+
+class ParseCache:
+    """
+    Cache LRU, seguro entre threads e limitado a `max_entries`, do resultado dos parsers por
+    (comando, hash da saída). A frota tem poucas dezenas de modelos de PDV, e milhares de hosts
+    devolvem saídas idênticas de lscpu e dmidecode: o parse repetido vira uma consulta ao dicionário.
+    Saídas em streaming maiores que `max_bytes` são interpretadas direto do canal, sem cache.
+    """
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024):
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[str, bytes], Optional[Dict[str, Any]]]' = OrderedDict()
+        self.max_entries, self.max_bytes = max_entries, max_bytes
+        self.hits = self.misses = 0
+
+    def get(self, command: str, data: bytes, parse: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Resultado de `parse()` para a saída `data` de `command`, do cache se já visto. Retorna sempre uma cópia."""
+        key = (command, hashlib.blake2b(data, digest_size=16).digest())
+        with self._lock:
+            found = key in self._entries
+            if found: self._entries.move_to_end(key); result = self._entries[key]; self.hits += 1
+            else: self.misses += 1
+        if not found:
+            result = parse()
+            with self._lock:
+                self._entries[key] = result
+                while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+        return dict(result) if result is not None else None
+
+    def parse_stream(self, command: str, chunks: Iterator[bytes], parser: Callable[[Iterator[str]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Acumula a saída até `max_bytes` para consultar o cache; acima disso, segue em streaming sem cache."""
+        head: List[bytes] = []; size = 0
+        for chunk in chunks:
+            head.append(chunk); size += len(chunk)
+            if size > self.max_bytes:
+                with self._lock: self.misses += 1
+                return parser(_decode_lines(itertools.chain(head, chunks)))
+        data = b"".join(head)
+        return self.get(command, data, lambda: parser(_decode_lines([data])))
+
+    def report(self) -> Optional[str]:
+        with self._lock: hits, misses, entries = self.hits, self.misses, len(self._entries)
+        if not hits + misses: return None
+        return f"{hits} acertos e {misses} falhas ({hits / (hits + misses):.0%} de acerto), {entries} saídas distintas em cache"
+
+def _decode_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore'); pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        yield from complete
+    pending += decoder.decode(b"", final=True)
+    if pending: yield pending
+
+def _format_bytes(size: int) -> str:
+    if size < 1024: return f"{size} B"
+    if size >= 1024 * 1024: return f"{size / (1024 * 1024):.0f} MiB" if size % (1024 * 1024) == 0 else f"{size / (1024 * 1024):.1f} MiB"
+    return f"{size // 1024} KiB" if size % 1024 == 0 else f"{size / 1024:.1f} KiB"
+
+class _CommandOutput:
+    """
+    Saída de um comando remoto lida em blocos direto do canal. Para de ler ao atingir
+    `ctx.max_output_bytes` (a saída fica truncada e o comando é abandonado), ao esgotar o
+    prazo do host ou ao ser cancelada, sem nunca manter mais que o limite em memória.
+    """
+    def __init__(self, ctx: CollectionContext, command: str):
+        self.ctx = ctx
+        self.command = command
+        self.size = 0
+        self.truncated = False
+        self.complete = False
+        self.raw: Optional[List[bytes]] = [] if ctx.recorded is not None else None
+        self.channel = ctx.client.get_transport().open_session(timeout=ctx.command_timeout())
+        self.channel.exec_command(command)
+        ctx.tally(commands=1)
+
+    def chunks(self) -> Iterator[bytes]:
+        ctx, limit = self.ctx, self.ctx.max_output_bytes
+        self.channel.settimeout(min(READ_POLL, ctx.command_timeout()))
+        idle_since = time.monotonic()
+        try:
+            while True:
+                # O stderr é descartado, mas precisa ser consumido para não travar a janela do canal
+                while self.channel.recv_stderr_ready(): self.channel.recv_stderr(OUTPUT_CHUNK)
+                try: chunk = self.channel.recv(OUTPUT_CHUNK)
+                except socket.timeout:
+                    if ctx.should_stop(): return
+                    if time.monotonic() - idle_since > ctx.command_timeout(): raise
+                    continue
+                if not chunk:
+                    self.complete = True
+                    return
+                idle_since = time.monotonic()
+                if limit and self.size + len(chunk) > limit:
+                    chunk = chunk[:limit - self.size]; self.truncated = True
+                self.size += len(chunk)
+                if self.raw is not None: self.raw.append(chunk)
+                if chunk: yield chunk
+                if self.truncated: return
+        finally:
+            ctx.tally(bytes_read=self.size)
+            if ctx.output_histogram is not None: ctx.output_histogram.record(self.command, self.size, self.truncated)
+
+    def lines(self) -> Iterator[str]:
+        """Linhas decodificadas incrementalmente, sem acumular a saída inteira."""
+        return _decode_lines(self.chunks())
+
+    def ok(self, tolerant: bool = False) -> bool:
+        """O comando terminou com sucesso (saída completa e código 0) ou, se `tolerant`, produziu alguma saída."""
+        if tolerant and self.size > 0: return True
+        return self.complete and not self.truncated and self.channel.recv_exit_status() == 0
+
+    def __enter__(self) -> '_CommandOutput':
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            # Só saídas lidas até o fim (ou até o limite) são gravadas; uma leitura interrompida equivale a não ter rodado
+            if self.raw is not None and (self.complete or self.truncated): self.ctx.recorded[self.command] = (b"".join(self.raw), self.ok())
+        finally: self.channel.close()
+
+class _ReplayOutput(_CommandOutput):
+    """Saída gravada de um comando (ver archive.py), entregue aos parsers como se viesse do canal."""
+    def __init__(self, ctx: CollectionContext, command: str, data: bytes, ok: bool):
+        self.ctx, self.command, self.data, self._ok = ctx, command, data, ok
+        self.size, self.raw = len(data), None
+
+    def chunks(self) -> Iterator[bytes]:
+        if self.data: yield self.data
+
+    def ok(self, tolerant: bool = False) -> bool:
+        return (tolerant and self.size > 0) or self._ok
+
+    def __exit__(self, *exc_info):
+        pass
+
+def _open_command(ctx: CollectionContext, command: str) -> Optional[_CommandOutput]:
+    if ctx.replay is not None:
+        recorded = ctx.replay.get(command)
+        return _ReplayOutput(ctx, command, *recorded) if recorded is not None else None
+    if ctx.should_stop(): return None
+    try: return _CommandOutput(ctx, command)
+    except Exception:
+        ctx.should_stop()
+        return None
+
+def _run_command(ctx: CollectionContext, command: str, tolerant: bool = False) -> Optional[str]:
+    stream = _open_command(ctx, command)
+    if stream is None: return None
     try:
-        _, stdout, stderr = client.exec_command(command, timeout=20)
-        output = stdout.read().decode('utf-8', errors='ignore').strip()
-        exit_code = stderr.channel.recv_exit_status()
-        if tolerant and output: return output
-        if exit_code == 0: return output
+        with stream:
+            output = b"".join(stream.chunks()).decode('utf-8', errors='ignore').strip()
+            if tolerant and output: return output
+            return output if stream.ok() else None
+    except Exception:
+        ctx.should_stop()
         return None
+
+def _stream_command(ctx: CollectionContext, command: str, parser: Callable[[Iterator[str]], Optional[Dict[str, str]]], tolerant: bool = False) -> Optional[Dict[str, str]]:
+    """Executa `command` e entrega suas linhas a um parser incremental; descarta o resultado se o comando falhar."""
+    stream = _open_command(ctx, command)
+    if stream is None: return None
+    try:
+        with stream:
+            result = parser(stream.lines()) if ctx.parse_cache is None else ctx.parse_cache.parse_stream(command, stream.chunks(), parser)
+            return result if stream.ok(tolerant) else None
     except Exception:
+        ctx.should_stop()
         return None
 
+def _parse_command(ctx: CollectionContext, command: str, parser: Callable[[str], Optional[Dict[str, Any]]], tolerant: bool = False) -> Optional[Dict[str, Any]]:
+    """Executa `command` e aplica `parser` à saída (memorizado por hash da saída em `ctx.parse_cache`)."""
+    output = _run_command(ctx, command, tolerant)
+    if not output: return None
+    if ctx.parse_cache is None: return parser(output)
+    return ctx.parse_cache.get(command, output.encode('utf-8'), lambda: parser(output))
+
+class CredentialError(Exception):
+    """Conjunto de credenciais inutilizável (chave ilegível, sem chave nem senha): erro de configuração, não de rede."""
+
+# Tipos de chave tentados quando o paramiko não detecta o tipo sozinho (PKey.from_path, 3.2+)
+_KEY_CLASSES = tuple(cls for cls in (getattr(paramiko, 'Ed25519Key', None), paramiko.ECDSAKey, paramiko.RSAKey, getattr(paramiko, 'DSSKey', None)) if cls is not None)
+
+def _load_private_key(key_path: Optional[str]) -> Optional[paramiko.PKey]:
+    """Carrega a chave privada de qualquer tipo suportado. None se não houver arquivo; CredentialError se não puder ser lida."""
+    if not key_path or not os.path.exists(key_path): return None
+    try:
+        if hasattr(paramiko.PKey, 'from_path'): return paramiko.PKey.from_path(key_path)
+        for key_class in _KEY_CLASSES:
+            try: return key_class.from_private_key_file(key_path)
+            except paramiko.PasswordRequiredException: raise
+            except paramiko.SSHException: continue
+        raise paramiko.SSHException("tipo de chave não suportado")
+    except (paramiko.SSHException, ValueError, OSError) as e: raise CredentialError(f"Chave SSH ilegível '{key_path}': {e}") from e
+
+def _authenticate(client: paramiko.SSHClient, ip: str, credentials: List[Credential], timeout: float, connection: ExitStack, open_sock: Callable[[Credential], Any]) -> Credential:
+    """
+    Conecta `client` ao host tentando os conjuntos de credenciais na ordem e retorna o que autenticou.
+    Conjuntos seguidos com o mesmo usuário são tentados na mesma conexão TCP; para outro usuário (o
+    sshd não aceita troca de usuário numa conexão), ela é reaberta, com um novo canal do gateway
+    registrado em `connection`. Conjuntos sem chave legível nem senha são pulados. Se nenhum
+    autenticar, levanta a última recusa do host ou, se nenhum pôde ser tentado, CredentialError.
+    """
+    previous_user, failure = None, None
+    for credential in credentials:
+        try: pkey = _load_private_key(credential.key_path)
+        except CredentialError as e: failure = failure or e; continue
+        if pkey is None and credential.password is None:
+            failure = failure or CredentialError(f"Conjunto de credenciais '{credential.label}' sem chave legível nem senha")
+            continue
+        transport = client.get_transport()
+        try:
+            if credential.username == previous_user and transport is not None and transport.is_active():
+                # Como o client.connect: a chave primeiro e, se recusada, a senha do mesmo conjunto
+                if pkey:
+                    try: transport.auth_publickey(credential.username, pkey); return credential
+                    except paramiko.AuthenticationException:
+                        if credential.password is None: raise
+                transport.auth_password(credential.username, credential.password)
+            else:
+                client.close(); connection.close()
+                sock = connection.enter_context(open_sock(credential))
+                client.connect(hostname=ip, username=credential.username, password=credential.password, pkey=pkey, timeout=timeout, auth_timeout=timeout, allow_agent=False, look_for_keys=False, sock=sock)
+            return credential
+        except paramiko.AuthenticationException as e:
+            failure, previous_user = e, credential.username
+    raise failure or CredentialError("Nenhum conjunto de credenciais SSH configurado")
+
+# --- Gateway (Jump Host) Compartilhado ---
+
+class GatewaySaturated(Exception):
+    """Nenhum canal do gateway ficou livre a tempo: o PDV nem chegou a ser tentado."""
+
+class GatewayAuthFailed(paramiko.AuthenticationException):
+    """O gateway recusou a credencial (nesta tentativa ou antes, na mesma execução)."""
+
+class GatewayPool:
+    """
+    Mantém um único transporte SSH autenticado por gateway e por loja, abrindo
+    canais 'direct-tcpip' até os PDVs em vez de repetir o handshake do gateway
+    a cada terminal. Reconecta o transporte se ele cair e limita o número de
+    canais simultâneos por gateway. Uma credencial recusada pelo gateway não é
+    tentada de novo na mesma execução (evita bloquear a conta do gateway).
+    """
+    def __init__(self, max_channels: int = 10, timeout: int = 30):
+        self.max_channels = max_channels
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._transports: Dict[Tuple, paramiko.Transport] = {}
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._slots: Dict[Tuple, threading.BoundedSemaphore] = {}
+        self._auth_failures: Dict[Tuple, str] = {}  # só em memória: a chave inclui a senha tentada
+
+    @staticmethod
+    def _gateway_key(gateway: Dict[str, Any]) -> Tuple:
+        return (gateway['host'], int(gateway.get('port', 22)), gateway.get('user'))
+
+    @classmethod
+    def _key(cls, gateway: Dict[str, Any], store: Any) -> Tuple:
+        return (store,) + cls._gateway_key(gateway)
+
+    def _entry(self, key: Tuple, gateway: Dict[str, Any]) -> Tuple[threading.Lock, threading.BoundedSemaphore]:
+        # Transporte e trava por loja; o limite de canais é do gateway, compartilhado pelas lojas que o usam
+        gateway_key = self._gateway_key(gateway)
+        with self._lock:
+            if key not in self._key_locks: self._key_locks[key] = threading.Lock()
+            if gateway_key not in self._slots: self._slots[gateway_key] = threading.BoundedSemaphore(int(gateway.get('max_channels', self.max_channels)))
+            return self._key_locks[key], self._slots[gateway_key]
+
+    def _connect(self, key: Tuple, gateway: Dict[str, Any], username: str, password: Optional[str], key_path: Optional[str]) -> paramiko.Transport:
+        # Sem usuário próprio, o gateway usa as mesmas credenciais dos PDVs
+        if gateway.get('user'): username, password, key_path = gateway['user'], gateway.get('password'), gateway.get('key_path')
+        login = self._gateway_key(gateway) + (username, password, key_path)
+        if login in self._auth_failures: raise GatewayAuthFailed(self._auth_failures[login])
+        sock = socket.create_connection((gateway['host'], int(gateway.get('port', 22))), timeout=self.timeout)
+        transport = paramiko.Transport(sock)
+        try:
+            transport.start_client(timeout=self.timeout)
+            pkey = _load_private_key(key_path)
+            try:
+                if pkey: transport.auth_publickey(username, pkey)
+                else: transport.auth_password(username, password)
+            except paramiko.AuthenticationException as e:
+                self._auth_failures[login] = f"Gateway {gateway['host']} recusou o usuário '{username}': {e}"
+                raise GatewayAuthFailed(self._auth_failures[login]) from e
+            transport.set_keepalive(30)
+            return transport
+        except Exception:
+            transport.close(); raise
+
+    def _transport(self, key: Tuple, key_lock: threading.Lock, gateway: Dict[str, Any], username: str, password: Optional[str], key_path: Optional[str], reconnect: bool = False) -> paramiko.Transport:
+        with key_lock:
+            transport = self._transports.get(key)
+            if reconnect or transport is None or not transport.is_active():
+                if transport is not None: transport.close()
+                transport = self._transports[key] = self._connect(key, gateway, username, password, key_path)
+            return transport
+
+    @contextmanager
+    def channel(self, gateway: Dict[str, Any], store: Any, ip: str, username: str, password: Optional[str], key_path: Optional[str], port: int = 22) -> Iterator[paramiko.Channel]:
+        """Abre um canal 'direct-tcpip' até o PDV, respeitando o limite de canais do gateway."""
+        key = self._key(gateway, store)
+        key_lock, slots = self._entry(key, gateway)
+        if not slots.acquire(timeout=self.timeout * 2): raise GatewaySaturated(f"Limite de canais do gateway {gateway['host']} atingido")
+        try:
+            transport = self._transport(key, key_lock, gateway, username, password, key_path)
+            try: chan = transport.open_channel('direct-tcpip', (ip, port), ('127.0.0.1', 0), timeout=self.timeout)
+            except (EOFError, OSError, paramiko.SSHException) as e:
+                if isinstance(e, paramiko.ChannelException): raise
+                transport = self._transport(key, key_lock, gateway, username, password, key_path, reconnect=True)
+                chan = transport.open_channel('direct-tcpip', (ip, port), ('127.0.0.1', 0), timeout=self.timeout)
+            try: yield chan
+            finally: chan.close()
+        finally:
+            slots.release()
+
+    def __enter__(self) -> 'GatewayPool':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Encerra todos os transportes abertos com os gateways."""
+        with self._lock:
+            for transport in self._transports.values(): transport.close()
+            self._transports.clear()
+
+# --- Cache de Capacidades por Host ---
+
+class CapabilityCache:
+    """
+    Mapa persistido das estratégias de coleta que funcionaram em cada host, para que a
+    próxima execução vá direto a elas sem pagar as tentativas que falham (inxi ausente,
+    dmidecode sem root, hdparm não instalado...). Hosts novos herdam o mapa aprendido
+    na mesma assinatura de servidor SSH (banner, que identifica distro e versão).
+    A entrada do host é invalidada quando a chave do servidor muda, quando fica mais
+    velha que `max_age_days` ou quando uma estratégia memorizada falha.
+    """
+    def __init__(self, store: JsonStateStore, max_age_days: float = 30):
+        self.store = store
+        self.max_age = timedelta(days=max_age_days)
+
+    @staticmethod
+    def identify(client: paramiko.SSHClient) -> Tuple[str, str]:
+        """Retorna (impressão digital da chave do servidor, assinatura do servidor SSH)."""
+        transport = client.get_transport()
+        key = transport.get_remote_server_key()
+        return f"{key.get_name()}:{key.get_fingerprint().hex()}", transport.remote_version or ""
+
+    def lookup(self, host: str, fingerprint: str, signature: str) -> Dict[str, str]:
+        with self.store.lock:
+            hosts = self.store.section('hosts')
+            entry = hosts.get(host)
+            if entry and (entry.get('fingerprint') != fingerprint or datetime.now() - datetime.fromisoformat(entry.get('atualizado', '1970-01-01')) > self.max_age):
+                del hosts[host]; entry = None
+            if entry: return dict(entry.get('estrategias', {}))
+            return dict(self.store.section('assinaturas').get(signature, {}))
+
+    def commit(self, host: str, fingerprint: str, signature: str, ctx: CollectionContext):
+        with self.store.lock:
+            strategies = {chain: name for chain, name in ctx.preferred.items() if chain not in ctx.forgotten}
+            strategies.update(ctx.learned)
+            self.store.section('hosts')[host] = {'fingerprint': fingerprint, 'assinatura': signature, 'estrategias': strategies, 'atualizado': datetime.now().isoformat(timespec='seconds')}
+            if signature and ctx.learned: self.store.section('assinaturas').setdefault(signature, {}).update(ctx.learned)
+
+    def save(self):
+        self.store.save()
+
+# --- Modelo de Custo das Sondas ---
+
+class ProbeStats:
+    """
+    Estatísticas persistidas de cada estratégia (taxa de sucesso e latência) acumuladas
+    entre execuções. Ordena as cadeias de fallback pelo custo esperado até uma resposta
+    boa, latência média / probabilidade de sucesso, que é a ordem ótima para tentativas
+    sequenciais independentes. Sem histórico, todas empatam e a ordem do código é mantida.
+    """
+    def __init__(self, store: JsonStateStore, prior_latency: float = 1.0):
+        self.store = store
+        self.prior_latency = prior_latency
+
+    def record(self, chain: str, name: str, elapsed: float, success: bool):
+        with self.store.lock:
+            entry = self.store.section('sondas').setdefault(f"{chain}/{name}", {'tentativas': 0, 'sucessos': 0, 'latencia_total': 0.0})
+            entry['tentativas'] += 1; entry['sucessos'] += int(success); entry['latencia_total'] += elapsed
+
+    def expected_cost(self, chain: str, name: str) -> float:
+        with self.store.lock:
+            entry = self.store.section('sondas').get(f"{chain}/{name}")
+        if not entry: return self.prior_latency / 0.5
+        # Suavização de Laplace no sucesso e uma amostra "a priori" na latência
+        success_rate = (entry['sucessos'] + 1) / (entry['tentativas'] + 2)
+        mean_latency = (entry['latencia_total'] + self.prior_latency) / (entry['tentativas'] + 1)
+        return mean_latency / success_rate
+
+    def rank(self, chain: str, names: List[str]) -> List[str]:
+        return sorted(names, key=lambda name: self.expected_cost(chain, name))
+
+    def report(self) -> List[str]:
+        """Linhas de resumo (uma por estratégia) com tentativas, taxa de sucesso, latência média e custo esperado."""
+        with self.store.lock:
+            entries = dict(self.store.section('sondas'))
+        lines = []
+        for key in sorted(entries):
+            entry = entries[key]; chain, name = key.split('/', 1)
+            rate = entry['sucessos'] / entry['tentativas'] if entry['tentativas'] else 0.0
+            mean = entry['latencia_total'] / entry['tentativas'] if entry['tentativas'] else 0.0
+            lines.append(f"{key}: {entry['tentativas']} tentativas, {rate:.0%} sucesso, {mean * 1000:.0f}ms em média, custo esperado {self.expected_cost(chain, name):.2f}s")
+        return lines
+
+    def save(self):
+        self.store.save()
+
 # --- Funções Auxiliares de Lógica ---
 
 def _map_gib_to_commercial_gb(gib_value: float) -> str:
@@ -38,11 +554,37 @@ def _map_gib_to_commercial_gb(gib_value: float) -> str:
             return f"{size}GB"
     return f"{int(round(gib_value * (1024**3) / (10**9)))}GB"
 
+# --- Perfis de Coleta ---
+# Cada perfil define as seções pedidas ao inxi (em vez do relatório completo -F, que
+# percorre sensores, rede, áudio, vídeo e partições que não usamos) e as sondas
+# manuais executadas no fallback. Campos fora do perfil ficam vazios no relatório.
+
+COLLECTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    'minimo': {'inxi': "CmS", 'sondas': ('distro', 'cpu', 'memoria')},
+    'padrao': {'inxi': "CMmDS", 'sondas': ('distro', 'cpu', 'placa_mae', 'memoria', 'disco')},
+    'completo': {'inxi': "F", 'sondas': ('distro', 'cpu', 'placa_mae', 'memoria', 'disco')},
+}
+PROBE_FIELDS = {'distro': ('distro', 'kernel'), 'cpu': ('processador', 'cores_threads'), 'placa_mae': ('placa_mae',), 'memoria': ('ram',), 'disco': ('disk_type', 'disk_size')}
+
+def inxi_command(profile: str) -> str:
+    return f"inxi -{COLLECTION_PROFILES[profile]['inxi']}zJc0"
+
 # --- Estratégia de Coleta Principal: INXI (JSON) ---
 
-def _collect_with_inxi(client: paramiko.SSHClient) -> Optional[Dict[str, Any]]:
-    inxi_output = _run_command(client, "inxi -FzJc0")
-    if not inxi_output: return None
+def _collect(ctx: CollectionContext) -> Dict[str, Any]:
+    """Tenta o inxi e cai para a coleta manual, pulando o inxi nos hosts em que ele já falhou."""
+    if ctx.fixed_order or ctx.preferred.get("coleta") != "manual":
+        started = time.monotonic()
+        results = _collect_with_inxi(ctx)
+        ctx.record_probe("coleta", "inxi", time.monotonic() - started, bool(results))
+        if results: ctx.learn("coleta", "inxi"); return results
+    ctx.learn("coleta", "manual")
+    return _collect_manually(ctx)
+
+def _collect_with_inxi(ctx: CollectionContext) -> Optional[Dict[str, Any]]:
+    return _parse_command(ctx, inxi_command(ctx.profile), lambda output: _parse_inxi(output, ctx.profile))
+
+def _parse_inxi(inxi_output: str, profile: str) -> Optional[Dict[str, Any]]:
     try:
         data = json.loads(inxi_output)
         results = {}
@@ -62,172 +604,304 @@ def _collect_with_inxi(client: paramiko.SSHClient) -> Optional[Dict[str, Any]]:
         results['distro'] = system.get('distro', 'N/A')
         match = re.match(r"(\d+\.\d+)", kernel)
         results['kernel'] = match.group(1) if match else kernel
-        if results.get('processador') != 'N/A' and results.get('ram') != 'N/A': return results
+        if results.get('processador') != 'N/A' and results.get('ram') != 'N/A':
+            wanted = {f for probe in COLLECTION_PROFILES[profile]['sondas'] for f in PROBE_FIELDS[probe]}
+            return {key: value for key, value in results.items() if key in wanted}
     except (json.JSONDecodeError, IndexError, KeyError): return None
     return None
 
 # --- Estratégia de Fallback: Coleta Manual ---
+# Cada cadeia de fallback é uma lista ordenada de estratégias nomeadas. A cadeia pára na
+# primeira que completa os campos; a vencedora é memorizada no CapabilityCache para que
+# a próxima execução vá direto a ela.
 
-def _collect_manually(client: paramiko.SSHClient) -> Dict[str, Any]:
-    results = {}; results.update(_get_distro_info_manual(client)); results.update(_get_cpu_info_manual(client)); results.update(_get_motherboard_info_manual(client)); results.update(_get_memory_info_manual(client)); results.update(_get_storage_info_manual(client)); return results
+def _run_chain(ctx: CollectionContext, chain: str, strategies: List[Tuple[str, Callable[[], Optional[Dict[str, str]]]]], defaults: Dict[str, str], required: Tuple[str, ...]) -> Dict[str, str]:
+    info = dict(defaults)
+    preferred = ctx.preferred.get(chain)
+    by_name = dict(strategies)
+    for name in ctx.order(chain, [name for name, _ in strategies]):
+        started = time.monotonic()
+        partial = by_name[name]() or {}
+        for key, value in partial.items():
+            if info.get(key) == defaults.get(key): info[key] = value
+        complete = all(info[key] != defaults[key] for key in required)
+        ctx.record_probe(chain, name, time.monotonic() - started, complete)
+        if complete:
+            ctx.learn(chain, name); return info
+        if name == preferred: ctx.forget(chain)
+    return info
+
+def _collect_manually(ctx: CollectionContext) -> Dict[str, Any]:
+    # As sondas são independentes: rodam em canais paralelos sobre o mesmo transporte
+    # (até ctx.max_channels) e são mescladas sempre na mesma ordem.
+    probes = [MANUAL_PROBES[name] for name in COLLECTION_PROFILES[ctx.profile]['sondas']]
+    if ctx.max_channels <= 1: partials = [probe(ctx) for probe in probes]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(ctx.max_channels, len(probes))) as executor:
+            partials = list(executor.map(lambda probe: probe(ctx), probes))
+    results = {}
+    for partial in partials: results.update(partial)
+    return results
 
-def _get_distro_info_manual(client: paramiko.SSHClient) -> Dict[str, str]:
-    info = {'distro': "Não foi possível obter", 'kernel': "N/A"}
-    kernel_output = _run_command(client, "uname -r")
+def _parse_distro(output: Optional[str]) -> Optional[Dict[str, str]]:
+    if not output: return None
+    match = re.search(r'PRETTY_NAME="([^"]+)"', output) or re.search(r'DISTRIB_DESCRIPTION="([^"]+)"', output)
+    if match: return {'distro': _clean_string(match.group(1))}
+    if "No LSB modules" not in output: return {'distro': _clean_string(output.split('\n')[0])}
+    return None
+
+def _get_distro_info_manual(ctx: CollectionContext) -> Dict[str, str]:
+    info = {'kernel': "N/A"}
+    kernel_output = _run_command(ctx, "uname -r")
     if kernel_output:
         match = re.match(r"(\d+\.\d+)", kernel_output)
         info['kernel'] = match.group(1) if match else kernel_output
-    output = _run_command(client, "lsb_release -ds") or _run_command(client, "cat /etc/os-release")
-    if output:
-        match = re.search(r'PRETTY_NAME="([^"]+)"', output) or re.search(r'DISTRIB_DESCRIPTION="([^"]+)"', output)
-        if match: info['distro'] = _clean_string(match.group(1))
-        elif "No LSB modules" not in output: info['distro'] = _clean_string(output.split('\n')[0])
+    info.update(_run_chain(ctx, "distro", [
+        ("lsb_release", lambda: _parse_command(ctx, "lsb_release -ds", _parse_distro)),
+        ("os_release", lambda: _parse_command(ctx, "cat /etc/os-release", _parse_distro)),
+    ], {'distro': "Não foi possível obter"}, ('distro',)))
     return info
 
-def _get_cpu_info_manual(client: paramiko.SSHClient) -> Dict[str, str]:
-    info = {'processador': "N/A", 'cores_threads': "N/A"}
-    lscpu_output = _run_command(client, "lscpu")
-    if lscpu_output:
-        model_match = re.search(r"Model name:\s+(.+)", lscpu_output)
-        if model_match: info['processador'] = _clean_string(model_match.group(1))
-        try:
-            cores_str = re.search(r"Core\(s\) per socket:\s+(\d+)", lscpu_output).group(1)
-            sockets_str = re.search(r"Socket\(s\):\s+(\d+)", lscpu_output).group(1)
-            threads_per_core_str = re.search(r"Thread\(s\) per core:\s+(\d+)", lscpu_output).group(1)
-            total_cores = int(cores_str) * int(sockets_str)
-            total_threads = total_cores * int(threads_per_core_str)
-            info['cores_threads'] = f"{total_cores}/{total_threads}"
-        except (AttributeError, ValueError): pass
-    if info['processador'] == "N/A" or info['cores_threads'] == "N/A":
-        cpuinfo_output = _run_command(client, "cat /proc/cpuinfo")
-        if cpuinfo_output:
-            if info['processador'] == "N/A":
-                model_match = re.search(r"model name\s*:\s*(.+)", cpuinfo_output, re.IGNORECASE)
-                if model_match: info['processador'] = _clean_string(model_match.group(1))
-            if info['cores_threads'] == "N/A":
-                threads = len(re.findall(r"^processor\s+:", cpuinfo_output, re.MULTILINE))
-                cores = len(set(re.findall(r"core id\s+:\s+(\d+)", cpuinfo_output))) or threads
-                if cores > 0 and threads > 0: info['cores_threads'] = f"{cores}/{threads}"
+def _cpu_from_lscpu(ctx: CollectionContext) -> Optional[Dict[str, str]]:
+    return _parse_command(ctx, "lscpu", _parse_lscpu)
+
+def _parse_lscpu(lscpu_output: str) -> Optional[Dict[str, str]]:
+    info = {}
+    model_match = re.search(r"Model name:\s+(.+)", lscpu_output)
+    if model_match: info['processador'] = _clean_string(model_match.group(1))
+    try:
+        cores_str = re.search(r"Core\(s\) per socket:\s+(\d+)", lscpu_output).group(1)
+        sockets_str = re.search(r"Socket\(s\):\s+(\d+)", lscpu_output).group(1)
+        threads_per_core_str = re.search(r"Thread\(s\) per core:\s+(\d+)", lscpu_output).group(1)
+        total_cores = int(cores_str) * int(sockets_str)
+        total_threads = total_cores * int(threads_per_core_str)
+        info['cores_threads'] = f"{total_cores}/{total_threads}"
+    except (AttributeError, ValueError): pass
     return info
 
-def _get_motherboard_info_manual(client: paramiko.SSHClient) -> Dict[str, str]:
-    output = _run_command(client, "dmidecode -t baseboard", tolerant=True)
-    if output:
-        mfr = re.search(r"Manufacturer:\s+(.+)", output); prod = re.search(r"Product Name:\s+(.+)", output)
-        vendor = _clean_string(mfr.group(1)) if mfr else ""; model = _clean_string(prod.group(1)) if prod else ""
-        if "Not Spec" not in vendor and "Not Spec" not in model and (vendor or model): return {'placa_mae': f"{vendor} - {model}".strip(' -')}
-    vendor = _run_command(client, "cat /sys/devices/virtual/dmi/id/board_vendor"); model = _run_command(client, "cat /sys/devices/virtual/dmi/id/board_name")
-    if vendor or model:
-        vendor, model = _clean_string(vendor), _clean_string(model)
-        if "Not Spec" not in vendor and "Not Spec" not in model and (vendor or model): return {'placa_mae': f"{vendor} - {model}".strip(' -')}
-    vendor = _run_command(client, "cat /sys/class/dmi/id/board_vendor"); model = _run_command(client, "cat /sys/class/dmi/id/board_name")
-    if vendor or model:
-        vendor, model = _clean_string(vendor), _clean_string(model)
-        if (vendor and "empty" not in vendor.lower()) or (model and "empty" not in model.lower()): return {'placa_mae': f"{vendor} - {model}".strip(' -')}
-    return {'placa_mae': "Não foi possível obter"}
-
-def _get_memory_info_manual(client: paramiko.SSHClient) -> Dict[str, str]:
-    info = {'ram': "N/A"}; mem_type = ""
-    output = _run_command(client, "dmidecode -t memory", tolerant=True)
-    if output:
-        total_mb = 0; speed_mhz = 0
-        device_blocks = output.split("Memory Device\n")
-        for block in device_blocks[1:]:
-            if "Not Installed" not in block and "No Module Installed" not in block:
-                size_match = re.search(r"(?:Installed Size|Size):\s*(\d+)\s*(MB|GB)", block)
-                if size_match:
-                    size, unit = int(size_match.group(1)), size_match.group(2)
-                    total_mb += size * 1024 if unit == "GB" else size
-                if not mem_type:
-                    type_line_match = re.search(r"Type:\s*(\S+)", block)
-                    if type_line_match:
-                        type_str = type_line_match.group(1).upper()
-                        if "DDR5" in type_str: mem_type = " DDR5"
-                        elif "DDR4" in type_str: mem_type = " DDR4"
-                        elif "DDR3" in type_str: mem_type = " DDR3"
-                        elif "DDR2" in type_str: mem_type = " DDR2"
-                        elif "DDR" in type_str: mem_type = " DDR"
-                if speed_mhz == 0:
-                    speed_match = re.search(r"Speed:\s*(\d+)\s*MHz", block)
-                    if speed_match: speed_mhz = int(speed_match.group(1))
-        
-        if not mem_type and speed_mhz > 0:
-            if speed_mhz >= 2133: mem_type = " DDR4"
-            elif speed_mhz > 1000: mem_type = " DDR3"
-            elif speed_mhz <= 1000: mem_type = " DDR2"
-
-        if total_mb > 0:
-            info['ram'] = f"{int(round(total_mb / 1024))}GB" + mem_type
-            return info
-            
-    output = _run_command(client, "cat /proc/meminfo")
-    if output:
-        mem_total_match = re.search(r"MemTotal:\s*(\d+)\s*kB", output)
-        if mem_total_match:
-            gb = int(mem_total_match.group(1)) / 1024**2
-            info['ram'] = f"{int(round(gb))}GB"; return info
-            
+def _parse_cpuinfo(lines: Iterator[str]) -> Optional[Dict[str, str]]:
+    info = {}; threads = 0; core_ids = set()
+    for line in lines:
+        if 'processador' not in info:
+            model_match = re.search(r"model name\s*:\s*(.+)", line, re.IGNORECASE)
+            if model_match: info['processador'] = _clean_string(model_match.group(1))
+        if re.match(r"processor\s+:", line): threads += 1
+        core_match = re.search(r"core id\s+:\s+(\d+)", line)
+        if core_match: core_ids.add(core_match.group(1))
+    cores = len(core_ids) or threads
+    if cores > 0 and threads > 0: info['cores_threads'] = f"{cores}/{threads}"
+    return info or None
+
+def _cpu_from_cpuinfo(ctx: CollectionContext) -> Optional[Dict[str, str]]:
+    return _stream_command(ctx, "cat /proc/cpuinfo", _parse_cpuinfo)
+
+def _get_cpu_info_manual(ctx: CollectionContext) -> Dict[str, str]:
+    return _run_chain(ctx, "cpu", [
+        ("lscpu", lambda: _cpu_from_lscpu(ctx)),
+        ("cpuinfo", lambda: _cpu_from_cpuinfo(ctx)),
+    ], {'processador': "N/A", 'cores_threads': "N/A"}, ('processador', 'cores_threads'))
+
+def _board_from_dmidecode(ctx: CollectionContext) -> Optional[Dict[str, str]]:
+    return _parse_command(ctx, "dmidecode -t baseboard", _parse_dmidecode_baseboard, tolerant=True)
+
+def _parse_dmidecode_baseboard(output: str) -> Optional[Dict[str, str]]:
+    mfr = re.search(r"Manufacturer:\s+(.+)", output); prod = re.search(r"Product Name:\s+(.+)", output)
+    vendor = _clean_string(mfr.group(1)) if mfr else ""; model = _clean_string(prod.group(1)) if prod else ""
+    if "Not Spec" not in vendor and "Not Spec" not in model and (vendor or model): return {'placa_mae': f"{vendor} - {model}".strip(' -')}
+    return None
+
+def _board_from_sys_virtual(ctx: CollectionContext) -> Optional[Dict[str, str]]:
+    vendor = _run_command(ctx, "cat /sys/devices/virtual/dmi/id/board_vendor"); model = _run_command(ctx, "cat /sys/devices/virtual/dmi/id/board_name")
+    if not (vendor or model): return None
+    vendor, model = _clean_string(vendor), _clean_string(model)
+    if "Not Spec" not in vendor and "Not Spec" not in model and (vendor or model): return {'placa_mae': f"{vendor} - {model}".strip(' -')}
+    return None
+
+def _board_from_sys_class(ctx: CollectionContext) -> Optional[Dict[str, str]]:
+    vendor = _run_command(ctx, "cat /sys/class/dmi/id/board_vendor"); model = _run_command(ctx, "cat /sys/class/dmi/id/board_name")
+    if not (vendor or model): return None
+    vendor, model = _clean_string(vendor), _clean_string(model)
+    if (vendor and "empty" not in vendor.lower()) or (model and "empty" not in model.lower()): return {'placa_mae': f"{vendor} - {model}".strip(' -')}
+    return None
+
+def _get_motherboard_info_manual(ctx: CollectionContext) -> Dict[str, str]:
+    return _run_chain(ctx, "placa_mae", [
+        ("dmidecode", lambda: _board_from_dmidecode(ctx)),
+        ("sys_virtual", lambda: _board_from_sys_virtual(ctx)),
+        ("sys_class", lambda: _board_from_sys_class(ctx)),
+    ], {'placa_mae': "Não foi possível obter"}, ('placa_mae',))
+
+def _parse_dmidecode_memory(lines: Iterator[str]) -> Optional[Dict[str, str]]:
+    """Soma os módulos instalados bloco a bloco ("Memory Device"), mantendo só o bloco corrente em memória."""
+    total_mb = 0; speed_mhz = 0; mem_type = ""; block: Optional[List[str]] = None
+    def finish(block_lines: List[str]):
+        nonlocal total_mb, speed_mhz, mem_type
+        block = "\n".join(block_lines)
+        if "Not Installed" in block or "No Module Installed" in block: return
+        size_match = re.search(r"(?:Installed Size|Size):\s*(\d+)\s*(MB|GB)", block)
+        if size_match:
+            size, unit = int(size_match.group(1)), size_match.group(2)
+            total_mb += size * 1024 if unit == "GB" else size
+        if not mem_type:
+            type_line_match = re.search(r"Type:\s*(\S+)", block)
+            if type_line_match:
+                type_str = type_line_match.group(1).upper()
+                if "DDR5" in type_str: mem_type = " DDR5"
+                elif "DDR4" in type_str: mem_type = " DDR4"
+                elif "DDR3" in type_str: mem_type = " DDR3"
+                elif "DDR2" in type_str: mem_type = " DDR2"
+                elif "DDR" in type_str: mem_type = " DDR"
+        if speed_mhz == 0:
+            speed_match = re.search(r"Speed:\s*(\d+)\s*MHz", block)
+            if speed_match: speed_mhz = int(speed_match.group(1))
+
+    for line in lines:
+        if line.rstrip().endswith("Memory Device"):
+            if block is not None: finish(block)
+            block = []
+        elif block is not None: block.append(line)
+    if block is not None: finish(block)
+
+    if not mem_type and speed_mhz > 0:
+        if speed_mhz >= 2133: mem_type = " DDR4"
+        elif speed_mhz > 1000: mem_type = " DDR3"
+        elif speed_mhz <= 1000: mem_type = " DDR2"
+
+    if total_mb > 0: return {'ram': f"{int(round(total_mb / 1024))}GB" + mem_type}
+    return None
+
+def _memory_from_dmidecode(ctx: CollectionContext) -> Optional[Dict[str, str]]:
+    return _stream_command(ctx, "dmidecode -t memory", _parse_dmidecode_memory, tolerant=True)
+
+def _memory_from_meminfo(ctx: CollectionContext) -> Optional[Dict[str, str]]:
+    return _parse_command(ctx, "cat /proc/meminfo", _parse_meminfo)
+
+def _parse_meminfo(output: str) -> Optional[Dict[str, str]]:
+    mem_total_match = re.search(r"MemTotal:\s*(\d+)\s*kB", output)
+    if mem_total_match:
+        gb = int(mem_total_match.group(1)) / 1024**2
+        return {'ram': f"{int(round(gb))}GB"}
+    return None
+
+def _get_memory_info_manual(ctx: CollectionContext) -> Dict[str, str]:
+    return _run_chain(ctx, "memoria", [
+        ("dmidecode", lambda: _memory_from_dmidecode(ctx)),
+        ("meminfo", lambda: _memory_from_meminfo(ctx)),
+    ], {'ram': "N/A"}, ('ram',))
+
+def _disk_size_from_hdparm(ctx: CollectionContext, disk: str) -> Optional[Dict[str, str]]:
+    return _parse_command(ctx, f"hdparm -I /dev/{disk}", _parse_hdparm)
+
+def _parse_hdparm(output: str) -> Optional[Dict[str, str]]:
+    size_match = re.search(r"device size with M = 1000\*1000:.*?\((\d+)\s*GB\)", output)
+    if not size_match: return None
+    info = {'disk_size': f"{size_match.group(1)}GB"}
+    rate_match = re.search(r"Nominal Media Rotation Rate:\s*(.+)", output)
+    if rate_match and "Solid State" in rate_match.group(1): info['disk_type'] = "SSD"
     return info
 
-def _get_storage_info_manual(client: paramiko.SSHClient) -> Dict[str, str]:
+def _disk_size_from_fdisk(ctx: CollectionContext, disk: str) -> Optional[Dict[str, str]]:
+    return _parse_command(ctx, f"fdisk -l /dev/{disk}", _parse_fdisk)
+
+def _parse_fdisk(output: str) -> Optional[Dict[str, str]]:
+    size_match = re.search(r"Disk /dev/[a-z\d]+:\s*([\d\.]+)\s*(GB|GiB|TB|TiB)", output)
+    if not size_match: return None
+    val, unit = float(size_match.group(1)), size_match.group(2).upper().replace("I", "")
+    gib_value = val if "G" in unit else (val * 1024)
+    return {'disk_size': _map_gib_to_commercial_gb(gib_value)}
+
+def _disk_size_from_lsblk(ctx: CollectionContext, disk: str) -> Optional[Dict[str, str]]:
+    output = _run_command(ctx, f"lsblk -d -b -o SIZE /dev/{disk} | tail -n 1")
+    if output and output.isdigit(): return {'disk_size': _map_gib_to_commercial_gb(int(output) / 1024**3)}
+    return None
+
+def _get_storage_info_manual(ctx: CollectionContext) -> Dict[str, str]:
     info = {'disk_type': "N/A", 'disk_size': "N/A"}
-    primary_disk = _run_command(client, "lsblk -dno NAME,TYPE | grep -E 'disk|rom' | head -n 1 | awk '{print $1}'")
+    primary_disk = _run_command(ctx, "lsblk -dno NAME,TYPE | grep -E 'disk|rom' | head -n 1 | awk '{print $1}'")
     if not primary_disk: return info
 
     if 'nvme' in primary_disk: info['disk_type'] = "NVMe"
     else:
-        rotational = _run_command(client, f"cat /sys/block/{primary_disk}/queue/rotational")
+        rotational = _run_command(ctx, f"cat /sys/block/{primary_disk}/queue/rotational")
         if rotational:
             if rotational.strip() == '0': info['disk_type'] = "SSD"
             elif rotational.strip() == '1': info['disk_type'] = "HDD"
-    
-    output = _run_command(client, f"hdparm -I /dev/{primary_disk}")
-    if output:
-        size_match = re.search(r"device size with M = 1000\*1000:.*?\((\d+)\s*GB\)", output)
-        if size_match:
-            info['disk_size'] = f"{size_match.group(1)}GB"
-            if info['disk_type'] == "N/A" and "Nominal Media Rotation Rate" in output:
-                rate_match = re.search(r"Nominal Media Rotation Rate:\s*(.+)", output)
-                if rate_match and "Solid State" in rate_match.group(1): info['disk_type'] = "SSD"
-            return info
-            
-    output = _run_command(client, f"fdisk -l /dev/{primary_disk}")
-    if output:
-        size_match = re.search(r"Disk /dev/[a-z\d]+:\s*([\d\.]+)\s*(GB|GiB|TB|TiB)", output)
-        if size_match:
-            val, unit = float(size_match.group(1)), size_match.group(2).upper().replace("I", "")
-            gib_value = val if "G" in unit else (val * 1024)
-            info['disk_size'] = _map_gib_to_commercial_gb(gib_value); return info
-            
-    output = _run_command(client, f"lsblk -d -b -o SIZE /dev/{primary_disk} | tail -n 1")
-    if output and output.isdigit():
-        gib = int(output) / 1024**3
-        info['disk_size'] = _map_gib_to_commercial_gb(gib); return info
-    
+
+    sized = _run_chain(ctx, "disco", [
+        ("hdparm", lambda: _disk_size_from_hdparm(ctx, primary_disk)),
+        ("fdisk", lambda: _disk_size_from_fdisk(ctx, primary_disk)),
+        ("lsblk", lambda: _disk_size_from_lsblk(ctx, primary_disk)),
+    ], {'disk_type': "N/A", 'disk_size': "N/A"}, ('disk_size',))
+    info['disk_size'] = sized['disk_size']
+    if info['disk_type'] == "N/A": info['disk_type'] = sized['disk_type']
     return info
 
+MANUAL_PROBES = {'distro': _get_distro_info_manual, 'cpu': _get_cpu_info_manual, 'placa_mae': _get_motherboard_info_manual, 'memoria': _get_memory_info_manual, 'disco': _get_storage_info_manual}
+
 # --- Função Principal de Orquestração ---
 
-def get_hardware_info(ip: str, username: str, password: Optional[str], key_path: Optional[str], timeout: int = 30) -> Dict[str, Any]:
+def get_hardware_info(ip: str, username: str, password: Optional[str], key_path: Optional[str], timeout: int = 30, jump_host: Optional[Dict[str, Any]] = None, gateway_pool: Optional[GatewayPool] = None, store: Any = None, deadline: Optional[float] = None, cancel_event: Optional[threading.Event] = None, max_channels: int = 3, capability_cache: Optional[CapabilityCache] = None, probe_stats: Optional[ProbeStats] = None, fixed_order: bool = False, profile: str = "padrao", max_output_bytes: int = 4 * 1024 * 1024, output_histogram: Optional[OutputSizeHistogram] = None, recorded: Optional[Dict[str, Tuple[bytes, bool]]] = None, parse_cache: Optional[ParseCache] = None, credentials: Optional[List[Credential]] = None, address: Optional[str] = None, cache_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Coleta o hardware de um host. `deadline` é o instante (time.monotonic) limite para
+    conexão e comandos: esgotado o prazo, as sondas restantes são puladas e os dados
+    parciais retornam com status TIMEOUT_PARCIAL (ou CANCELADO, se `cancel_event` for sinalizado).
+    `max_channels` limita os canais simultâneos abertos no host durante a coleta manual e
+    `capability_cache`, se informado, direciona cada cadeia de fallback à estratégia que funcionou antes;
+    `probe_stats` registra e aplica o modelo de custo das sondas (`fixed_order` mantém a ordem do código)
+    e `profile` escolhe o perfil de coleta (ver COLLECTION_PROFILES). A saída de cada comando é lida em
+    blocos e limitada a `max_output_bytes` (0 desliga o limite); `output_histogram` acumula os tamanhos.
+    Se `recorded` for informado, recebe a saída bruta e o sucesso de cada comando executado (archive.py);
+    `parse_cache` memoriza o resultado dos parsers por saída, compartilhado entre os hosts.
+    `credentials`, se informado, substitui `username`/`password`/`key_path` por uma lista ordenada de
+    conjuntos, tentados um a um em caso de falha de autenticação; o rótulo do que autenticou volta em 'credencial'.
+    `address` é o endereço já resolvido de um hostname (sem gateway), usado na conexão no lugar de `ip`.
+    `cache_key` identifica o host no `capability_cache` (padrão: `ip`; atrás de gateway de loja, o IP com o escopo).
+    """
     client = paramiko.SSHClient()
     client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ctx = CollectionContext(client, deadline=deadline, cancel_event=cancel_event, max_channels=max_channels, probe_stats=probe_stats, fixed_order=fixed_order, profile=profile, max_output_bytes=max_output_bytes, output_histogram=output_histogram, recorded=recorded, parse_cache=parse_cache)
+    own_pool = jump_host is not None and gateway_pool is None
+    if own_pool: gateway_pool = GatewayPool(timeout=timeout)
     try:
-        pkey = None
-        if key_path and os.path.exists(key_path):
-            try: pkey = paramiko.Ed25519Key.from_private_key_file(key_path)
-            except paramiko.SSHException: pkey = paramiko.RSAKey.from_private_key_file(key_path)
-        client.connect(hostname=ip, username=username, password=password, pkey=pkey, timeout=timeout, auth_timeout=timeout, allow_agent=False, look_for_keys=False)
-        
-        inxi_results = _collect_with_inxi(client)
-        if inxi_results:
-            inxi_results['status'] = "SUCESSO"; return inxi_results
-            
-        manual_results = _collect_manually(client)
-        manual_results['status'] = "SUCESSO"; return manual_results
+        if ctx.should_stop(): return {'status': "CANCELADO", 'erro': "Execução cancelada antes da conexão"}
+        credentials = credentials or [Credential(PRIMARY_LABEL, username, password, key_path)]
+        connect_timeout = timeout if deadline is None else max(0.1, min(timeout, ctx.remaining()))
+        with ExitStack() as connection:
+            credential = _authenticate(client, address or ip, credentials, connect_timeout, connection, lambda c: gateway_pool.channel(jump_host, store, ip, c.username, c.password, c.key_path) if jump_host else _no_channel())
+            try:
+                if capability_cache is not None:
+                    fingerprint, signature = CapabilityCache.identify(client)
+                    ctx.preferred = capability_cache.lookup(cache_key or ip, fingerprint, signature)
+                results = _collect(ctx)
+                if capability_cache is not None: capability_cache.commit(cache_key or ip, fingerprint, signature, ctx)
+                results['status'] = "SUCESSO" if not ctx.expired else "CANCELADO" if cancel_event is not None and cancel_event.is_set() else "TIMEOUT_PARCIAL"
+                results['credencial'] = credential.label
+                if ctx.expired: results['erro'] = "Coleta interrompida; dados parciais"
+                return results
+            finally: client.close()
 
+    except GatewayAuthFailed as e: return {'status': "FALHA_AUTH", 'erro': str(e)}
     except paramiko.AuthenticationException: return {'status': "FALHA_AUTH", 'erro': "Falha na autenticação"}
+    except CredentialError as e: return {'status': "FALHA_AUTH", 'erro': str(e)}
+    except GatewaySaturated as e: return {'status': "GATEWAY_SATURADO", 'erro': str(e)}
     except (socket.timeout, paramiko.ssh_exception.NoValidConnectionsError, TimeoutError): return {'status': "FALHA_CONEXAO", 'erro': f"Timeout ao conectar no IP {ip}"}
+    except ConnectionError as e: return {'status': "FALHA_CONEXAO", 'erro': f"Conexão recusada ou interrompida ({jump_host['host'] if jump_host else ip}): {e}"}
+    except paramiko.ChannelException as e: return {'status': "FALHA_CONEXAO", 'erro': f"Gateway {jump_host['host']} não alcançou o IP {ip}: {e}" if jump_host else f"Canal SSH recusado em {ip}: {e}"}
     except paramiko.SSHException as e: return {'status': "ERRO_SSH", 'erro': f"Erro SSH: {e}"}
     except FileNotFoundError: return {'status': "FALHA_AUTH", 'erro': f"Chave SSH não encontrada: {key_path}"}
     except Exception as e: return {'status': "ERRO_DESCONHECIDO", 'erro': f"Erro inesperado: {e}"}
-    finally: client.close()
\ No newline at end of file
+    finally:
+        client.close()
+        if own_pool: gateway_pool.close()
+
+def replay_hardware_info(outputs: Dict[str, Tuple[bytes, bool]], profile: str = "padrao", parse_cache: Optional[ParseCache] = None) -> Dict[str, Any]:
+    """
+    Refaz a coleta de um host sobre as saídas gravadas numa execução anterior (`comando ->
+    (saída, sucesso)`), sem rede: os parsers atuais reinterpretam as mesmas saídas. As cadeias
+    seguem a ordem fixa do código; um comando que não foi gravado conta como falha.
+    """
+    return _collect(CollectionContext(None, fixed_order=True, profile=profile, replay=outputs, parse_cache=parse_cache))
+
+@contextmanager
+def _no_channel() -> Iterator[None]:
+    yield None
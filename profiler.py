@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+profiler.py: Profiler por amostragem do invent-ssh.
+
+Uma thread de fundo lê, a intervalos regulares, a pilha de todas as threads do
+processo (sys._current_frames): workers de coleta, a thread do motor e, na interface,
+a thread principal do Tk. Ao final grava um arquivo no formato "collapsed stacks"
+(uma linha `thread;modulo:funcao;... peso` por pilha distinta, peso em microssegundos),
+aceito pelo flamegraph.pl, speedscope e afins, e resume os pontos quentes.
+
+No Linux, cada amostra pesa a CPU que a thread gastou desde a anterior (relógio de
+CPU da thread), de modo que threads paradas em socket ou em espera não aparecem. Nos
+demais sistemas, cada amostra pesa o intervalo de amostragem e são descartadas as
+que têm no topo da pilha uma função de espera (select, recv, wait...). Cada amostra
+custa só uma leitura das pilhas, sem instrumentar as chamadas, o que permite deixar o
+profiler ligado em execuções de produção (o custo medido aparece no resumo).
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# Funções que, no topo da pilha, indicam uma thread em espera (modo sem relógio de CPU por thread)
+_IDLE_FUNCTIONS = frozenset(('wait', 'select', 'poll', 'recv', 'recv_into', 'accept', 'sleep', '_wait_for_tstate_lock', 'get', 'read', 'readinto', 'mainloop'))
+
+_CPU_CLOCKS = sys.platform.startswith('linux') and hasattr(time, 'clock_gettime')
+
+def _thread_cpu_clock(native_id: int) -> int:
+    # Relógio de CPU de uma thread no Linux (MAKE_THREAD_CPUCLOCK(tid, CPUCLOCK_SCHED)). Ao contrário de
+    # time.pthread_getcpuclockid, é seguro para uma thread que já terminou: clock_gettime só falha com EINVAL.
+    return (~native_id << 3) | 6
+
+def _frame_label(code) -> str:
+    return f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}"
+
+class SamplingProfiler:
+    """Amostra as pilhas de todas as threads a cada `interval` segundos entre start() e stop()."""
+    def __init__(self, interval: float = 0.02, max_depth: int = 64):
+        self.interval, self.max_depth = interval, max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.total = 0
+        self.mode = "cpu" if _CPU_CLOCKS else "parede"
+        self._cpu: Dict[int, float] = {}
+        self._threads: Dict[int, Tuple[Optional[threading.Thread], str, Optional[int]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = self._elapsed = self._cost = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None: self._thread.join()
+        self._elapsed = time.perf_counter() - self._started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            started = time.perf_counter()
+            self._sample(own)
+            self._cost += time.perf_counter() - started
+
+    def _cpu_used(self, ident: int, clock_id: Optional[int]) -> int:
+        """Microssegundos de CPU gastos pela thread desde a amostra anterior (sem relógio, o intervalo inteiro)."""
+        if clock_id is None: return int(self.interval * 1e6)
+        try: clock = time.clock_gettime(clock_id)
+        except OSError: return 0
+        previous = self._cpu.get(ident); self._cpu[ident] = clock
+        return int((clock - previous) * 1e6) if previous is not None else 0
+
+    def _forget(self, ident: int):
+        self._threads.pop(ident, None); self._cpu.pop(ident, None)
+
+    def _sample(self, own: int):
+        frames = sys._current_frames()
+        # O ident de uma thread encerrada é reaproveitado por outra: a entrada só vale enquanto for a mesma Thread
+        known = {t.ident: t for t in threading.enumerate()}
+        for ident in [ident for ident in self._threads if ident not in frames]: self._forget(ident)
+        for ident, frame in frames.items():
+            if ident == own: continue
+            found = known.get(ident)
+            thread = self._threads.get(ident)
+            if thread is None or thread[0] is not found:
+                self._forget(ident)
+                # Workers do mesmo pool viram uma única raiz (ThreadPoolExecutor-0_7 -> ThreadPoolExecutor-0)
+                name = re.sub(r"_\d+$", "", found.name) if found is not None else f"thread-{ident}"
+                native_id = getattr(found, 'native_id', None)
+                thread = self._threads[ident] = (found, name, _thread_cpu_clock(native_id) if _CPU_CLOCKS and native_id else None)
+            _, name, clock_id = thread
+            if not _CPU_CLOCKS and frame.f_code.co_name in _IDLE_FUNCTIONS: continue
+            weight = self._cpu_used(ident, clock_id) if _CPU_CLOCKS else int(self.interval * 1e6)
+            if weight <= 0: continue
+            codes = []
+            while frame is not None and len(codes) < self.max_depth: codes.append(frame.f_code); frame = frame.f_back
+            self.stacks[(name, tuple(reversed(codes)))] += weight
+            self.samples += 1; self.total += weight
+
+    def collapsed(self) -> List[str]:
+        """Linhas no formato collapsed stacks (`raiz;quadro;quadro peso`)."""
+        folded: Counter = Counter()
+        for (name, codes), count in self.stacks.items(): folded[";".join([name] + [_frame_label(code) for code in codes])] += count
+        return [f"{stack} {count}" for stack, count in sorted(folded.items())]
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.collapsed(): f.write(line + "\n")
+
+    def hotspots(self, top: int = 15) -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+        """Funções com mais peso: (tempo próprio, no topo da pilha) e (inclusivo, em qualquer ponto da pilha), em fração do total."""
+        own: Counter = Counter(); inclusive: Counter = Counter()
+        for (_, codes), count in self.stacks.items():
+            if not codes: continue
+            own[_frame_label(codes[-1])] += count
+            for label in {_frame_label(code) for code in codes}: inclusive[label] += count
+        total = max(1, self.total)
+        return [(label, count / total) for label, count in own.most_common(top)], [(label, count / total) for label, count in inclusive.most_common(top)]
+
+    def overhead(self) -> float:
+        """Fração do tempo de um núcleo gasta pelas amostragens."""
+        return self._cost / self._elapsed if self._elapsed else 0.0
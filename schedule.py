@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+schedule.py: Ordem de coleta dos hosts do invent-ssh.
+
+A duração da coleta de cada host (conexão + sondas, inclusive timeouts) é
+aprendida de uma execução para a outra. Com ela, os hosts mais demorados
+(PDVs antigos com HDD, lojas distantes) são iniciados primeiro: a ordem LPT
+(longest processing time first), que evita terminar a execução com poucos
+workers ocupados por uma cauda de hosts lentos.
+
+Numa execução com janela fixa (`run_time_box`), a ordem passa a ser pela idade
+dos dados: hosts nunca coletados primeiro, depois os de última coleta com sucesso
+mais antiga; hosts cuja duração esperada não cabe no tempo restante ficam para a
+próxima execução.
+"""
+import statistics
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from state import JsonStateStore
+
+# Peso da última medição na média móvel exponencial
+EWMA_ALPHA = 0.3
+
+class HostDurations:
+    """
+    Duração esperada da coleta de cada host (média móvel exponencial das execuções
+    anteriores) e data da última coleta com sucesso. Hosts sem histórico recebem a
+    mediana da sua loja, ou da frota, ou `default` se ainda não houver nenhuma medição.
+    """
+    def __init__(self, store: JsonStateStore, default: float = 10.0):
+        self.store = store
+        self.default = default
+
+    def record(self, host: str, store_key: Optional[int], seconds: float, success: bool = False):
+        with self.store.lock:
+            entry = self.store.section('hosts').get(host)
+            if entry is None: entry = self.store.section('hosts')[host] = {'media': round(seconds, 3), 'amostras': 1, 'loja': store_key}
+            else:
+                entry['media'] = round(entry['media'] + EWMA_ALPHA * (seconds - entry['media']), 3)
+                entry['amostras'] += 1; entry['loja'] = store_key
+            if success: entry['ultimo_sucesso'] = datetime.now().isoformat(timespec='seconds')
+
+    def estimator(self) -> Callable[[str, Optional[int]], float]:
+        """
+        Retorna `estimativa(host, loja)` a partir de um retrato do histórico atual (as medianas
+        por loja e da frota são calculadas uma única vez, não a cada host).
+        """
+        with self.store.lock:
+            hosts = {host: (entry['media'], entry.get('loja')) for host, entry in self.store.section('hosts').items()}
+        by_store: Dict[Any, list] = {}
+        for seconds, store_key in hosts.values(): by_store.setdefault(store_key, []).append(seconds)
+        store_median = {store_key: statistics.median(values) for store_key, values in by_store.items()}
+        fleet_median = statistics.median(seconds for seconds, _ in hosts.values()) if hosts else self.default
+        def estimate(host: str, store_key: Optional[int]) -> float:
+            known = hosts.get(host)
+            if known is not None: return known[0]
+            return store_median.get(store_key, fleet_median) if store_key is not None else fleet_median
+        return estimate
+
+    def staleness(self, estimate: Callable[[str, Optional[int]], float]) -> Callable[[str, Optional[int]], Tuple[int, float, float]]:
+        """
+        Retorna a chave de prioridade por idade dos dados (maior = primeiro): hosts nunca
+        coletados com sucesso, depois a última coleta mais antiga; empates pela maior duração esperada.
+        """
+        with self.store.lock:
+            last = {host: datetime.fromisoformat(entry['ultimo_sucesso']).timestamp() for host, entry in self.store.section('hosts').items() if entry.get('ultimo_sucesso')}
+        def priority(host: str, store_key: Optional[int]) -> Tuple[int, float, float]:
+            collected = last.get(host)
+            return (1, 0.0, estimate(host, store_key)) if collected is None else (0, -collected, estimate(host, store_key))
+        return priority
+
+    def last_success(self, host: str) -> Optional[str]:
+        with self.store.lock:
+            entry = self.store.section('hosts').get(host)
+            return entry.get('ultimo_sucesso') if entry else None
+
+    def known(self) -> int:
+        with self.store.lock: return len(self.store.section('hosts'))
+
+    def save(self):
+        self.store.save()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+state.py: Persistência local do invent-ssh entre execuções.
+
+Guarda em arquivos JSON (por padrão na pasta `cache`) o que o motor aprende
+sobre a frota de uma execução para a outra. Nenhuma credencial é gravada aqui.
+"""
+import json
+import os
+import threading
+import logging
+from typing import Any, Dict, Optional
+
+CACHE_DIR = "cache"
+
+class JsonStateStore:
+    """Dicionário persistido em JSON, seguro para uso por várias threads e com gravação atômica."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._data: Dict[str, Any] = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path): return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (json.JSONDecodeError, OSError) as e:
+            logging.getLogger(__name__).warning(f"Cache '{self.path}' ilegível e será recriado: {e}")
+            return {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock: return self._data.get(key, default)
+
+    def set(self, key: str, value: Any):
+        with self._lock: self._data[key] = value
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock: return self._data.pop(key, default)
+
+    def section(self, key: str) -> Dict[str, Any]:
+        """Retorna (criando, se preciso) um sub-dicionário do estado. Alterações nele devem ser feitas sob `lock`."""
+        with self._lock: return self._data.setdefault(key, {})
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    def save(self, path: Optional[str] = None):
+        """Grava o estado em disco de forma atômica (arquivo temporário + rename)."""
+        path = path or self.path
+        with self._lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=1, default=str)
+            os.replace(tmp_path, path)
+
+def cache_path(filename: str) -> str:
+    """Caminho padrão de um arquivo de cache dentro de CACHE_DIR."""
+    return os.path.join(CACHE_DIR, filename)
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+targets.py: Índice de alvos da coleta do invent-ssh.
+
+Normaliza e valida uma única vez o conteúdo da coluna IP das linhas carregadas
+(planilha ou Oracle), agrupa as linhas que apontam para o mesmo host para que
+ele seja coletado uma só vez e replica o resultado para todas elas ao final.
+A coluna IP também aceita redes CIDR (`10.1.3.0/28`) e faixas
+(`10.1.3.10-10.1.3.20` ou `10.1.3.10-20`), expandidas sob demanda conforme a
+coleta avança, sem materializar a lista de hosts antes de começar. Opcionalmente,
+a fila libera os hosts espalhados numa janela de tempo (PacedTargets).
+Hostnames são resolvidos antes da coleta, todos de uma vez (HostResolver).
+"""
+import concurrent.futures
+import ipaddress
+import math
+import random
+import re
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from state import JsonStateStore
+
+# Maior número de hosts aceito numa única rede/faixa (uma /16)
+MAX_EXPANSION = 65536
+
+INVALID_STATUS = "ERRO_IP_INVALIDO"
+DNS_FAILURE_STATUS = "FALHA_DNS"
+
+_HOSTNAME_LABEL = re.compile(r"^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$")
+
+# Campos copiados do terminal coletado para as linhas duplicadas (identificação da linha preservada)
+FAN_OUT_FIELDS = ('status', 'placa_mae', 'processador', 'cores_threads', 'ram', 'disk_type', 'disk_size', 'distro', 'kernel', 'dta_atualizacao', 'retentativas', 'dta_ultima_tentativa')
+
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+def normalize_host(text: Any) -> str:
+    """Forma canônica de um IP ou hostname. Levanta ValueError se não for nenhum dos dois (ou se estiver vazio)."""
+    if text is None or not str(text).strip(): raise ValueError("IP vazio")
+    value = str(text).strip().lower().rstrip('.')
+    try: return str(ipaddress.ip_address(value))
+    except ValueError: pass
+    labels = value.split('.')
+    if len(value) > 253 or not all(_HOSTNAME_LABEL.match(label) for label in labels) or all(label.isdigit() for label in labels):
+        raise ValueError(f"IP ou hostname inválido: '{text}'")
+    return value
+
+def is_ip(host: str) -> bool:
+    try: ipaddress.ip_address(host); return True
+    except ValueError: return False
+
+def parse_range(text: Any) -> Optional[Tuple[Address, int]]:
+    """
+    Interpreta uma rede CIDR ou faixa de IPs e retorna (primeiro endereço, quantidade).
+    Retorna None se o texto for um host único; levanta ValueError se a rede/faixa for inválida.
+    """
+    value = str(text).strip()
+    if '/' in value:
+        network = ipaddress.ip_network(value, strict=False)
+        if network.num_addresses > MAX_EXPANSION: raise ValueError(f"Rede '{value}' excede {MAX_EXPANSION} hosts")
+        if network.num_addresses <= 2: return network.network_address, network.num_addresses
+        if network.version == 6: return network.network_address + 1, network.num_addresses - 1
+        return network.network_address + 1, network.num_addresses - 2  # sem endereço de rede e broadcast
+    if '-' in value and not re.search(r"[a-zA-Z]", value):
+        start_text, end_text = (part.strip() for part in value.split('-', 1))
+        start = ipaddress.ip_address(start_text)
+        if end_text.isdigit() and start.version == 4: end = ipaddress.ip_address(f"{start_text.rsplit('.', 1)[0]}.{end_text}")
+        else: end = ipaddress.ip_address(end_text)
+        if end.version != start.version or end < start: raise ValueError(f"Faixa de IPs inválida: '{value}'")
+        count = int(end) - int(start) + 1
+        if count > MAX_EXPANSION: raise ValueError(f"Faixa '{value}' excede {MAX_EXPANSION} hosts")
+        return start, count
+    return None
+
+class LazyTargets:
+    """Fila de alvos com a mesma interface usada pelo despachante (`popleft` e teste de vazio), alimentada sob demanda."""
+    def __init__(self, source: Iterator[Any]):
+        self._source = source
+        self._buffer: deque = deque()
+
+    def _fill(self) -> bool:
+        if self._buffer: return True
+        for item in self._source:
+            self._buffer.append(item); return True
+        return False
+
+    def __bool__(self) -> bool:
+        return self._fill()
+
+    def popleft(self) -> Any:
+        if not self._fill(): raise IndexError("pop from an empty LazyTargets")
+        return self._buffer.popleft()
+
+    def wait_time(self) -> float:
+        """Segundos até o próximo alvo poder ser liberado (0: já pode)."""
+        return 0.0
+
+class PacedTargets(LazyTargets):
+    """
+    Fila que espalha `count` alvos uniformemente por `window` segundos: a janela é dividida
+    em fatias iguais e cada alvo é liberado num instante aleatório dentro dos primeiros
+    `jitter` (0 a 1) da sua fatia. Assim a carga na rede e nos sshd fica plana em vez de
+    concentrada no início, e execuções periódicas não sincronizam os mesmos hosts no mesmo instante.
+    """
+    def __init__(self, source: Iterator[Any], count: int, window: float, jitter: float = 1.0):
+        super().__init__(source)
+        self.interval = window / max(1, count)
+        self.jitter = min(1.0, max(0.0, jitter))
+        self.start = time.monotonic()
+        self.released = 0
+        self._due = self._next_due()
+
+    def _next_due(self) -> float:
+        return self.start + self.interval * (self.released + random.uniform(0, self.jitter))
+
+    def wait_time(self) -> float:
+        return max(0.0, self._due - time.monotonic())
+
+    def popleft(self) -> Any:
+        terminal = super().popleft()
+        self.released += 1; self._due = self._next_due()
+        return terminal
+
+class HostResolver:
+    """
+    Resolve os hostnames da coleta antes de despachar qualquer worker: todos os nomes distintos
+    em paralelo (até `workers` consultas simultâneas), cada lote com no máximo `timeout` segundos.
+    Os resultados ficam em cache entre execuções por `ttl` segundos (falhas definitivas por
+    `negative_ttl`); consultas que estouram o prazo não são memorizadas.
+    """
+    def __init__(self, store: JsonStateStore, ttl: float = 3600, negative_ttl: float = 300, timeout: float = 2.0, workers: int = 32):
+        self.store = store
+        self.ttl, self.negative_ttl, self.timeout, self.workers = ttl, negative_ttl, timeout, max(1, workers)
+        self.cached = 0
+
+    @staticmethod
+    def _lookup(name: str) -> str:
+        return socket.getaddrinfo(name, 22, type=socket.SOCK_STREAM)[0][4][0]
+
+    def _start_lookups(self, names: List[str], workers: int) -> Dict[concurrent.futures.Future, str]:
+        """
+        Dispara as consultas em threads daemon (e não num ThreadPoolExecutor, cujas threads são
+        aguardadas na saída do interpretador): uma consulta presa no getaddrinfo não segura o processo.
+        """
+        pending: Queue = Queue()
+        futures = {}
+        for name in names:
+            future: concurrent.futures.Future = concurrent.futures.Future()
+            futures[future] = name; pending.put((future, name))
+        def work():
+            while True:
+                try: future, name = pending.get_nowait()
+                except Empty: return
+                if not future.set_running_or_notify_cancel(): continue
+                try: future.set_result(self._lookup(name))
+                except BaseException as e: future.set_exception(e)
+        for number in range(workers): threading.Thread(target=work, name=f"dns-{number}", daemon=True).start()
+        return futures
+
+    def resolve_all(self, names: Iterable[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Retorna (endereços resolvidos, motivo da falha) por hostname."""
+        resolved: Dict[str, str] = {}; failed: Dict[str, str] = {}; pending = []
+        now = time.time()
+        with self.store.lock:
+            entries = self.store.section('nomes')
+            for name in dict.fromkeys(names):
+                entry = entries.get(name)
+                if entry and now - entry['resolvido_em'] < (self.ttl if entry['ip'] else self.negative_ttl):
+                    if entry['ip']: resolved[name] = entry['ip']
+                    else: failed[name] = entry['erro']
+                    self.cached += 1
+                else: pending.append(name)
+        if not pending: return resolved, failed
+        workers = min(self.workers, len(pending))
+        futures = self._start_lookups(pending, workers)
+        done, not_done = concurrent.futures.wait(futures, timeout=self.timeout * math.ceil(len(pending) / workers))
+        # Consultas presas no resolvedor terminam sozinhas em segundo plano; as que não começaram são descartadas
+        for future in not_done: future.cancel(); failed[futures[future]] = f"sem resposta do DNS em {self.timeout:g}s"
+        with self.store.lock:
+            entries = self.store.section('nomes')
+            for future in done:
+                name = futures[future]
+                try: address, error = future.result(), None
+                except (socket.gaierror, UnicodeError) as e: address, error = None, str(e)
+                except OSError as e: failed[name] = str(e); continue  # falha transitória: não memoriza
+                if address: resolved[name] = address
+                else: failed[name] = error
+                entries[name] = {'ip': address, 'erro': error, 'resolvido_em': now}
+        return resolved, failed
+
+    def save(self):
+        self.store.save()
+
+class TargetIndex:
+    """
+    Índice dos alvos de uma execução. Cada host distinto é coletado uma única vez, na
+    primeira linha que o referencia; as demais linhas (mesmo IP com outro NROEMPRESA/NROCHECKOUT,
+    linhas repetidas ou hosts cobertos também por uma rede/faixa) recebem o resultado em
+    `fan_out`. Linhas com IP inválido ficam com status ERRO_IP_INVALIDO e não são coletadas.
+    `expand(linha, ip)` cria o terminal de cada host de uma rede/faixa. `scope(linha)` separa
+    hosts homônimos em redes distintas (lojas atrás de gateways próprios reutilizam os mesmos
+    IPs privados): o host só é o mesmo se também o escopo for (None: rede direta).
+    """
+    def __init__(self, rows: List[Any], expand: Callable[[Any, str], Any], scope: Optional[Callable[[Any], Optional[str]]] = None):
+        self.expand = expand
+        self.scope = scope or (lambda row: None)
+        self.groups: Dict[Tuple[Optional[str], str], List[Any]] = {}
+        self.ranges: List[Tuple[Any, Address, int]] = []
+        self.invalid: List[Any] = []
+        self.unresolved: List[Any] = []
+        for row in rows:
+            try:
+                spec = parse_range(row.ip)
+                if spec is not None: self.ranges.append((row, *spec)); continue
+                row.ip = normalize_host(row.ip)
+                self.groups.setdefault(self.key(row), []).append(row)
+            except ValueError:
+                row.status = INVALID_STATUS; row.dta_atualizacao = datetime.now()
+                self.invalid.append(row)
+        self.explicit_hosts = len(self.groups)
+        self.duplicates = sum(len(group) - 1 for group in self.groups.values())
+
+    @property
+    def expected(self) -> int:
+        """Número estimado de coletas (hosts explícitos + tamanho das redes/faixas, antes da deduplicação destas)."""
+        return self.explicit_hosts + sum(count for _, _, count in self.ranges)
+
+    def key(self, row: Any) -> Tuple[Optional[str], str]:
+        """Chave de agrupamento da linha: (escopo, host)."""
+        return self.scope(row), row.ip
+
+    def rows(self, terminal: Any) -> List[Any]:
+        """Todas as linhas do host do terminal coletado (ele próprio primeiro)."""
+        return self.groups.get(self.key(terminal), [terminal])
+
+    def hostnames(self) -> List[Tuple[Optional[str], str]]:
+        """Chaves dos hosts explícitos que são nomes (não IPs)."""
+        return [key for key in self.groups if not is_ip(key[1])]
+
+    def exclude(self, key: Tuple[Optional[str], str], status: str):
+        """Retira o host `key` da coleta antes de montar a fila: suas linhas recebem `status` e vão direto para o relatório."""
+        rows = self.groups.pop(key); now = datetime.now()
+        for row in rows: row.status = status; row.dta_atualizacao = now
+        self.unresolved.extend(rows)
+        self.explicit_hosts -= 1; self.duplicates -= len(rows) - 1
+
+    def _targets(self, order: Optional[Callable[[Any], Any]] = None) -> Iterator[Any]:
+        leaders = [group[0] for group in self.groups.values()]
+        if order is not None: leaders.sort(key=order, reverse=True)
+        yield from leaders
+        for row, start, count in self.ranges:
+            for offset in range(count):
+                ip = str(start + offset)
+                terminal = self.expand(row, ip)
+                group = self.groups.get(self.key(terminal))
+                if group is not None: group.append(terminal); self.duplicates += 1; continue
+                self.groups[self.key(terminal)] = [terminal]
+                yield terminal
+
+    def queue(self, window: float = 0, jitter: float = 1.0, order: Optional[Callable[[Any], Any]] = None) -> LazyTargets:
+        """
+        Fila (preguiçosa) dos terminais a coletar, um por host distinto, espalhados por `window`
+        segundos se informado. Com `order`, os hosts explícitos saem em ordem decrescente de
+        `order(terminal)`; os das redes/faixas vêm depois, na ordem dos endereços.
+        """
+        if window > 0: return PacedTargets(self._targets(order), self.expected, window, jitter)
+        return LazyTargets(self._targets(order))
+
+    def fan_out(self, results: List[Any]) -> List[Any]:
+        """Replica cada resultado para as demais linhas do mesmo host e acrescenta as linhas inválidas e as sem DNS."""
+        expanded = list(results)
+        for result in results:
+            for duplicate in self.rows(result)[1:]:
+                for name in FAN_OUT_FIELDS: setattr(duplicate, name, getattr(result, name))
+                expanded.append(duplicate)
+        return expanded + self.invalid + self.unresolved
+
+    def summary(self) -> str:
+        parts = [f"{self.explicit_hosts} hosts distintos"]
+        if self.duplicates: parts.append(f"{self.duplicates} linhas duplicadas")
+        if self.ranges: parts.append(f"{len(self.ranges)} redes/faixas (até {sum(count for _, _, count in self.ranges)} hosts)")
+        if self.invalid: parts.append(f"{len(self.invalid)} inválidos")
+        if self.unresolved: parts.append(f"{len(self.unresolved)} linhas sem DNS")
+        return ", ".join(parts)
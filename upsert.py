@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+upsert.py: Gravação (upsert) dos resultados na tabela de inventário.
+
+Duas estratégias, escolhidas por `oracle_save_strategy`:
+- linha: um MERGE por terminal via executemany, que o Oracle avalia como N
+  merges de uma linha.
+- lote: insere todas as linhas de uma vez (array insert) numa tabela temporária
+  de staging e aplica um único MERGE set-based na tabela de destino.
+
+Com um mapa de hashes de conteúdo (chave -> hash dos campos de hardware da
+última gravação), as linhas cujo hardware não mudou recebem só um UPDATE curto
+de STATUS e DTAATUALIZACAO, sem reescrever as demais colunas.
+
+Os comandos vêm de um dialeto: Oracle (produção) ou SQLite, usado como banco
+substituto local para testar e medir o caminho de gravação sem um Oracle.
+"""
+import hashlib
+import re
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Colunas gravadas, na ordem dos valores de cada linha (ver ORACLE_BIND_FIELDS em backends.py)
+UPSERT_COLUMNS = ('NROEMPRESA', 'NROCHECKOUT', 'IP', 'STATUS', 'PLACA_MAE', 'PROCESSADOR', 'CORES_THREADS', 'RAM', 'TIPO_DISCO', 'TAMANHO_DISCO', 'DISTRO', 'KERNEL', 'DTAATUALIZACAO')
+KEY_COLUMNS = ('NROEMPRESA', 'NROCHECKOUT')
+
+# DDL da tabela de destino (tipos Oracle); DTAINCLUSAO só é preenchida na inserção
+TABLE_COLUMNS = (('NROEMPRESA', 'NUMBER(4)'), ('NROCHECKOUT', 'NUMBER(4)'), ('IP', 'VARCHAR2(15)'), ('STATUS', 'VARCHAR2(20)'), ('PLACA_MAE', 'VARCHAR2(100)'), ('PROCESSADOR', 'VARCHAR2(100)'), ('CORES_THREADS', 'VARCHAR2(10)'), ('RAM', 'VARCHAR2(20)'), ('TIPO_DISCO', 'VARCHAR2(10)'), ('TAMANHO_DISCO', 'VARCHAR2(20)'), ('DISTRO', 'VARCHAR2(100)'), ('KERNEL', 'VARCHAR2(20)'), ('DTAINCLUSAO', 'DATE'), ('DTAATUALIZACAO', 'DATE'))
+
+STRATEGIES = ('linha', 'lote')
+
+# Colunas cobertas pelo hash de conteúdo: todas menos a chave, STATUS e DTAATUALIZACAO
+HASH_COLUMNS = tuple(c for c in UPSERT_COLUMNS if c not in KEY_COLUMNS + ('STATUS', 'DTAATUALIZACAO'))
+_HASH_INDEXES = tuple(UPSERT_COLUMNS.index(c) for c in HASH_COLUMNS)
+_STATUS, _UPDATED = UPSERT_COLUMNS.index('STATUS'), UPSERT_COLUMNS.index('DTAATUALIZACAO')
+
+def row_key(row: Tuple) -> str:
+    return f"{row[0]}:{row[1]}"
+
+def content_hash(row: Tuple) -> str:
+    """Hash dos campos de hardware de uma linha (HASH_COLUMNS), estável entre execuções."""
+    return hashlib.blake2b("\x1f".join(repr(row[i]) for i in _HASH_INDEXES).encode('utf-8'), digest_size=12).hexdigest()
+
+def _updates(source: str) -> str:
+    return ", ".join(f"{c}={source}.{c}" for c in UPSERT_COLUMNS if c not in KEY_COLUMNS)
+
+class OracleDialect:
+    """Comandos do Oracle. A staging é uma GLOBAL TEMPORARY TABLE esvaziada a cada commit."""
+    name = "Oracle"
+
+    def table_name(self, table: str) -> str:
+        return table
+
+    def placeholders(self) -> str:
+        return ", ".join(f":{i}" for i in range(1, len(UPSERT_COLUMNS) + 1))
+
+    def row_values(self, rows: List[Tuple]) -> List[Tuple]:
+        return rows
+
+    def missing_table(self, error: Exception) -> bool:
+        return "ORA-00942" in str(error)
+
+    def create_table_sql(self, table: str) -> str:
+        pk_name = f"PK_{table.replace('.', '_')}"[:30]
+        return f"CREATE TABLE {table} ({', '.join(f'{c} {t}' for c, t in TABLE_COLUMNS)}, CONSTRAINT {pk_name} PRIMARY KEY (NROEMPRESA, NROCHECKOUT))"
+
+    def create_staging_sql(self, staging: str) -> str:
+        columns = ", ".join(f"{c} {t}" for c, t in TABLE_COLUMNS if c in UPSERT_COLUMNS)
+        return f"CREATE GLOBAL TEMPORARY TABLE {staging} ({columns}) ON COMMIT DELETE ROWS"
+
+    def ensure_staging(self, cursor: Any, staging: str):
+        try: cursor.execute(f"SELECT 1 FROM {staging} WHERE 1=0")
+        except Exception as e:
+            if not self.missing_table(e): raise
+            cursor.execute(self.create_staging_sql(staging))
+
+    def row_merge_sql(self, table: str) -> str:
+        # Cada bind aparece uma única vez (na subconsulta "s"), na ordem de UPSERT_COLUMNS: as linhas vão como tuplas
+        source = ", ".join(f":{i} AS {c}" for i, c in enumerate(UPSERT_COLUMNS, start=1))
+        return self._merge(table, f"(SELECT {source} FROM DUAL)")
+
+    def staging_merge_sql(self, table: str, staging: str) -> str:
+        return self._merge(table, staging)
+
+    def _merge(self, table: str, source: str) -> str:
+        return (f"MERGE INTO {table} t USING {source} s ON (t.NROEMPRESA = s.NROEMPRESA AND t.NROCHECKOUT = s.NROCHECKOUT) "
+                f"WHEN MATCHED THEN UPDATE SET {_updates('s')} "
+                f"WHEN NOT MATCHED THEN INSERT ({', '.join(UPSERT_COLUMNS)}, DTAINCLUSAO) VALUES ({', '.join(f's.{c}' for c in UPSERT_COLUMNS)}, s.DTAATUALIZACAO)")
+
+    def touch_sql(self, table: str) -> str:
+        return f"UPDATE {table} SET STATUS = :1, DTAATUALIZACAO = :2 WHERE NROEMPRESA = :3 AND NROCHECKOUT = :4"
+
+    def touch(self, cursor: Any, sql: str, rows: List[Tuple]) -> Set[int]:
+        """Executa o UPDATE curto em lote e retorna as posições que não encontraram a linha no destino."""
+        cursor.executemany(sql, rows, arraydmlrowcounts=True)
+        return {i for i, count in enumerate(cursor.getarraydmlrowcounts()) if count == 0}
+
+    def executemany(self, cursor: Any, sql: str, rows: List[Tuple]) -> List[int]:
+        """Executa em lote e retorna as posições das linhas rejeitadas (batch errors)."""
+        cursor.executemany(sql, rows, batcherrors=True)
+        return [error.offset for error in cursor.getbatcherrors()]
+
+class SqliteDialect(OracleDialect):
+    """
+    Equivalentes no SQLite: o MERGE vira INSERT ... ON CONFLICT DO UPDATE e a staging é uma
+    tabela TEMP. Os limites dos tipos Oracle (VARCHAR2(n), NUMBER(p)) viram restrições CHECK e
+    as linhas que as violam são rejeitadas uma a uma, como nos batch errors do Oracle.
+    """
+    name = "SQLite"
+    TYPES = {'NUMBER': 'INTEGER', 'VARCHAR2': 'TEXT', 'DATE': 'TIMESTAMP'}
+
+    def _column_sql(self, column: str, oracle_type: str) -> str:
+        match = re.match(r"(\w+)(?:\((\d+)\))?", oracle_type)
+        kind, size = match.group(1), match.group(2)
+        sql = f"{column} {self.TYPES[kind]}"
+        if column in KEY_COLUMNS: sql += " NOT NULL"
+        if size and kind == 'VARCHAR2': sql += f" CHECK (length({column}) <= {size})"  # ORA-12899
+        if size and kind == 'NUMBER': sql += f" CHECK (abs({column}) < {10 ** int(size)})"  # ORA-01438
+        return sql
+
+    def table_name(self, table: str) -> str:
+        return f'"{table}"'  # nomes com schema (CONSINCO.TABELA) viram um identificador só
+
+    def placeholders(self) -> str:
+        return ", ".join("?" for _ in UPSERT_COLUMNS)
+
+    def missing_table(self, error: Exception) -> bool:
+        return "no such table" in str(error)
+
+    def create_table_sql(self, table: str) -> str:
+        columns = ", ".join(self._column_sql(c, t) for c, t in TABLE_COLUMNS)
+        return f"CREATE TABLE {self.table_name(table)} ({columns}, PRIMARY KEY (NROEMPRESA, NROCHECKOUT))"
+
+    def ensure_staging(self, cursor: Any, staging: str):
+        columns = ", ".join(self._column_sql(c, t) for c, t in TABLE_COLUMNS if c in UPSERT_COLUMNS)
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {self.table_name(staging)} ({columns})")
+        cursor.execute(f"DELETE FROM {self.table_name(staging)}")
+
+    def row_merge_sql(self, table: str) -> str:
+        return self._upsert(table, f"VALUES ({self.placeholders()}, ?)")
+
+    def staging_merge_sql(self, table: str, staging: str) -> str:
+        # "WHERE true" evita a ambiguidade do parser do SQLite entre SELECT ... ON CONFLICT e um JOIN
+        return self._upsert(table, f"SELECT {', '.join(UPSERT_COLUMNS)}, DTAATUALIZACAO FROM {self.table_name(staging)} WHERE true")
+
+    def _upsert(self, table: str, source: str) -> str:
+        return (f"INSERT INTO {self.table_name(table)} ({', '.join(UPSERT_COLUMNS)}, DTAINCLUSAO) {source} "
+                f"ON CONFLICT (NROEMPRESA, NROCHECKOUT) DO UPDATE SET {_updates('excluded')}")
+
+    def touch_sql(self, table: str) -> str:
+        return f"UPDATE {self.table_name(table)} SET STATUS = ?, DTAATUALIZACAO = ? WHERE NROEMPRESA = ? AND NROCHECKOUT = ?"
+
+    def touch(self, cursor: Any, sql: str, rows: List[Tuple]) -> Set[int]:
+        missing = set()
+        for i, row in enumerate(rows):  # o sqlite3 só informa o total de linhas afetadas de um executemany
+            cursor.execute(sql, row)
+            if cursor.rowcount == 0: missing.add(i)
+        return missing
+
+    def executemany(self, cursor: Any, sql: str, rows: List[Tuple]) -> List[int]:
+        cursor.execute("SAVEPOINT lote")
+        try:
+            cursor.executemany(sql, rows); cursor.execute("RELEASE lote")
+            return []
+        except sqlite3.IntegrityError:
+            # Desfaz o lote e o refaz linha a linha para saber quais linhas foram rejeitadas
+            cursor.execute("ROLLBACK TO lote"); cursor.execute("RELEASE lote")
+        rejected = []
+        for i, row in enumerate(rows):
+            try: cursor.execute(sql, row)
+            except sqlite3.IntegrityError: rejected.append(i)
+        return rejected
+
+    def row_values(self, rows: List[Tuple]) -> List[Tuple]:
+        return [row + (row[-1],) for row in rows]  # DTAINCLUSAO = DTAATUALIZACAO na inserção
+
+ORACLE = OracleDialect()
+SQLITE = SqliteDialect()
+
+def upsert(connection: Any, dialect: OracleDialect, table: str, rows: List[Tuple], strategy: str = 'linha', staging: Optional[str] = None, hashes: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Grava as linhas (tuplas na ordem de UPSERT_COLUMNS) e faz o commit. Retorna as
+    contagens e o tempo de cada fase: 'touch' (UPDATE curto das linhas inalteradas),
+    'staging' (array insert, só na estratégia lote) e 'merge'.
+
+    Com `hashes` (row_key -> content_hash da última gravação), as linhas sem mudança de
+    hardware recebem só STATUS e DTAATUALIZACAO; as demais passam pelo MERGE completo e têm
+    o hash atualizado no mapa (ou removido, se forem rejeitadas pelo banco).
+    """
+    if strategy not in STRATEGIES: raise ValueError(f"Estratégia de gravação desconhecida: {strategy}")
+    # Chaves repetidas: vale a última, como num MERGE por linha (no MERGE set-based, fariam o Oracle falhar com ORA-30926)
+    latest = list({row[:2]: row for row in rows}.values())
+    stats: Dict[str, Any] = {'linhas': len(latest), 'erros': 0, 'alterados': len(latest), 'inalterados': 0, 'touch': 0.0, 'staging': 0.0, 'merge': 0.0}
+    cursor = connection.cursor()
+    try:
+        if strategy == 'lote' and rows:
+            # Antes de qualquer DML: no Oracle, o CREATE da staging (DDL) faz um commit implícito,
+            # que no meio da gravação confirmaria os UPDATEs curtos fora da transação do lote
+            staging = staging or f"{table}_STG"
+            started = time.perf_counter()
+            dialect.ensure_staging(cursor, staging)
+            stats['staging'] = time.perf_counter() - started
+        changed = latest
+        if hashes is not None:
+            started = time.perf_counter()
+            digests = {row[:2]: content_hash(row) for row in latest}
+            unchanged = [row for row in latest if hashes.get(row_key(row)) == digests[row[:2]]]
+            missing = dialect.touch(cursor, dialect.touch_sql(table), [(row[_STATUS], row[_UPDATED], row[0], row[1]) for row in unchanged]) if unchanged else set()
+            # Linha ausente no destino (apagada, ou hash de outro banco): volta para o MERGE completo
+            touched = {row[:2] for i, row in enumerate(unchanged) if i not in missing}
+            changed = [row for row in latest if row[:2] not in touched]
+            stats['alterados'], stats['inalterados'] = len(changed), len(touched)
+            stats['touch'] = time.perf_counter() - started
+        failed: List[Tuple] = []
+        if changed and strategy == 'linha':
+            started = time.perf_counter()
+            failed = [changed[i] for i in dialect.executemany(cursor, dialect.row_merge_sql(table), dialect.row_values(changed))]
+            connection.commit()
+            stats['merge'] = time.perf_counter() - started
+        elif changed:
+            started = time.perf_counter()
+            failed = [changed[i] for i in dialect.executemany(cursor, f"INSERT INTO {dialect.table_name(staging)} ({', '.join(UPSERT_COLUMNS)}) VALUES ({dialect.placeholders()})", changed)]
+            stats['staging'] += time.perf_counter() - started
+            started = time.perf_counter()
+            cursor.execute(dialect.staging_merge_sql(table, staging))
+            connection.commit()
+            stats['merge'] = time.perf_counter() - started
+        else: connection.commit()
+        stats['erros'] = len(failed)
+        if hashes is not None:
+            rejected = {row[:2] for row in failed}
+            for row in changed:
+                if row[:2] in rejected: hashes.pop(row_key(row), None)
+                else: hashes[row_key(row)] = digests[row[:2]]
+        return stats
+    finally:
+        cursor.close()